@@ -0,0 +1,25 @@
+"""user version.
+
+Revision ID: 5a1f3c7d9e20
+Revises: 2bdb9b423c2b
+Create Date: 2026-10-18 10:00:00.000000
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5a1f3c7d9e20'
+down_revision: Union[str, None] = '2bdb9b423c2b'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('user', 'version')
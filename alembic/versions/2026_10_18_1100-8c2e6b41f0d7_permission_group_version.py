@@ -0,0 +1,25 @@
+"""permission group version.
+
+Revision ID: 8c2e6b41f0d7
+Revises: 5a1f3c7d9e20
+Create Date: 2026-10-18 11:00:00.000000
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '8c2e6b41f0d7'
+down_revision: Union[str, None] = '5a1f3c7d9e20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('permission_group', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('permission_group', 'version')
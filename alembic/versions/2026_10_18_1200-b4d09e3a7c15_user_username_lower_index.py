@@ -0,0 +1,31 @@
+"""user username lower index.
+
+Revision ID: b4d09e3a7c15
+Revises: 8c2e6b41f0d7
+Create Date: 2026-10-18 12:00:00.000000
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4d09e3a7c15'
+down_revision: Union[str, None] = '8c2e6b41f0d7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # built concurrently so the user table stays writable, fails if usernames differ only by case
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_username_lower', 'user', [sa.text('lower(username)')],
+            unique=True, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_username_lower', table_name='user', postgresql_concurrently=True)
@@ -0,0 +1,32 @@
+"""user ban until.
+
+Revision ID: d71a5e92c3b8
+Revises: b4d09e3a7c15
+Create Date: 2026-10-18 13:00:00.000000
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd71a5e92c3b8'
+down_revision: Union[str, None] = 'b4d09e3a7c15'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('user', sa.Column('ban_until', sa.DateTime(timezone=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_ban_until', 'user', ['ban_until'],
+            postgresql_where=sa.text('ban_until IS NOT NULL'), postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_ban_until', table_name='user', postgresql_concurrently=True)
+    op.drop_column('user', 'ban_until')
@@ -0,0 +1,37 @@
+"""message.
+
+Revision ID: 3e8f0b6a4d21
+Revises: d71a5e92c3b8
+Create Date: 2026-10-18 14:00:00.000000
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '3e8f0b6a4d21'
+down_revision: Union[str, None] = 'd71a5e92c3b8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'message',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('chat_id', sa.Integer(), nullable=False),
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('text', sa.String(length=4096), nullable=False),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(['chat_id'], ['chat.id']),
+        sa.ForeignKeyConstraint(['user_id'], ['user.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_message_chat_id_id', 'message', ['chat_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_message_chat_id_id', table_name='message')
+    op.drop_table('message')
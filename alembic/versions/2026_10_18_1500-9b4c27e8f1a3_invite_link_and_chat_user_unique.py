@@ -0,0 +1,34 @@
+"""invite link and chat user unique.
+
+Revision ID: 9b4c27e8f1a3
+Revises: 3e8f0b6a4d21
+Create Date: 2026-10-18 15:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '9b4c27e8f1a3'
+down_revision: Union[str, None] = '3e8f0b6a4d21'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # built concurrently, fails if there are duplicated links or memberships already
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_invite_link_link', 'invite_link', ['link'],
+            unique=True, postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_chat_user_chat_id_user_id', 'chat_user', ['chat_id', 'user_id'],
+            unique=True, postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_chat_user_chat_id_user_id', table_name='chat_user', postgresql_concurrently=True)
+        op.drop_index('ix_invite_link_link', table_name='invite_link', postgresql_concurrently=True)
@@ -0,0 +1,59 @@
+"""chat user inbox summary.
+
+Revision ID: 5c1d8e4f2a97
+Revises: 9b4c27e8f1a3
+Create Date: 2026-10-18 16:00:00.000000
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5c1d8e4f2a97'
+down_revision: Union[str, None] = '9b4c27e8f1a3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_user', sa.Column('last_message_id', sa.BigInteger(), nullable=True))
+    op.add_column('chat_user', sa.Column('last_message_preview', sa.String(length=100), nullable=True))
+    op.add_column('chat_user', sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('chat_user', sa.Column(
+        'activity_at', sa.DateTime(), server_default=sa.text("timezone('utc', now())"), nullable=False,
+    ))
+
+    # existing members start with the last message of their chat and nothing unread
+    op.execute("""
+        UPDATE chat_user
+        SET last_message_id = last.id, last_message_preview = left(last.text, 100), activity_at = last.created_at
+        FROM (
+            SELECT DISTINCT ON (chat_id) chat_id, id, text, created_at
+            FROM message
+            ORDER BY chat_id, id DESC
+        ) AS last
+        WHERE chat_user.chat_id = last.chat_id
+    """)
+    op.execute("""
+        UPDATE chat_user
+        SET activity_at = chat.created_at
+        FROM chat
+        WHERE chat_user.chat_id = chat.id AND chat_user.last_message_id IS NULL AND chat.created_at IS NOT NULL
+    """)
+
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_chat_user_user_id_activity_at', 'chat_user', ['user_id', 'activity_at', 'chat_id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_chat_user_user_id_activity_at', table_name='chat_user', postgresql_concurrently=True)
+    op.drop_column('chat_user', 'activity_at')
+    op.drop_column('chat_user', 'unread_count')
+    op.drop_column('chat_user', 'last_message_preview')
+    op.drop_column('chat_user', 'last_message_id')
@@ -0,0 +1,36 @@
+"""user permission group indexes.
+
+Revision ID: a83f5b0c6e14
+Revises: 5c1d8e4f2a97
+Create Date: 2026-10-18 17:00:00.000000
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'a83f5b0c6e14'
+down_revision: Union[str, None] = '5c1d8e4f2a97'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_user_permission_group_user_id', 'user_permission_group', ['user_id', 'permission_group_id'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_user_permission_group_permission_group_id', 'user_permission_group', ['permission_group_id'],
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index(
+            'ix_user_permission_group_permission_group_id', table_name='user_permission_group',
+            postgresql_concurrently=True,
+        )
+        op.drop_index('ix_user_permission_group_user_id', table_name='user_permission_group', postgresql_concurrently=True)
@@ -0,0 +1,29 @@
+"""chat user read marker.
+
+Revision ID: e2f7a1c94b30
+Revises: a83f5b0c6e14
+Create Date: 2026-10-18 18:00:00.000000
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e2f7a1c94b30'
+down_revision: Union[str, None] = 'a83f5b0c6e14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('chat_user', sa.Column('last_read_id', sa.BigInteger(), nullable=True))
+    # members with nothing unread have read up to the last message, the others keep their messages unread
+    op.execute('UPDATE chat_user SET last_read_id = last_message_id WHERE unread_count = 0')
+    op.drop_column('chat_user', 'unread_count')
+
+
+def downgrade() -> None:
+    op.add_column('chat_user', sa.Column('unread_count', sa.Integer(), server_default='0', nullable=False))
+    op.drop_column('chat_user', 'last_read_id')
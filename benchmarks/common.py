@@ -0,0 +1,206 @@
+import json
+import os
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from sqlalchemy import event, make_url, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
+
+from src.base.models import BaseModel
+from src.config import config
+
+# a scratch database for the benchmarks, never the application one. They create the tables and add seed
+# users, permission groups, chats, members, messages and invite links that stay between runs, so later runs
+# reuse them; drop the database to clean up.
+BENCH_DB_URL = os.getenv('BENCH_DB_URL')
+RESULTS_DIR = Path(os.getenv('BENCH_RESULTS_DIR', config('BASE_DIR') / 'benchmarks' / 'results'))
+
+# seeded emails must pass EmailStr when users are returned by the API, reserved domains like .local do not
+SEED_EMAIL_DOMAIN = 'example.com'
+# bcrypt hash of 'password'
+SEED_PASSWORD_HASH = '$2b$12$0agE8AGx7DjC9wMqBT/A1upkAG5k7QgNCilqn7oz9HhkiDtRzBdNW'
+
+
+def bench_db_url() -> str:
+    if not BENCH_DB_URL:
+        raise SystemExit('BENCH_DB_URL is not set, point it at a scratch database')
+    if make_url(BENCH_DB_URL) == make_url(config('DB_URL')):
+        raise SystemExit('BENCH_DB_URL is the application database, point it at a scratch database')
+    return BENCH_DB_URL
+
+
+def create_engine(**kwargs: Any) -> AsyncEngine:
+    return create_async_engine(bench_db_url(), **kwargs)
+
+
+def use_bench_database() -> None:
+    """Points the app modules imported after this at the benchmark database, for runs of the app in-process."""
+    if 'src.database' in sys.modules:
+        raise RuntimeError('src.database is already imported, its engine uses the application database')
+
+    import src.config
+    url = make_url(bench_db_url())
+    src.config.DB_URL = url.render_as_string(hide_password=False)
+    src.config.DB_DSN = url.set(drivername='postgresql').render_as_string(hide_password=False)
+
+
+async def create_schema(engine: AsyncEngine) -> None:
+    import src.chats.models  # noqa: F401, registers the chat tables
+
+    async with engine.begin() as connection:
+        await connection.run_sync(BaseModel.metadata.create_all)
+
+
+async def seed_users(connection: AsyncConnection, count: int, prefix: str = 'Bench_User_') -> int:
+    """Seeds users up to `count` with generate_series, returns the number of inserted rows."""
+    existing = await connection.scalar(text('SELECT count(*) FROM "user"'))
+    if existing >= count:
+        return 0
+
+    result = await connection.execute(
+        text(
+            'INSERT INTO "user" (username, email, password, is_active, is_staff, is_superuser, is_banned) '
+            "SELECT CAST(:prefix AS text) || i, lower(CAST(:prefix AS text)) || i || '@' || :domain, :password, "
+            'true, false, false, false '
+            'FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS i '
+            'ON CONFLICT DO NOTHING',
+        ),
+        {
+            'prefix': prefix, 'domain': SEED_EMAIL_DOMAIN, 'password': SEED_PASSWORD_HASH,
+            'start': existing + 1, 'stop': count,
+        },
+    )
+    await connection.execute(text('ANALYZE "user"'))
+    return result.rowcount
+
+
+async def seed_chat(connection: AsyncConnection, name: str, owner_id: int) -> int:
+    """Returns the id of the chat named `name`, creating it with the owner as its only member."""
+    chat_id = await connection.scalar(
+        text('SELECT id FROM chat WHERE name = :name ORDER BY id LIMIT 1'), {'name': name},
+    )
+    if chat_id is not None:
+        return chat_id
+
+    chat_id = await connection.scalar(
+        text(
+            'INSERT INTO chat (name, owner_id, created_at, is_closed, members_count) '
+            'VALUES (:name, :owner_id, now(), false, 1) RETURNING id',
+        ),
+        {'name': name, 'owner_id': owner_id},
+    )
+    await connection.execute(
+        text(
+            'INSERT INTO chat_user (user_id, chat_id, role, total_messages, last_active, is_left, is_banned) '
+            "VALUES (:owner_id, :chat_id, 'USER', 0, now(), false, false)",
+        ),
+        {'owner_id': owner_id, 'chat_id': chat_id},
+    )
+    return chat_id
+
+
+async def seed_messages(connection: AsyncConnection, chat_id: int, user_id: int, count: int) -> int:
+    """Seeds messages of a chat up to `count`, returns the number of inserted rows."""
+    existing = await connection.scalar(
+        text('SELECT count(*) FROM message WHERE chat_id = :chat_id'), {'chat_id': chat_id},
+    )
+    if existing >= count:
+        return 0
+
+    result = await connection.execute(
+        text(
+            'INSERT INTO message (chat_id, user_id, text, created_at) '
+            "SELECT :chat_id, :user_id, 'message ' || i, now() "
+            'FROM generate_series(CAST(:start AS integer), CAST(:stop AS integer)) AS i',
+        ),
+        {'chat_id': chat_id, 'user_id': user_id, 'start': existing + 1, 'stop': count},
+    )
+    await connection.execute(text('ANALYZE message'))
+    return result.rowcount
+
+
+@dataclass
+class RecordedStatement:
+    statement: str
+    parameters: Any
+
+
+@dataclass
+class StatementRecorder:
+    """Captures the SQL an engine emits, with driver parameters, while the context is open."""
+
+    engine: AsyncEngine
+    statements: list[RecordedStatement] = field(default_factory=list)
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:  # noqa
+        self.statements.append(RecordedStatement(statement, parameters))
+
+    def __enter__(self) -> 'StatementRecorder':
+        event.listen(self.engine.sync_engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        event.remove(self.engine.sync_engine, 'before_cursor_execute', self._on_execute)
+
+
+async def explain(
+        connection: AsyncConnection, statement: str, parameters: Any, analyze: bool = False,
+) -> dict[str, Any]:
+    """Runs EXPLAIN (FORMAT JSON) for a recorded asyncpg statement and returns the top plan node."""
+    raw = await connection.get_raw_connection()
+    options = 'ANALYZE, BUFFERS, FORMAT JSON' if analyze else 'FORMAT JSON'
+    plan = await raw.driver_connection.fetchval(f'EXPLAIN ({options}) {statement}', *(parameters or ()))
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]
+
+
+def plan_nodes(plan: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    node = plan.get('Plan', plan)
+    yield node
+    for child in node.get('Plans', []):
+        yield from plan_nodes(child)
+
+
+def seq_scans(plan: dict[str, Any]) -> list[str]:
+    return [node.get('Relation Name', '?') for node in plan_nodes(plan) if node['Node Type'] == 'Seq Scan']
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    if len(ordered) > 1:
+        quantiles = statistics.quantiles(ordered, n=100, method='inclusive')
+    else:
+        quantiles = ordered * 99
+    return {
+        'count': len(ordered),
+        'mean': statistics.fmean(ordered),
+        'p50': quantiles[49],
+        'p95': quantiles[94],
+        'p99': quantiles[98],
+        'max': ordered[-1],
+    }
+
+
+@contextmanager
+def timer(samples: list[float]) -> Iterator[None]:
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        samples.append(time.perf_counter() - started_at)
+
+
+def write_results(name: str, data: dict[str, Any], path: Optional[str] = None) -> Path:
+    target = Path(path) if path else RESULTS_DIR / f'{name}.json'
+    target.parent.mkdir(parents=True, exist_ok=True)
+    data = {'benchmark': name, 'timestamp': time.time(), **data}
+    target.write_text(json.dumps(data, indent=2, default=str))
+    return target
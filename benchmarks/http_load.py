@@ -0,0 +1,243 @@
+"""HTTP load benchmark of the auth and user endpoints.
+
+Virtual users log in as seeded users and run a weighted mix of login,
+register, refresh, validate and GET/PATCH /api/users/current for a fixed
+duration, against the app in-process (httpx ASGI transport) or a server
+over loopback. The server has to use the BENCH_DB_URL database, where the
+users are seeded. Reports throughput, latency percentiles and the DB queries
+per request from the x-db-query-count header, which the app only sends with
+SQL_INSTRUMENTATION enabled:
+
+    SQL_INSTRUMENTATION=true python -m benchmarks.http_load --mix mixed --concurrency 32
+    SQL_INSTRUMENTATION=true uvicorn main:app --port 8000 &
+    python -m benchmarks.http_load --base-url http://127.0.0.1:8000
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+import httpx
+
+from benchmarks.common import (SEED_EMAIL_DOMAIN, create_engine, create_schema, percentiles, seed_users,
+                               use_bench_database, write_results)
+from src.config import config
+
+SEED_PREFIX = 'Bench_User_'
+SEED_PASSWORD = 'password'
+
+# relative weights of the operations
+MIXES = {
+    'read': {'validate': 30, 'current_get': 50, 'refresh': 15, 'login': 5},
+    'auth': {'login': 30, 'register': 10, 'refresh': 30, 'validate': 30},
+    'mixed': {'login': 5, 'register': 5, 'refresh': 10, 'validate': 25, 'current_get': 40, 'current_patch': 15},
+}
+
+
+@dataclass
+class VirtualUser:
+    number: int
+    username: str
+    password: str
+    access_token: str = ''
+    refresh_token: str = ''
+    requests: int = 0
+
+    @property
+    def auth(self) -> dict[str, str]:
+        return {'Authorization': f'Bearer {self.access_token}'}
+
+    def take_tokens(self, response: httpx.Response) -> None:
+        body = response.json()
+        self.access_token, self.refresh_token = body['access_token'], body['refresh_token']
+
+
+@dataclass
+class EndpointStats:
+    latencies: list[float] = field(default_factory=list)
+    queries: list[int] = field(default_factory=list)
+    errors: defaultdict[int, int] = field(default_factory=lambda: defaultdict(int))
+
+    def summary(self, elapsed: float) -> dict[str, Any]:
+        return {
+            'requests': len(self.latencies),
+            'throughput': len(self.latencies) / elapsed,
+            'errors': dict(self.errors),
+            'latency': percentiles(self.latencies),
+            'queries': {
+                'mean': statistics.fmean(self.queries),
+                'max': max(self.queries),
+            } if self.queries else None,
+        }
+
+
+async def _login(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    response = await client.post('/api/auth/login', data={'username': user.username, 'password': user.password})
+    if response.status_code == 201:
+        user.take_tokens(response)
+    return response
+
+
+async def _register(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    name = f'load_{uuid.uuid4().hex[:16]}'
+    return await client.post(
+        '/api/auth/register', json={'username': name, 'email': f'{name}@{SEED_EMAIL_DOMAIN}', 'password': 'Load_Pass1'},
+    )
+
+
+async def _refresh(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    response = await client.post('/api/auth/refresh', json={'refresh_token': user.refresh_token})
+    if response.status_code == 200:
+        user.take_tokens(response)
+    return response
+
+
+async def _validate(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    return await client.post('/api/auth/validate', headers=user.auth)
+
+
+async def _current_get(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    return await client.get('/api/users/current', headers=user.auth)
+
+
+async def _current_patch(client: httpx.AsyncClient, user: VirtualUser) -> httpx.Response:
+    email = f'{user.username.lower()}_{user.requests}@{SEED_EMAIL_DOMAIN}'
+    return await client.patch('/api/users/current', headers=user.auth, json={'email': email})
+
+
+OPERATIONS: dict[str, tuple[Callable[[httpx.AsyncClient, VirtualUser], Awaitable[httpx.Response]], int]] = {
+    'login': (_login, 201),
+    'register': (_register, 201),
+    'refresh': (_refresh, 200),
+    'validate': (_validate, 204),
+    'current_get': (_current_get, 200),
+    'current_patch': (_current_patch, 200),
+}
+
+
+async def _virtual_user(
+        client: httpx.AsyncClient, user: VirtualUser, mix: dict[str, int], deadline: float,
+        stats: dict[str, EndpointStats], seed: int,
+) -> None:
+    rng = random.Random(seed)
+    names, weights = list(mix), list(mix.values())
+    while time.perf_counter() < deadline:
+        name = rng.choices(names, weights)[0]
+        operation, expected = OPERATIONS[name]
+
+        started_at = time.perf_counter()
+        response = await operation(client, user)
+        elapsed = time.perf_counter() - started_at
+        user.requests += 1
+
+        endpoint = stats[name]
+        endpoint.latencies.append(elapsed)
+        if (queries := response.headers.get('x-db-query-count')) is not None:
+            endpoint.queries.append(int(queries))
+        if response.status_code != expected:
+            endpoint.errors[response.status_code] += 1
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=config('BASE_DIR'),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(
+        mix_name: str, concurrency: int, duration: float, base_url: Optional[str], output: Optional[str],
+) -> bool:
+    engine = create_engine()
+    await create_schema(engine)
+    async with engine.begin() as connection:
+        await seed_users(connection, concurrency, prefix=SEED_PREFIX)
+    await engine.dispose()
+
+    app = None
+    if base_url is None:
+        use_bench_database()
+        from src.routers import app
+        await app.router.startup()
+        transport = httpx.ASGITransport(app=app)
+        client = httpx.AsyncClient(transport=transport, base_url='http://bench')
+    else:
+        client = httpx.AsyncClient(base_url=base_url, limits=httpx.Limits(max_connections=concurrency))
+
+    stats: defaultdict[str, EndpointStats] = defaultdict(EndpointStats)
+    try:
+        users = [VirtualUser(i, f'{SEED_PREFIX}{i}', SEED_PASSWORD) for i in range(1, concurrency + 1)]
+        logins = await asyncio.gather(*[_login(client, user) for user in users])
+        if failed := [response.status_code for response in logins if response.status_code != 201]:
+            print(f'{len(failed)} virtual users could not log in: {failed[:5]}')
+            return False
+
+        started_at = time.perf_counter()
+        deadline = started_at + duration
+        await asyncio.gather(*[
+            _virtual_user(client, user, MIXES[mix_name], deadline, stats, seed=user.number) for user in users
+        ])
+        elapsed = time.perf_counter() - started_at
+    finally:
+        await client.aclose()
+        if app is not None:
+            await app.router.shutdown()
+
+    total = sum(len(endpoint.latencies) for endpoint in stats.values())
+    errors = sum(sum(endpoint.errors.values()) for endpoint in stats.values())
+    endpoints = {name: stats[name].summary(elapsed) for name in MIXES[mix_name] if name in stats}
+
+    print(f'{mix_name} mix, {concurrency} virtual users, {"in-process" if base_url is None else base_url}: '
+          f'{total} requests in {elapsed:.1f}s ({total / elapsed:.0f}/s), {errors} errors')
+    for name, endpoint in endpoints.items():
+        latency, queries = endpoint['latency'], endpoint['queries']
+        print(f'  {name:<14} {endpoint["requests"]:>7} req {endpoint["throughput"]:>7.0f}/s  '
+              f'p50={latency["p50"] * 1000:7.2f}ms p95={latency["p95"] * 1000:7.2f}ms '
+              f'p99={latency["p99"] * 1000:7.2f}ms  '
+              f'queries={"n/a" if queries is None else format(queries["mean"], ".2f")}'
+              f'{"  errors=" + str(endpoint["errors"]) if endpoint["errors"] else ""}')
+    if not any(endpoint['queries'] for endpoint in endpoints.values()):
+        print('no x-db-query-count headers, run the app with SQL_INSTRUMENTATION=true to count queries')
+
+    path = write_results(f'http_load_{mix_name}', {
+        'commit': _commit(),
+        'mix': mix_name,
+        'weights': MIXES[mix_name],
+        'target': base_url or 'in-process',
+        'concurrency': concurrency,
+        'duration': elapsed,
+        'requests': total,
+        'errors': errors,
+        'throughput': total / elapsed,
+        'latency': percentiles([latency for endpoint in stats.values() for latency in endpoint.latencies]),
+        'endpoints': endpoints,
+    }, output)
+    print(f'results written to {path}')
+    return errors == 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mix', choices=sorted(MIXES), default='mixed')
+    parser.add_argument('--concurrency', type=int, default=32, help='virtual users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--base-url', default=None, help='load a running server instead of the app in-process')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args.mix, args.concurrency, args.duration, args.base_url, args.output)):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Inbox benchmark.
+
+Seeds a user with hundreds of chats and compares the inbox built from the
+chat_user summaries with the naive one that loads every chat, its owner and
+its last message. Counts the statements of each and checks that an inbox
+page is read from the (user_id, activity_at, chat_id) index without a sort.
+
+    python -m benchmarks.inbox --chats 500
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import (StatementRecorder, create_engine, create_schema, explain, percentiles, plan_nodes,
+                               seed_chat, seed_messages, seed_users, seq_scans, timer, write_results)
+from src.auth.claims import TokenUser
+from src.chats.models import Chat, ChatUser, Message
+from src.chats.repositories import ACTIVE_MEMBER, ChatRepository, MessageRepository
+from src.chats.services import ChatService
+from src.chats.summaries import summary_buffer
+from src.users.models import User
+
+
+async def _naive(session: AsyncSession, user_id: int) -> list[tuple[Chat, User, Message | None]]:
+    memberships = (await session.scalars(
+        select(ChatUser).where(ChatUser.user_id == user_id, *ACTIVE_MEMBER),
+    )).all()
+    inbox = []
+    for membership in memberships:
+        chat = await session.get(Chat, membership.chat_id)
+        owner = await session.get(User, chat.owner_id)
+        last = await session.scalar(
+            select(Message).where(Message.chat_id == chat.id).order_by(Message.id.desc()).limit(1),
+        )
+        inbox.append((chat, owner, last))
+    return sorted(inbox, key=lambda item: item[2].id if item[2] else 0, reverse=True)
+
+
+async def _summaries(service: ChatService, user: TokenUser, page_size: int) -> int:
+    chats, cursor = 0, None
+    while True:
+        page = await service.get_inbox(user, cursor, page_size)
+        chats += len(page.chats)
+        if (cursor := page.next_cursor) is None:
+            return chats
+
+
+async def run(chats: int, messages: int, page_size: int, iterations: int, output: str | None) -> bool:
+    engine = create_engine()
+    await create_schema(engine)
+
+    async with engine.begin() as connection:
+        await seed_users(connection, 1)
+        user_id = await connection.scalar(text('SELECT min(id) FROM "user"'))
+        chat_ids = [await seed_chat(connection, f'bench_inbox_{i}', user_id) for i in range(chats)]
+        for chat_id in chat_ids:
+            await seed_messages(connection, chat_id, user_id, messages)
+
+    # one more message per chat through the write path fills the summaries
+    async with AsyncSession(engine) as session:
+        message_repository = MessageRepository(session)
+        for chat_id in chat_ids:
+            message = await message_repository.create(Message(chat_id=chat_id, user_id=user_id, text='latest'))
+            summary_buffer.add(message)
+        await session.commit()
+        await summary_buffer.flush(session)
+
+    user = TokenUser(id=user_id, username='bench', is_staff=False, is_superuser=False, is_banned=False, version=1)
+    results = {}
+    for name in ('naive', 'summaries'):
+        samples: list[float] = []
+        for _ in range(iterations):
+            async with AsyncSession(engine) as session:
+                with StatementRecorder(engine) as recorder, timer(samples):
+                    if name == 'naive':
+                        count = len(await _naive(session, user_id))
+                    else:
+                        count = await _summaries(ChatService(ChatRepository(session)), user, page_size)
+        stats = percentiles(samples)
+        results[name] = {'chats': count, 'statements': len(recorder.statements), 'latency': stats}
+        print(f'{name:<10} {count} chats, {len(recorder.statements):>5} statements, '
+              f'p50={stats["p50"] * 1000:8.2f}ms p99={stats["p99"] * 1000:8.2f}ms')
+
+    async with AsyncSession(engine) as session:
+        with StatementRecorder(engine) as recorder:
+            await ChatRepository(session).get_inbox(user_id, None, page_size)
+        recorded = recorder.statements[0]
+        plan = await explain(await session.connection(), recorded.statement, recorded.parameters, analyze=True)
+    await engine.dispose()
+
+    scans = seq_scans(plan)
+    sorts = [node['Node Type'] for node in plan_nodes(plan) if node['Node Type'] in ('Sort', 'Incremental Sort')]
+    ok = not sorts and 'chat_user' not in scans
+    print(f'inbox page plan: {"sort or chat_user seq scan" if not ok else "index ordered scan"} {scans or ""}')
+
+    path = write_results('inbox', {
+        'chats': chats, 'page_size': page_size, 'ok': ok, 'results': results, 'plan': plan,
+    }, output)
+    print(f'results written to {path}')
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chats', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=20, help='seeded messages per chat')
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args.chats, args.messages, args.page_size, args.iterations, args.output)):
+        print('inbox pages are not served by the (user_id, activity_at, chat_id) index')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+"""Concurrent invite link redemption benchmark.
+
+Many users redeem the same limited invite link at once, some of them twice.
+Checks that the link is never redeemed more than max_uses times, that
+count_uses matches the memberships created and that nobody joined twice.
+
+    python -m benchmarks.invite_redemption --users 2000 --max-uses 500 --concurrency 64
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import create_engine, create_schema, percentiles, seed_chat, seed_users, timer, write_results
+from src.auth.claims import TokenUser
+from src.base.uow import UnitOfWork
+from src.chats.repositories import ChatRepository, InviteLinkRepository
+from src.chats.services import InviteService
+
+
+async def _redeem(engine, link: uuid.UUID, user_id: int, samples: list[float]) -> str:
+    user = TokenUser(id=user_id, username=f'user_{user_id}', is_staff=False, is_superuser=False,
+                     is_banned=False, version=1)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        service = InviteService(InviteLinkRepository(session), ChatRepository(session), UnitOfWork(session))
+        with timer(samples):
+            try:
+                await service.redeem(link, user)
+            except HTTPException as e:
+                return f'{e.status_code} {e.detail}'
+    return 'joined'
+
+
+async def run(users: int, max_uses: int, concurrency: int, repeat: float, output: str | None) -> bool:
+    engine = create_engine(pool_size=concurrency, max_overflow=0)
+    await create_schema(engine)
+
+    link = uuid.uuid4()
+    async with engine.begin() as connection:
+        await seed_users(connection, users + 1)
+        user_ids = (await connection.scalars(text('SELECT id FROM "user" ORDER BY id LIMIT :limit'),
+                                             {'limit': users + 1})).all()
+        owner_id, user_ids = user_ids[0], list(user_ids[1:])
+        chat_id = await seed_chat(connection, f'bench_invite_{link.hex[:8]}', owner_id)
+        await connection.execute(
+            text(
+                'INSERT INTO invite_link (link, chat_id, owner_id, max_uses, count_uses, created_at) '
+                "VALUES (:link, :chat_id, :owner_id, :max_uses, 0, timezone('utc', now()))",
+            ),
+            {'link': link, 'chat_id': chat_id, 'owner_id': owner_id, 'max_uses': max_uses},
+        )
+
+    # a share of the users redeem twice at the same time, e.g. a double click
+    attempts = user_ids + random.sample(user_ids, int(len(user_ids) * repeat))
+    random.shuffle(attempts)
+
+    semaphore = asyncio.Semaphore(concurrency)
+    samples: list[float] = []
+
+    async def attempt(user_id: int) -> str:
+        async with semaphore:
+            return await _redeem(engine, link, user_id, samples)
+
+    started_at = time.perf_counter()
+    outcomes = Counter(await asyncio.gather(*[attempt(user_id) for user_id in attempts]))
+    elapsed = time.perf_counter() - started_at
+
+    async with engine.connect() as connection:
+        count_uses = await connection.scalar(text('SELECT count_uses FROM invite_link WHERE link = :link'),
+                                             {'link': link})
+        members, distinct_members = (await connection.execute(
+            text(
+                'SELECT count(*), count(DISTINCT user_id) FROM chat_user '
+                'WHERE chat_id = :chat_id AND user_id <> :owner',
+            ),
+            {'chat_id': chat_id, 'owner': owner_id},
+        )).one()
+    await engine.dispose()
+
+    joined = outcomes['joined']
+    checks = {
+        'no over-redemption': count_uses <= max_uses,
+        'count_uses matches joins': count_uses == joined == members,
+        'no duplicated memberships': members == distinct_members,
+        'link fully used': joined == min(max_uses, len(user_ids)),
+    }
+    ok = all(checks.values())
+
+    stats = percentiles(samples)
+    print(f'{len(attempts)} attempts in {elapsed:.2f}s ({len(attempts) / elapsed:.0f}/s), '
+          f'p50={stats["p50"] * 1000:.2f}ms p99={stats["p99"] * 1000:.2f}ms')
+    for outcome, count in outcomes.most_common():
+        print(f'  {count:>6}  {outcome}')
+    print(f'count_uses={count_uses} max_uses={max_uses} members={members}')
+    for name, passed in checks.items():
+        print(f'  {"ok  " if passed else "FAIL"} {name}')
+
+    path = write_results('invite_redemption', {
+        'users': len(user_ids), 'attempts': len(attempts), 'max_uses': max_uses, 'concurrency': concurrency,
+        'ok': ok, 'checks': checks, 'outcomes': dict(outcomes), 'count_uses': count_uses,
+        'throughput': len(attempts) / elapsed, 'latency': stats,
+    }, output)
+    print(f'results written to {path}')
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2000)
+    parser.add_argument('--max-uses', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=64)
+    parser.add_argument('--repeat', type=float, default=0.1, help='share of users redeeming twice')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args.users, args.max_uses, args.concurrency, args.repeat, args.output)):
+        print('invite link redemption is not consistent')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+"""Chat history pagination benchmark.
+
+Seeds a chat with millions of messages, checks that history pages are served
+by the (chat_id, id) index without a sort, and times pages at increasing
+depth. With keyset pagination the latency of the last page matches the first
+one; the OFFSET column is only there for comparison.
+
+    python -m benchmarks.message_history --messages 5000000
+"""
+import argparse
+import asyncio
+import sys
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import (StatementRecorder, create_engine, create_schema, explain, percentiles, plan_nodes,
+                               seed_chat, seed_messages, seed_users, seq_scans, timer, write_results)
+from src.chats.models import Message
+from src.chats.repositories import MessageRepository
+
+DEPTHS = (0.0, 0.01, 0.1, 0.5, 0.9, 0.999)
+
+
+async def _keyset(repository: MessageRepository, chat_id: int, before: int | None, limit: int) -> None:
+    await repository.get_page(chat_id, before, limit)
+
+
+async def _offset(session: AsyncSession, chat_id: int, offset: int, limit: int) -> None:
+    await session.scalars(
+        select(Message).where(Message.chat_id == chat_id).order_by(Message.id.desc()).offset(offset).limit(limit),
+    )
+
+
+async def run(messages: int, page_size: int, iterations: int, offset_iterations: int, output: str | None) -> bool:
+    engine = create_engine()
+    await create_schema(engine)
+
+    async with engine.begin() as connection:
+        await seed_users(connection, 1)
+        user_id = await connection.scalar(text('SELECT min(id) FROM "user"'))
+        chat_id = await seed_chat(connection, 'bench_history', user_id)
+        inserted = await seed_messages(connection, chat_id, user_id, messages)
+        print(f'seeded {inserted} messages')
+        newest, total = (await connection.execute(
+            text('SELECT max(id), count(*) FROM message WHERE chat_id = :chat_id'), {'chat_id': chat_id},
+        )).one()
+
+    ok = True
+    depths = []
+    async with AsyncSession(engine) as session:
+        repository = MessageRepository(session)
+
+        with StatementRecorder(engine) as recorder:
+            await _keyset(repository, chat_id, newest - total // 2, page_size)
+        connection = await session.connection()
+        recorded = recorder.statements[0]
+        plan = await explain(connection, recorded.statement, recorded.parameters, analyze=True)
+        scans = seq_scans(plan)
+        sorts = [node['Node Type'] for node in plan_nodes(plan) if node['Node Type'] in ('Sort', 'Incremental Sort')]
+        ok = not scans and not sorts
+        print(f'{"SEQ SCAN/SORT" if not ok else "index ordered scan":<24} {recorded.statement[:100]!r}')
+
+        for depth in DEPTHS:
+            position = int(total * depth)
+            # seeded ids of the chat are contiguous enough for the cursor to land at the depth
+            before = newest - position + 1 if position else None
+
+            keyset: list[float] = []
+            for _ in range(iterations):
+                with timer(keyset):
+                    await _keyset(repository, chat_id, before, page_size)
+
+            offset: list[float] = []
+            for _ in range(offset_iterations):
+                with timer(offset):
+                    await _offset(session, chat_id, position, page_size)
+
+            keyset_stats, offset_stats = percentiles(keyset), percentiles(offset)
+            depths.append({'depth': depth, 'position': position, 'keyset': keyset_stats, 'offset': offset_stats})
+            print(f'depth {depth:>6.1%} ({position:>9}): keyset p50={keyset_stats["p50"] * 1000:7.2f}ms '
+                  f'p99={keyset_stats["p99"] * 1000:7.2f}ms   offset p50={offset_stats["p50"] * 1000:9.2f}ms')
+
+    await engine.dispose()
+
+    first, last = depths[0]['keyset']['p50'], depths[-1]['keyset']['p50']
+    print(f'keyset p50 last/first page: {last / first:.2f}x')
+    path = write_results('message_history', {
+        'messages': total, 'page_size': page_size, 'ok': ok, 'plan': plan, 'depths': depths,
+    }, output)
+    print(f'results written to {path}')
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=5_000_000)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--offset-iterations', type=int, default=5)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args.messages, args.page_size, args.iterations, args.offset_iterations, args.output)):
+        print('history pages are not served by the (chat_id, id) index')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
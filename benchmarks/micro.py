@@ -0,0 +1,172 @@
+"""Micro-benchmarks of the per-request pure Python functions.
+
+Times JWT creation and parsing (pyjwt encodes and python-jose decodes today,
+both libraries are measured both ways), permission checks, the registration
+validators and the UserRead/UserAndToken serialization from ORM attributes.
+No database is needed.
+
+Every case runs in `--repeat` rounds of timeit autorange, the report has the
+best, median and spread per call. Allocations are measured separately with
+tracemalloc, so tracing does not distort the timings: the peak memory of one
+call and the memory still held after `--alloc-calls` calls, per call.
+
+    python -m benchmarks.micro --filter jwt
+"""
+import argparse
+import gc
+import importlib.metadata
+import platform
+import statistics
+import timeit
+import tracemalloc
+import warnings
+from typing import Any, Callable, Coroutine, Optional
+
+import jwt as pyjwt
+from jose import jwt as jose_jwt
+from jwt.warnings import InsecureKeyLengthWarning
+
+from benchmarks.common import write_results
+from src.auth.auth_jwt import SECRET, AUTH_TOKEN_EXPIRES, AuthTokenType, _create_token, generate_tokens
+from src.auth.schemas import UserAndToken
+from src.auth.services import AuthService
+from src.users.models import PermissionGroup, User
+from src.users.schemas import UserRead
+from src.users.services import RegisterService
+
+
+def _sync(coroutine: Coroutine) -> Any:
+    """Runs a coroutine that never suspends, without the cost of an event loop."""
+    try:
+        coroutine.send(None)
+    except StopIteration as e:
+        return e.value
+    coroutine.close()
+    raise RuntimeError('the coroutine suspended, it can not be benchmarked synchronously')
+
+
+def _user() -> User:
+    user = User(
+        id=1, username='bench_user', email='bench_user@example.com', password='hash', is_active=True,
+        is_staff=False, is_superuser=False, is_banned=False, version=1,
+    )
+    user.permission_groups = [
+        PermissionGroup(id=group_id, name=f'group_{group_id}', version=1,
+                        permissions=[f'perm_{group_id}_{i}' for i in range(20)])
+        for group_id in range(1, 6)
+    ]
+    return user
+
+
+def cases() -> dict[str, Callable[[], Any]]:
+    user = _user()
+    access = _create_token(user, AuthTokenType.access, expires=AUTH_TOKEN_EXPIRES)
+    payload = pyjwt.decode(access, SECRET, algorithms=['HS256'])
+    tokens = generate_tokens(user)
+    # the cached path of _parse_token needs one miss first
+    AuthService._parse_token(access, AuthTokenType.access)
+    user.has_permission('perm_1_0')
+
+    return {
+        'jwt.create_token (pyjwt)': lambda: _create_token(user, AuthTokenType.access, expires=AUTH_TOKEN_EXPIRES),
+        'jwt.encode (jose)': lambda: jose_jwt.encode(payload, SECRET, algorithm='HS256'),
+        'jwt.verify_token (jose)': lambda: AuthService._verify_token(access, AuthTokenType.access),
+        'jwt.decode (pyjwt)': lambda: pyjwt.decode(access, SECRET, algorithms=['HS256']),
+        'jwt.decode (jose)': lambda: jose_jwt.decode(access, SECRET, algorithms=['HS256']),
+        'jwt.parse_token cached': lambda: AuthService._parse_token(access, AuthTokenType.access),
+        'permission.has_permission hit': lambda: user.has_permission('perm_5_19'),
+        'permission.has_permission miss': lambda: user.has_permission('unknown'),
+        'permission.user_mask': lambda: User.permission_mask.fget(_fresh_mask(user)),
+        'validator.password': lambda: _sync(RegisterService.password_validator(
+            username=user.username, email=user.email, password='Bench_Pass1',
+        )),
+        'validator.username': lambda: _sync(RegisterService.username_validator(username=user.username)),
+        'validator.email': lambda: _sync(RegisterService.email_validator(email=user.email)),
+        'serialize.UserRead validate': lambda: UserRead.model_validate(user),
+        'serialize.UserRead json': lambda: UserRead.model_validate(user).model_dump_json(),
+        'serialize.UserAndToken json': lambda: UserAndToken.model_validate(
+            {'user': user, **tokens},
+        ).model_dump_json(),
+    }
+
+
+def _fresh_mask(user: User) -> User:
+    # permission_mask is cached on the instance, drop it to measure the compilation from group masks
+    user.__dict__.pop('_permission_mask', None)
+    return user
+
+
+def measure_time(func: Callable[[], Any], repeat: int, min_time: float) -> dict[str, Any]:
+    timer = timeit.Timer(func)
+    number, elapsed = timer.autorange()
+    number = max(1, int(number * min_time / elapsed))
+    per_call = [total / number for total in timer.repeat(repeat=repeat, number=number)]
+    return {
+        'number': number,
+        'best': min(per_call),
+        'median': statistics.median(per_call),
+        'stdev': statistics.stdev(per_call) if len(per_call) > 1 else 0.0,
+    }
+
+
+def measure_allocations(func: Callable[[], Any], calls: int) -> dict[str, float]:
+    func()
+    gc.collect()
+    tracemalloc.start()
+    try:
+        baseline, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+
+        for _ in range(calls):
+            func()
+        gc.collect()
+        current, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'peak_bytes': peak - baseline, 'retained_bytes': max(0, current - baseline) / (calls + 1)}
+
+
+def run(name_filter: Optional[str], repeat: int, min_time: float, alloc_calls: int, output: Optional[str]) -> None:
+    # email_validator is deprecated but still on the user update path
+    warnings.simplefilter('ignore', DeprecationWarning)
+    # the development secret is short, the warning would flood the report
+    warnings.simplefilter('ignore', InsecureKeyLengthWarning)
+
+    results = {}
+    print(f'{"case":<34} {"best":>10} {"median":>10} {"stdev":>8} {"peak":>9} {"retained":>9}')
+    for name, func in cases().items():
+        if name_filter and name_filter not in name:
+            continue
+        timing = measure_time(func, repeat, min_time)
+        allocations = measure_allocations(func, alloc_calls)
+        results[name] = {**timing, **allocations}
+        print(f'{name:<34} {timing["best"] * 1e6:>8.2f}us {timing["median"] * 1e6:>8.2f}us '
+              f'{timing["stdev"] / timing["median"]:>7.1%} {allocations["peak_bytes"]:>8}B '
+              f'{allocations["retained_bytes"]:>8.1f}B')
+
+    path = write_results('micro', {
+        'python': platform.python_version(),
+        'versions': {package: importlib.metadata.version(package)
+                     for package in ('PyJWT', 'python-jose', 'pydantic', 'pydantic-core', 'SQLAlchemy')},
+        'repeat': repeat,
+        'cases': results,
+    }, output)
+    print(f'results written to {path}')
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--filter', default=None, dest='name_filter', help='only cases containing this text')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per repeat')
+    parser.add_argument('--alloc-calls', type=int, default=1000)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    run(args.name_filter, args.repeat, args.min_time, args.alloc_calls, args.output)
+
+
+if __name__ == '__main__':
+    main()
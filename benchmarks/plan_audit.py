@@ -0,0 +1,377 @@
+"""Query plan audit of the repositories.
+
+Seeds a synthetic dataset, runs every public repository method, captures the
+statements they issue and runs EXPLAIN (ANALYZE, BUFFERS) on each of them in
+a transaction that is rolled back. Fails on sequential scans, on plans whose
+estimated cost exceeds the budget, on scenarios that emit no statement or
+more statements or ORM rows than their QueryBudget, and on repository methods without
+an audit scenario, so a new method has to be added to SCENARIOS. Sequential scans of
+tables smaller than --seq-scan-min-rows are cheaper than an index lookup and
+are not reported.
+
+The text report holds the plan shapes and failures only, costs and timings
+drift between runs and are in the JSON results, so reports of two releases
+can be diffed:
+
+    python -m benchmarks.plan_audit --report plans.txt
+    diff -u plans-previous.txt plans.txt
+"""
+import argparse
+import asyncio
+import inspect
+import re
+import sys
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from benchmarks.common import (StatementRecorder, create_engine, create_schema, explain, plan_nodes, seed_users,
+                               seq_scans, write_results)
+from src.base.budget import QueryBudget, QueryBudgetExceeded
+from src.base.repositories import BaseRepository
+from src.chats.repositories import ChatRepository, InviteLinkRepository, MessageRepository
+from src.users.exceptions import UsernameOrEmailAlreadyExists
+from src.users.models import User
+from src.users.cache import user_cache
+from src.users.repositories import UserRepository
+
+REPOSITORIES = (UserRepository, ChatRepository, MessageRepository, InviteLinkRepository)
+
+DEFAULT_COST_BUDGET = 1000.0
+DEFAULT_SEQ_SCAN_MIN_ROWS = 10_000
+
+
+@dataclass
+class Fixture:
+    user_id: int
+    username: str
+    email: str
+    group_ids: list[int]
+    chat_id: int
+    chat_ids: list[int]
+    message_id: int
+    link: Any
+
+
+@dataclass
+class Scenario:
+    repository: type[BaseRepository]
+    method: str
+    call: Callable[[Any, Fixture], Awaitable[Any]]
+    # batch statements may cost more than the request path ones and read most of a table
+    cost_budget: Optional[float] = None
+    allow_seq_scans: tuple[str, ...] = ()
+    # guards the loading strategy of the request path, see src/base/budget.py
+    max_statements: Optional[int] = None
+    max_rows: Optional[int] = None
+
+    @property
+    def name(self) -> str:
+        return f'{self.repository.__name__}.{self.method}'
+
+
+async def _credentials_available(repository: UserRepository, fx: Fixture) -> None:
+    with suppress(UsernameOrEmailAlreadyExists):
+        await repository.credentials_available(email=fx.email, username=fx.username.upper())
+
+
+SCENARIOS = [
+    Scenario(UserRepository, 'find_for_login', lambda r, fx: r.find_for_login(fx.username.upper()),
+             max_statements=1, max_rows=1),
+    # the user and its two seeded groups, loaded with one selectin query
+    Scenario(UserRepository, 'get_by_id', lambda r, fx: r.get_by_id(fx.user_id, with_groups=True),
+             max_statements=2, max_rows=3),
+    Scenario(UserRepository, 'credentials_available', _credentials_available),
+    Scenario(UserRepository, 'create_if_available', lambda r, fx: r.create_if_available(
+        username=fx.username.upper(), email=f'audit_{fx.email}', password='audit',
+    )),
+    Scenario(UserRepository, 'get_user_or_404', lambda r, fx: r.get_user_or_404(fx.user_id)),
+    Scenario(UserRepository, 'get_permission_group_versions',
+             lambda r, fx: r.get_permission_group_versions(fx.user_id)),
+    Scenario(UserRepository, 'get_group_permissions', lambda r, fx: r.get_group_permissions(fx.group_ids)),
+    Scenario(UserRepository, 'update_many', lambda r, fx: r.update_many(
+        [fx.user_id + i for i in range(100)], [User.is_superuser.is_(False)], is_banned=True,
+        version=User.version + 1,
+    )),
+    Scenario(UserRepository, 'next_ban_expiry', lambda r, fx: r.next_ban_expiry()),
+    Scenario(UserRepository, 'lift_expired_bans', lambda r, fx: r.lift_expired_bans(1000)),
+    Scenario(ChatRepository, 'get_member_chat', lambda r, fx: r.get_member_chat(fx.chat_id, fx.user_id)),
+    Scenario(ChatRepository, 'get_counters', lambda r, fx: r.get_counters(fx.chat_id, fx.user_id)),
+    Scenario(ChatRepository, 'count_members', lambda r, fx: r.count_members(fx.chat_id)),
+    Scenario(ChatRepository, 'count_messages', lambda r, fx: r.count_messages(fx.chat_id, fx.user_id)),
+    Scenario(ChatRepository, 'get_chat_ids_after', lambda r, fx: r.get_chat_ids_after(fx.chat_id, 1000)),
+    Scenario(ChatRepository, 'reconcile_members_count', lambda r, fx: r.reconcile_members_count(fx.chat_ids),
+             cost_budget=50_000, allow_seq_scans=('chat', 'chat_user')),
+    Scenario(ChatRepository, 'reconcile_total_messages', lambda r, fx: r.reconcile_total_messages(fx.chat_ids),
+             cost_budget=200_000, allow_seq_scans=('chat_user', 'message')),
+    Scenario(ChatRepository, 'get_member', lambda r, fx: r.get_member(fx.chat_id, fx.user_id)),
+    Scenario(ChatRepository, 'get_inbox', lambda r, fx: r.get_inbox(fx.user_id, None, 50)),
+    Scenario(ChatRepository, 'mark_read', lambda r, fx: r.mark_read(fx.chat_id, fx.user_id, fx.message_id)),
+    Scenario(ChatRepository, 'get_user_chat_ids', lambda r, fx: r.get_user_chat_ids(fx.user_id)),
+    Scenario(MessageRepository, 'get_page', lambda r, fx: r.get_page(fx.chat_id, fx.message_id, 50)),
+    Scenario(InviteLinkRepository, 'redeem', lambda r, fx: r.redeem(fx.link, fx.user_id)),
+    Scenario(InviteLinkRepository, 'get_by_link', lambda r, fx: r.get_by_link(fx.link)),
+]
+
+
+def uncovered_methods() -> list[str]:
+    covered = {scenario.name for scenario in SCENARIOS}
+    methods = [
+        f'{repository.__name__}.{name}'
+        for repository in REPOSITORIES
+        for name, member in vars(repository).items()
+        if inspect.iscoroutinefunction(member) and not name.startswith('_')
+    ]
+    return [name for name in methods if name not in covered]
+
+
+async def seed(engine: AsyncEngine, users: int, chats: int, members: int, messages: int, groups: int) -> None:
+    """Seeds the audit dataset once, the chats are named audit_chat_<n>."""
+    async with engine.begin() as connection:
+        await seed_users(connection, users)
+        if await connection.scalar(text("SELECT count(*) FROM chat WHERE name LIKE 'audit_chat_%'")) >= chats:
+            return
+
+        await connection.execute(text("""
+            INSERT INTO permission_group (name, permissions, version)
+            SELECT 'audit_group_' || i, '{}', 1 FROM generate_series(1, :groups) AS i
+        """), {'groups': groups})
+        await connection.execute(text("""
+            WITH audit_groups AS (
+                SELECT array_agg(id ORDER BY id) AS ids FROM permission_group WHERE name LIKE 'audit_group_%'
+            )
+            INSERT INTO user_permission_group (user_id, permission_group_id)
+            SELECT u.id, g.ids[1 + (u.id + offsets.n) % cardinality(g.ids)]
+            FROM "user" u, audit_groups g, generate_series(0, 1) AS offsets(n)
+        """))
+        await connection.execute(text("""
+            INSERT INTO chat (name, owner_id, created_at, is_closed, members_count)
+            SELECT 'audit_chat_' || i, (SELECT min(id) FROM "user"), now(), i % 50 = 0, :members
+            FROM generate_series(1, :chats) AS i
+        """), {'chats': chats, 'members': members})
+        # members are spread so that every user is in about chats * members / users chats
+        await connection.execute(text("""
+            WITH audit_users AS (
+                SELECT array_agg(id ORDER BY id) AS ids FROM "user"
+            ), audit_chats AS (
+                SELECT id, row_number() OVER (ORDER BY id) AS n FROM chat WHERE name LIKE 'audit_chat_%'
+            )
+            INSERT INTO chat_user (user_id, chat_id, role, total_messages, last_active, is_left, is_banned,
+                                   activity_at)
+            SELECT u.ids[1 + (c.n * :members + m.n) % cardinality(u.ids)], c.id, 'USER', 0, now(),
+                   m.n % 10 = 9, false, now() - random() * interval '30 days'
+            FROM audit_chats c, audit_users u, generate_series(0, :members - 1) AS m(n)
+            ON CONFLICT DO NOTHING
+        """), {'members': members})
+        await connection.execute(text("""
+            INSERT INTO message (chat_id, user_id, text, created_at)
+            SELECT c.id, c.owner_id, 'audit message ' || i, now()
+            FROM chat c, generate_series(1, :messages) AS i
+            WHERE c.name LIKE 'audit_chat_%'
+        """), {'messages': messages})
+        await connection.execute(text("""
+            INSERT INTO invite_link (link, chat_id, owner_id, max_uses, count_uses, created_at)
+            SELECT gen_random_uuid(), id, owner_id, 100, 0, timezone('utc', now())
+            FROM chat WHERE name LIKE 'audit_chat_%'
+        """))
+        await connection.execute(text("""
+            UPDATE "user" SET is_banned = true, ban_until = now() + random() * interval '30 days'
+            WHERE id % 1000 = 0
+        """))
+
+    async with engine.connect() as connection:
+        await connection.execution_options(isolation_level='AUTOCOMMIT')
+        for table in ('"user"', 'permission_group', 'user_permission_group', 'chat', 'chat_user', 'message',
+                      'invite_link'):
+            await connection.execute(text(f'VACUUM ANALYZE {table}'))
+
+
+async def load_fixture(connection: AsyncConnection) -> Fixture:
+    """A member of an open audit chat in the middle of the dataset, with permission groups."""
+    row = (await connection.execute(text("""
+        SELECT cu.user_id, u.username, u.email, cu.chat_id
+        FROM chat_user cu
+        JOIN chat c ON c.id = cu.chat_id
+        JOIN "user" u ON u.id = cu.user_id
+        WHERE c.name LIKE 'audit_chat_%' AND NOT c.is_closed AND NOT cu.is_left AND NOT cu.is_banned
+        ORDER BY cu.chat_id
+        OFFSET (SELECT count(*) / 2 FROM chat_user) / 2
+        LIMIT 1
+    """))).one()
+    user_id, username, email, chat_id = row
+    group_ids = (await connection.scalars(
+        text('SELECT permission_group_id FROM user_permission_group WHERE user_id = :user_id'), {'user_id': user_id},
+    )).all()
+    chat_ids = (await connection.scalars(
+        text('SELECT id FROM chat WHERE id >= :chat_id ORDER BY id LIMIT 1000'), {'chat_id': chat_id},
+    )).all()
+    message_id = await connection.scalar(
+        text('SELECT percentile_disc(0.5) WITHIN GROUP (ORDER BY id) FROM message WHERE chat_id = :chat_id'),
+        {'chat_id': chat_id},
+    )
+    link = await connection.scalar(text('SELECT link FROM invite_link WHERE chat_id = :chat_id'), {'chat_id': chat_id})
+    return Fixture(user_id, username, email, list(group_ids), chat_id, list(chat_ids), message_id, link)
+
+
+@dataclass
+class AuditedStatement:
+    scenario: str
+    statement: str
+    plan: dict[str, Any]
+    cost: float
+    cost_budget: float
+    seq_scans: list[str] = field(default_factory=list)
+
+    @property
+    def failures(self) -> list[str]:
+        failures = [f'seq scan on {relation}' for relation in self.seq_scans]
+        if self.cost > self.cost_budget:
+            failures.append(f'cost {self.cost:.0f} over budget {self.cost_budget:.0f}')
+        return failures
+
+
+def _shape(plan: dict[str, Any], depth: int = 0) -> list[str]:
+    node = plan.get('Plan', plan)
+    line = node['Node Type']
+    if 'Index Name' in node:
+        line += f' using {node["Index Name"]}'
+    if 'Relation Name' in node:
+        line += f' on {node["Relation Name"]}'
+    lines = [f'{"  " * (depth + 1)}{line}']
+    for child in node.get('Plans', []):
+        lines += _shape(child, depth + 1)
+    return lines
+
+
+def report(statements: list[AuditedStatement], scenario_failures: list[str], uncovered: list[str]) -> str:
+    lines = []
+    for audited in statements:
+        status = '; '.join(audited.failures) or 'ok'
+        lines.append(f'## {audited.scenario}: {status}')
+        lines.append(re.sub(r'\s+', ' ', audited.statement).strip())
+        lines += _shape(audited.plan)
+        lines.append('')
+    for failure in scenario_failures:
+        lines.append(f'## {failure}')
+    for name in uncovered:
+        lines.append(f'## {name}: no audit scenario')
+    failed = sum(1 for audited in statements if audited.failures) + len(scenario_failures) + len(uncovered)
+    lines.append(f'# {len(statements)} statements, {failed} failed')
+    return '\n'.join(lines) + '\n'
+
+
+async def audit(
+        engine: AsyncEngine, fixture: Fixture, cost_budget: float, seq_scan_min_rows: int,
+) -> tuple[list[AuditedStatement], list[str]]:
+    """The audited statements of every scenario and the scenarios that failed their query budget."""
+    async with engine.connect() as connection:
+        sizes = dict((await connection.execute(text(
+            "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace",
+        ))).tuples().all())
+
+    audited, scenario_failures = [], []
+    for scenario in SCENARIOS:
+        async with AsyncSession(engine) as session:
+            # every statement runs twice (call and EXPLAIN ANALYZE), both are rolled back
+            await session.connection()
+            with StatementRecorder(engine) as recorder:
+                try:
+                    with QueryBudget(engine.sync_engine, scenario.max_statements, scenario.max_rows):
+                        await scenario.call(scenario.repository(session), fixture)
+                except QueryBudgetExceeded as e:
+                    scenario_failures.append(f'{scenario.name}: {str(e).splitlines()[0]}')
+            if not recorder.statements:
+                scenario_failures.append(f'{scenario.name}: no statements captured, nothing was audited')
+
+            connection = await session.connection()
+            for recorded in recorder.statements:
+                plan = await explain(connection, recorded.statement, recorded.parameters, analyze=True)
+                audited.append(AuditedStatement(
+                    scenario=scenario.name,
+                    statement=recorded.statement,
+                    plan=plan,
+                    cost=plan['Plan']['Total Cost'],
+                    cost_budget=scenario.cost_budget or cost_budget,
+                    seq_scans=[
+                        relation for relation in seq_scans(plan)
+                        if sizes.get(relation, 0) >= seq_scan_min_rows and relation not in scenario.allow_seq_scans
+                    ],
+                ))
+            await session.rollback()
+    return audited, scenario_failures
+
+
+async def run(
+        users: int, chats: int, members: int, messages: int, groups: int, cost_budget: float,
+        seq_scan_min_rows: int, report_path: Optional[str], output: Optional[str],
+) -> bool:
+    # cache hits emit no SQL and would hide the statements of the user lookups
+    user_cache.enabled = False
+
+    engine = create_engine()
+    await create_schema(engine)
+    await seed(engine, users, chats, members, messages, groups)
+    async with engine.connect() as connection:
+        fixture = await load_fixture(connection)
+
+    statements, scenario_failures = await audit(engine, fixture, cost_budget, seq_scan_min_rows)
+    await engine.dispose()
+
+    uncovered = uncovered_methods()
+    text_report = report(statements, scenario_failures, uncovered)
+    if report_path:
+        with open(report_path, 'w', encoding='utf-8') as file:
+            file.write(text_report)
+    else:
+        print(text_report, end='')
+
+    ok = not uncovered and not scenario_failures and not any(audited.failures for audited in statements)
+    path = write_results('plan_audit', {
+        'ok': ok,
+        'cost_budget': cost_budget,
+        'scenario_failures': scenario_failures,
+        'uncovered': uncovered,
+        'statements': [
+            {
+                'scenario': audited.scenario,
+                'statement': audited.statement,
+                'cost': audited.cost,
+                'failures': audited.failures,
+                'execution_time': audited.plan.get('Execution Time'),
+                'shared_hit_blocks': sum(node.get('Shared Hit Blocks', 0) for node in plan_nodes(audited.plan)),
+                'shared_read_blocks': sum(node.get('Shared Read Blocks', 0) for node in plan_nodes(audited.plan)),
+                'plan': audited.plan,
+            }
+            for audited in statements
+        ],
+    }, output)
+    print(f'results written to {path}')
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200_000)
+    parser.add_argument('--chats', type=int, default=20_000)
+    parser.add_argument('--members', type=int, default=20, help='members per chat')
+    parser.add_argument('--messages', type=int, default=50, help='messages per chat')
+    parser.add_argument('--groups', type=int, default=200, help='permission groups')
+    parser.add_argument('--cost-budget', type=float, default=DEFAULT_COST_BUDGET)
+    parser.add_argument('--seq-scan-min-rows', type=int, default=DEFAULT_SEQ_SCAN_MIN_ROWS)
+    parser.add_argument('--report', default=None, help='write the text report to this path instead of stdout')
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(
+        args.users, args.chats, args.members, args.messages, args.groups, args.cost_budget, args.seq_scan_min_rows,
+        args.report, args.output,
+    )):
+        print('query plan audit failed')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
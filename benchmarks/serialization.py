@@ -0,0 +1,107 @@
+"""Response serialization benchmark.
+
+Compares FastAPI's handling of a route's return value (validation through the
+response_model, conversion to JSON-able Python and json.dumps in JSONResponse)
+with the precompiled ModelSerializer responses of the same routes, for the
+current user, the login tokens and a batch ban result. Both must produce the
+same body. No database is needed.
+
+    python -m benchmarks.serialization --bans 1000
+"""
+import argparse
+import sys
+import warnings
+from typing import Any, Callable
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import APIRoute, serialize_response
+
+from benchmarks.common import write_results
+from benchmarks.micro import _sync, _user, measure_allocations, measure_time
+from src.auth.auth_jwt import generate_tokens
+from src.auth.schemas import user_and_token_serializer
+from src.base.serializers import ModelSerializer
+from src.routers import app
+from src.users.schemas import BatchBanOutcome, BatchBanResult, batch_ban_result_serializer, user_read_serializer
+
+
+def _route(path: str, method: str) -> APIRoute:
+    return next(
+        route for route in app.routes
+        if isinstance(route, APIRoute) and route.path == path and method in route.methods
+    )
+
+
+def _fastapi(route: APIRoute, content: Any) -> Callable[[], bytes]:
+    def render() -> bytes:
+        return JSONResponse(_sync(serialize_response(field=route.response_field, response_content=content))).body
+    return render
+
+
+def _serializer(serializer: ModelSerializer, content: Any) -> Callable[[], bytes]:
+    return lambda: serializer.response(content).body
+
+
+def cases(bans: int) -> dict[str, tuple[Callable[[], bytes], Callable[[], bytes]]]:
+    user = _user()
+    ban_result = BatchBanResult(
+        changed=bans,
+        results=[BatchBanOutcome(user_id=user_id, status='banned') for user_id in range(bans)],
+    )
+    login = {'user': user, **generate_tokens(user)}
+    return {
+        'current_user': (
+            _fastapi(_route('/api/users/current', 'GET'), user),
+            _serializer(user_read_serializer, user),
+        ),
+        'login': (
+            _fastapi(_route('/api/auth/login', 'POST'), login),
+            _serializer(user_and_token_serializer, login),
+        ),
+        f'ban_{bans}': (
+            _fastapi(_route('/api/users/admin/ban', 'POST'), ban_result),
+            _serializer(batch_ban_result_serializer, ban_result),
+        ),
+    }
+
+
+def run(bans: int, repeat: int, min_time: float, alloc_calls: int, output: str | None) -> bool:
+    warnings.simplefilter('ignore', DeprecationWarning)
+
+    results, same = {}, True
+    for name, (fastapi_path, serializer_path) in cases(bans).items():
+        if fastapi_path() != serializer_path():
+            print(f'{name}: the serializer body differs from the FastAPI one')
+            same = False
+
+        results[name] = {}
+        for path_name, func in (('fastapi', fastapi_path), ('serializer', serializer_path)):
+            timing = measure_time(func, repeat, min_time)
+            allocations = measure_allocations(func, alloc_calls)
+            results[name][path_name] = {**timing, **allocations}
+        fastapi_result, serializer_result = results[name]['fastapi'], results[name]['serializer']
+        results[name]['speedup'] = fastapi_result['best'] / serializer_result['best']
+        print(f'{name:<14} fastapi={fastapi_result["best"] * 1e6:9.2f}us '
+              f'serializer={serializer_result["best"] * 1e6:9.2f}us x{results[name]["speedup"]:.1f}  '
+              f'peak {fastapi_result["peak_bytes"]}B -> {serializer_result["peak_bytes"]}B')
+
+    path = write_results('serialization', {'bans': bans, 'repeat': repeat, 'same_body': same, 'cases': results}, output)
+    print(f'results written to {path}')
+    return same
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--bans', type=int, default=1000, help='outcomes in the batch ban result')
+    parser.add_argument('--repeat', type=int, default=7)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds per repeat')
+    parser.add_argument('--alloc-calls', type=int, default=200)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if not run(args.bans, args.repeat, args.min_time, args.alloc_calls, args.output):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Case-insensitive username lookup benchmark.
+
+Seeds the user table and checks that the login and registration queries of
+UserRepository are served by indexes, then times them.
+
+    python -m benchmarks.user_lookup --users 2000000
+"""
+import argparse
+import asyncio
+import random
+import sys
+from contextlib import suppress
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from benchmarks.common import (SEED_EMAIL_DOMAIN, StatementRecorder, create_engine, create_schema, explain,
+                               percentiles, seed_users, seq_scans, timer, write_results)
+from src.users.exceptions import UsernameOrEmailAlreadyExists
+from src.users.repositories import UserRepository
+
+
+async def _lookups(repository: UserRepository, number: int) -> None:
+    await repository.find_for_login(f'bench_user_{number}')
+    await repository.find_for_login(f'bench_user_{number}@{SEED_EMAIL_DOMAIN}')
+    with suppress(UsernameOrEmailAlreadyExists):
+        await repository.credentials_available(
+            email=f'new_{number}@{SEED_EMAIL_DOMAIN}', username=f'BENCH_USER_{number}',
+        )
+
+
+async def run(users: int, iterations: int, output: str | None) -> bool:
+    engine = create_engine()
+    await create_schema(engine)
+
+    async with engine.begin() as connection:
+        inserted = await seed_users(connection, users)
+        print(f'seeded {inserted} users')
+
+    ok = True
+    plans = []
+    async with AsyncSession(engine) as session:
+        repository = UserRepository(session)
+        with StatementRecorder(engine) as recorder:
+            await _lookups(repository, users // 2)
+
+        connection = await session.connection()
+        for recorded in recorder.statements:
+            plan = await explain(connection, recorded.statement, recorded.parameters, analyze=True)
+            scans = seq_scans(plan)
+            ok = ok and not scans
+            plans.append({'statement': recorded.statement, 'seq_scans': scans, 'plan': plan})
+            print(f'{"SEQ SCAN on " + ", ".join(scans) if scans else "no seq scans":<24} {recorded.statement[:100]!r}')
+
+        samples: list[float] = []
+        for _ in range(iterations):
+            with timer(samples):
+                await _lookups(repository, random.randint(1, users))  # noqa: S311
+
+    await engine.dispose()
+
+    stats = percentiles(samples)
+    print(f'lookups: p50={stats["p50"] * 1000:.2f}ms p95={stats["p95"] * 1000:.2f}ms p99={stats["p99"] * 1000:.2f}ms')
+    path = write_results('user_lookup', {'users': users, 'ok': ok, 'latency': stats, 'plans': plans}, output)
+    print(f'results written to {path}')
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=2_000_000)
+    parser.add_argument('--iterations', type=int, default=500)
+    parser.add_argument('--output', default=None)
+    args = parser.parse_args()
+
+    if not asyncio.run(run(args.users, args.iterations, args.output)):
+        print('sequential scans detected')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,17 +1,40 @@
 from fastapi import FastAPI
 
+from src.auth.hashing import password_hasher
+from src.chats.counters import counter_flusher
+from src.chats.presence import presence_flusher
+from src.chats.summaries import summary_flusher
 from src.config import config
 from src.database import create_tables
-from src.logging import init_loggers
-
-# from src.middlewares import QueryLoggingMiddleware
+from src.logging import init_loggers, stop_loggers
+from src.middlewares import QueryStatsMiddleware
+from src.pubsub import pubsub
+from src.users.ban_expiry import ban_expiry_scheduler
 
 init_loggers()
 
 app = FastAPI(debug=config('DEBUG', False))
-# app.add_middleware(QueryLoggingMiddleware)
+
+if config('SQL_INSTRUMENTATION', False):
+    app.add_middleware(QueryStatsMiddleware)
 
 
 @app.on_event('startup')
 async def startup_event():
     await create_tables()
+    await pubsub.start()
+    await ban_expiry_scheduler.start()
+    await counter_flusher.start()
+    await presence_flusher.start()
+    await summary_flusher.start()
+
+
+@app.on_event('shutdown')
+async def shutdown_event():
+    await ban_expiry_scheduler.stop()
+    await counter_flusher.stop()
+    await presence_flusher.stop()
+    await summary_flusher.stop()
+    password_hasher.shutdown()
+    await pubsub.stop()
+    stop_loggers()
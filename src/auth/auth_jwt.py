@@ -1,9 +1,11 @@
 import logging
 from datetime import datetime, timedelta
 from enum import Enum
+from typing import Any, Optional
 
 import jwt
 
+from src.auth.claims import STATELESS_AUTH, make_claims
 from src.config import config
 from src.users.models import User
 
@@ -12,6 +14,9 @@ debugger = logging.getLogger('debugger')
 SECRET = config('JWT_SECRET', module='src.auth.config')
 AUTH_TOKEN_EXPIRES = timedelta(minutes=config('ACCESS_TOKEN_EXPIRE_MINUTES', module='src.auth.config'))
 REFRESH_TOKEN_EXPIRES = timedelta(minutes=config('REFRESH_TOKEN_EXPIRE_MINUTES', module='src.auth.config'))
+STATELESS_AUTH_TOKEN_EXPIRES = timedelta(
+    minutes=config('STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES', module='src.auth.config'),
+)
 
 
 class AuthTokenType(str, Enum):
@@ -19,13 +24,17 @@ class AuthTokenType(str, Enum):
     refresh = 'refresh_token'
 
 
-def _create_token(user: User, token_type: AuthTokenType, expires: timedelta) -> str:
+def _create_token(
+        user: User, token_type: AuthTokenType, expires: timedelta, claims: Optional[dict[str, Any]] = None,
+) -> str:
     payload = {
         'user_id': user.id,
         'username': user.username,
         'token_type': token_type.name,
         'expires': (datetime.utcnow() + expires).isoformat(),
     }
+    if claims:
+        payload.update(claims)
     return jwt.encode(
         payload=payload,
         key=SECRET,
@@ -34,6 +43,8 @@ def _create_token(user: User, token_type: AuthTokenType, expires: timedelta) ->
 
 
 def create_access_token(user: User) -> str:
+    if STATELESS_AUTH:
+        return _create_token(user, AuthTokenType.access, expires=STATELESS_AUTH_TOKEN_EXPIRES, claims=make_claims(user))
     return _create_token(user, AuthTokenType.access, expires=AUTH_TOKEN_EXPIRES)
 
 
@@ -0,0 +1,85 @@
+import time
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+from src.config import config
+from src.users.models import User
+
+STATELESS_AUTH = config('STATELESS_AUTH', False, module='src.auth.config')
+STATELESS_TOKEN_LIFETIME = config('STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES', 5, module='src.auth.config') * 60
+
+CLAIMS = ('is_staff', 'is_superuser', 'is_banned', 'version')
+
+
+@dataclass(frozen=True)
+class TokenUser:
+    """Authorization data of a user, taken from token claims or from the user row."""
+
+    id: int  # noqa: A003, VNE003
+    username: str
+    is_staff: bool
+    is_superuser: bool
+    is_banned: bool
+    version: int
+
+    @classmethod
+    def from_user(cls, user: User) -> 'TokenUser':
+        return cls(
+            id=user.id,
+            username=user.username,
+            is_staff=user.is_staff,
+            is_superuser=user.is_superuser,
+            is_banned=user.ban_active,
+            version=user.version,
+        )
+
+    @classmethod
+    def from_payload(cls, payload: Mapping[str, Any]) -> 'TokenUser':
+        claims = payload['claims']
+        return cls(
+            id=payload['user_id'],
+            username=payload['username'],
+            is_staff=claims['is_staff'],
+            is_superuser=claims['is_superuser'],
+            is_banned=claims['is_banned'],
+            version=claims['version'],
+        )
+
+
+def make_claims(user: User) -> dict[str, Any]:
+    return {claim: getattr(user, claim) for claim in CLAIMS} | {'is_banned': user.ban_active}
+
+
+class UserVersionRegistry:
+    """Lowest accepted claims version per user, for the users changed by this worker.
+
+    Entries are kept only as long as a stateless token can live, after that
+    every token issued before the change has already expired.
+    """
+
+    def __init__(self, lifetime: float):
+        self.lifetime = lifetime
+        self._versions: dict[int, tuple[int, float]] = {}
+
+    def bump(self, user_id: int, version: int) -> None:
+        self._prune()
+        current, _ = self._versions.get(user_id, (0, 0.0))
+        self._versions[user_id] = (max(current, version), time.monotonic() + self.lifetime)
+
+    def is_stale(self, user_id: int, version: int) -> bool:
+        entry = self._versions.get(user_id)
+        if entry is None:
+            return False
+        min_version, valid_until = entry
+        if valid_until < time.monotonic():
+            self._versions.pop(user_id, None)
+            return False
+        return version < min_version
+
+    def _prune(self) -> None:
+        now = time.monotonic()
+        for user_id in [user_id for user_id, (_, valid_until) in self._versions.items() if valid_until < now]:
+            del self._versions[user_id]
+
+
+user_versions = UserVersionRegistry(lifetime=STATELESS_TOKEN_LIFETIME)
@@ -6,7 +6,20 @@ from passlib.context import CryptContext
 JWT_SECRET = os.environ.get('JWT_SECRET', 'insecure-jwt-secret---ie--vtoga')
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
 REFRESH_TOKEN_EXPIRE_MINUTES = 60 * 24 * 15
+
+# access tokens carry is_staff/is_superuser/is_banned/version claims, and the user row is loaded
+# only by the endpoints that need it. Changes made by another worker are seen after token expiration.
+STATELESS_AUTH = os.environ.get('STATELESS_AUTH', 'false').lower() in ('1', 'true')
+STATELESS_ACCESS_TOKEN_EXPIRE_MINUTES = 5
+
+# verified tokens are kept until their own expiration
+TOKEN_CACHE_MAX_ENTRIES = int(os.environ.get('TOKEN_CACHE_MAX_ENTRIES', 10_000))
 DISABLE_PASSWORD_VALIDATOR = True
 
+# 'thread' or 'process', bcrypt releases the GIL so threads are enough in most cases
+PASSWORD_HASHER_EXECUTOR = os.environ.get('PASSWORD_HASHER_EXECUTOR', 'thread')
+PASSWORD_HASHER_WORKERS = int(os.environ.get('PASSWORD_HASHER_WORKERS', min(4, os.cpu_count() or 1)))
+PASSWORD_HASHER_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASHER_QUEUE_SIZE', 64))
+
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='api/auth/login')
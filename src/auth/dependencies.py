@@ -1,15 +1,17 @@
 import logging
-from typing import Annotated, Optional
+from typing import Annotated, Callable, Optional
 
 from fastapi import Depends
 from jose import JWTError
 
 from src.auth.auth_jwt import AuthTokenType
+from src.auth.claims import TokenUser
 from src.auth.config import oauth2_scheme
 from src.auth.services import AuthService
 from src.base.exceptions import Forbidden, Unauthorized
 from src.users.dependencies import get_user_service
 from src.users.models import User
+from src.users.permissions import permission_index
 from src.users.services import UserService
 
 debugger = logging.getLogger('debugger')
@@ -23,19 +25,10 @@ async def _get_user_from_token(
     except JWTError as exc:
         raise Unauthorized('Token expired') from exc
 
-    if user.is_banned:
-        msg = 'This user is banned'
-        banned_by = await auth_service.user_service.get_user_by_id(user.banned_by)
-        if banned_by:
-            msg += f' by {banned_by.username}'
-        if user.ban_reason:
-            msg += f' with reason: {user.ban_reason}'
-        raise Forbidden(msg)
+    if user.ban_active:
+        await auth_service.raise_banned(user)
 
-    if checks:
-        requirements = [getattr(user, check) for check in checks if hasattr(user, check)]
-        if not all(requirements):
-            raise Forbidden('This user does not have all the required permissions')
+    auth_service.check_requirements(user, checks)
 
     return user
 
@@ -67,6 +60,27 @@ async def get_current_superuser(
     return await _get_user_from_token(auth_service, access_token, checks=['is_staff', 'is_superuser'])
 
 
+async def get_current_token_user(
+        auth_service: Annotated[AuthService, Depends(get_auth_service)],
+        access_token: Annotated[str, Depends(oauth2_scheme)],
+) -> TokenUser:
+    return await auth_service.authenticate_token(access_token)
+
+
+async def get_current_staff_token_user(
+        auth_service: Annotated[AuthService, Depends(get_auth_service)],
+        access_token: Annotated[str, Depends(oauth2_scheme)],
+) -> TokenUser:
+    return await auth_service.authenticate_token(access_token, checks=['is_staff'])
+
+
+async def get_current_superuser_token_user(
+        auth_service: Annotated[AuthService, Depends(get_auth_service)],
+        access_token: Annotated[str, Depends(oauth2_scheme)],
+) -> TokenUser:
+    return await auth_service.authenticate_token(access_token, checks=['is_staff', 'is_superuser'])
+
+
 async def get_current_user_with_groups(
         auth_service: Annotated[AuthService, Depends(get_auth_service)],
         access_token: Annotated[str, Depends(oauth2_scheme)],
@@ -89,3 +103,25 @@ async def get_current_superuser_with_groups(
 ) -> User:
     return await _get_user_from_token(auth_service, access_token,
                                       checks=['is_staff', 'is_superuser'], with_groups=True)
+
+
+def require_permission(permission: str, checks: Optional[list[str]] = None) -> Callable:
+    """Dependency factory for routes protected by a group permission, superusers have every permission.
+
+    Group ids and versions are cached per user, group permissions come from the compiled index.
+    """
+
+    async def dependency(
+            auth_service: Annotated[AuthService, Depends(get_auth_service)],
+            access_token: Annotated[str, Depends(oauth2_scheme)],
+    ) -> TokenUser:
+        user = await auth_service.authenticate_token(access_token, checks=checks)
+        if user.is_superuser:
+            return user
+
+        mask = await auth_service.user_service.get_permission_mask(user.id)
+        if not permission_index.has(mask, permission):
+            raise Forbidden(f'This user does not have the {permission} permission')
+        return user
+
+    return dependency
@@ -1,6 +1,6 @@
 from fastapi import WebSocketException, status
 
-from src.base.exceptions import Unauthorized
+from src.base.exceptions import ServiceUnavailable, Unauthorized
 
 
 class BadCredentialsException(Unauthorized):
@@ -17,6 +17,12 @@ class BadTokenException(Unauthorized):
     headers = {'WWW-Authenticate': 'Bearer'}
 
 
+class PasswordHasherOverloadedException(ServiceUnavailable):
+    """Used if the password hashing pool queue is full."""
+
+    detail = 'Too many authentication requests, try again later'
+
+
 class WebSocketBadTokenException(WebSocketException):
     """WebSocket exception for bad token.
 
@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import dataclass
+from typing import Any, Callable, Optional, Sequence
+
+from src.auth.config import pwd_context
+from src.auth.exceptions import PasswordHasherOverloadedException
+from src.config import config
+
+info = logging.getLogger('all')
+debugger = logging.getLogger('debugger')
+
+
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _hash_batch(passwords: Sequence[str]) -> list[str]:
+    return [pwd_context.hash(password) for password in passwords]
+
+
+def _verify(plain_password: str, hashed_password: str) -> bool:
+    return pwd_context.verify(plain_password, hashed_password)
+
+
+def _timed_call(func: Callable, *args: Any) -> tuple[float, Any]:
+    # time.monotonic is system-wide, so it is comparable between the event loop and pool processes
+    started_at = time.monotonic()
+    return started_at, func(*args)
+
+
+@dataclass
+class PasswordHasherStats:
+    submitted: int = 0
+    completed: int = 0
+    rejected: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+    total_run: float = 0.0
+
+
+class PasswordHasher:
+    """Runs bcrypt hashing and verification in a bounded worker pool.
+
+    Jobs over `workers + queue_size` are rejected right away with 503
+    instead of piling up behind the pool.
+    """
+
+    def __init__(self, workers: int, queue_size: int, executor_type: str = 'thread'):
+        if executor_type not in ('thread', 'process'):
+            raise ValueError(f'Unknown password hasher executor type: {executor_type}')
+
+        self.workers = max(1, workers)
+        self.queue_size = max(0, queue_size)
+        self.executor_type = executor_type
+        self.stats = PasswordHasherStats()
+
+        self._executor: Optional[Executor] = None
+        self._pending = 0
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            if self.executor_type == 'process':
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hasher')
+            debugger.debug(f'Password hasher started: {self.executor_type} pool with {self.workers} workers')
+        return self._executor
+
+    @property
+    def in_flight(self) -> int:
+        return min(self._pending, self.workers)
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._pending - self.workers)
+
+    def _release(self, loop: asyncio.AbstractEventLoop, slots: int) -> None:
+        # called from a pool thread, or from the event loop when a queued job is cancelled
+        with suppress(RuntimeError):
+            loop.call_soon_threadsafe(self._decrement_pending, slots)
+
+    def _decrement_pending(self, slots: int) -> None:
+        self._pending -= slots
+
+    async def _run(self, func: Callable, *args: Any, slots: int = 1) -> Any:
+        """Runs a job in the pool, a job of a batch takes a slot per password."""
+        if self._pending + slots > self.workers + self.queue_size:
+            self.stats.rejected += slots
+            info.warning(f'Password hasher queue is full ({self.queue_size}), rejecting request')
+            raise PasswordHasherOverloadedException
+
+        loop = asyncio.get_running_loop()
+        self._pending += slots
+        self.stats.submitted += slots
+        submitted_at = time.monotonic()
+        try:
+            job = self.executor.submit(_timed_call, func, *args)
+        except BaseException:
+            self._pending -= slots
+            raise
+        # the slots are held until the pool is done with the job, a cancelled caller does not stop a running job
+        job.add_done_callback(lambda _: self._release(loop, slots))
+        started_at, result = await asyncio.wrap_future(job, loop=loop)
+
+        wait = max(0.0, started_at - submitted_at)
+        self.stats.completed += slots
+        self.stats.total_wait += wait * slots
+        self.stats.max_wait = max(self.stats.max_wait, wait)
+        self.stats.total_run += time.monotonic() - started_at
+        return result
+
+    async def hash(self, password: str) -> str:  # noqa: A003
+        return await self._run(_hash, password)
+
+    async def hash_many(self, passwords: Sequence[str]) -> list[str]:
+        """Hashes a batch with one pool job per worker, a batch that does not fit in the free slots is rejected.
+
+        When a job fails the jobs that have not started are cancelled, running
+        ones keep their slots until they finish.
+        """
+        if not passwords:
+            return []
+        if self._pending + len(passwords) > self.workers + self.queue_size:
+            self.stats.rejected += len(passwords)
+            raise PasswordHasherOverloadedException
+
+        size = -(-len(passwords) // self.workers)
+        chunks = [passwords[start:start + size] for start in range(0, len(passwords), size)]
+        jobs = [asyncio.ensure_future(self._run(_hash_batch, chunk, slots=len(chunk))) for chunk in chunks]
+        try:
+            results = await asyncio.gather(*jobs)
+        except BaseException:
+            for job in jobs:
+                job.cancel()
+            await asyncio.gather(*jobs, return_exceptions=True)
+            raise
+        return [hashed for chunk in results for hashed in chunk]
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        return await self._run(_verify, plain_password, hashed_password)
+
+    def metrics(self) -> dict[str, Any]:
+        completed = self.stats.completed or 1
+        return {
+            'executor': self.executor_type,
+            'workers': self.workers,
+            'queue_size': self.queue_size,
+            'queue_depth': self.queue_depth,
+            'in_flight': self.in_flight,
+            'submitted': self.stats.submitted,
+            'completed': self.stats.completed,
+            'rejected': self.stats.rejected,
+            'avg_wait_seconds': self.stats.total_wait / completed,
+            'max_wait_seconds': self.stats.max_wait,
+            'avg_run_seconds': self.stats.total_run / completed,
+        }
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+password_hasher = PasswordHasher(
+    workers=config('PASSWORD_HASHER_WORKERS', 1, module='src.auth.config'),
+    queue_size=config('PASSWORD_HASHER_QUEUE_SIZE', 0, module='src.auth.config'),
+    executor_type=config('PASSWORD_HASHER_EXECUTOR', 'thread', module='src.auth.config'),
+)
@@ -5,7 +5,8 @@ from fastapi.security import OAuth2PasswordRequestForm
 
 from src.auth.config import oauth2_scheme
 from src.auth.dependencies import get_auth_service
-from src.auth.schemas import RefreshToken, UserAndToken
+from src.auth.schemas import (RefreshToken, UserAndToken,
+                              user_and_token_serializer)
 from src.auth.services import AuthService
 from src.base.schemas import DetailModel
 from src.users.schemas import UserCreate
@@ -30,10 +31,11 @@ async def token(
     auth_credentials: Annotated[OAuth2PasswordRequestForm, Depends()],
     auth_service: Annotated[AuthService, Depends(get_auth_service)],
 ):
-    return await auth_service.authenticate_user(
+    user_and_token = await auth_service.authenticate_user(
         username=auth_credentials.username,
         password=auth_credentials.password,
     )
+    return user_and_token_serializer.response(user_and_token, status_code=status.HTTP_201_CREATED)
 
 
 @auth_router.post(
@@ -55,7 +57,8 @@ async def register(
     user_create: UserCreate,
     user_service: Annotated[AuthService, Depends(get_auth_service)],
 ):
-    return await user_service.register_user(user_create)
+    user_and_token = await user_service.register_user(user_create)
+    return user_and_token_serializer.response(user_and_token, status_code=status.HTTP_201_CREATED)
 
 
 @auth_router.post(
@@ -73,7 +76,7 @@ async def refresh(
     refresh_token: RefreshToken,
     auth_service: Annotated[AuthService, Depends(get_auth_service)],
 ):
-    return await auth_service.refresh_tokens(refresh_token.refresh_token)
+    return user_and_token_serializer.response(await auth_service.refresh_tokens(refresh_token.refresh_token))
 
 
 @auth_router.post(
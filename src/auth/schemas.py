@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 
+from src.base.serializers import ModelSerializer
 from src.users.schemas import UserRead
 
 
@@ -12,3 +13,6 @@ class UserAndToken(BaseModel):
 
 class RefreshToken(BaseModel):
     refresh_token: str
+
+
+user_and_token_serializer = ModelSerializer(UserAndToken)
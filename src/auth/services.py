@@ -1,19 +1,33 @@
 import datetime
+import hashlib
 import logging
 from dataclasses import dataclass
-from typing import Any
+from types import MappingProxyType
+from typing import Any, Mapping, NoReturn, Optional
 
+from fastapi import HTTPException
 from jose import JWTError, jwt
 
 from src.auth.auth_jwt import AuthTokenType, generate_tokens
+from src.auth.claims import CLAIMS, STATELESS_AUTH, TokenUser, user_versions
 from src.auth.config import JWT_SECRET
-from src.auth.exceptions import BadCredentialsException, BadTokenException
+from src.auth.exceptions import BadCredentialsException, BadTokenException, WebSocketBadTokenException
+from src.base.cache import LRUCache
+from src.base.exceptions import Forbidden, Unauthorized
+from src.config import config
 from src.users.models import User
 from src.users.schemas import UserCreate
 from src.users.services import RegisterService, UserService
 
 debugger = logging.getLogger('debugger')
 
+# sha256 of the token -> parsed payload. Only tokens that passed the signature and expiration
+# checks get here, revocation (user version) is checked by the callers on every request.
+# Entries are shared by every request with the token, so they are read-only.
+token_cache: LRUCache[Mapping[str, Any]] = LRUCache(
+    max_entries=config('TOKEN_CACHE_MAX_ENTRIES', 10_000, module='src.auth.config'),
+)
+
 
 @dataclass
 class AuthService:
@@ -22,6 +36,25 @@ class AuthService:
     @staticmethod
     def _parse_token(  # noqa: FNE008
             token: str, token_type: AuthTokenType,
+    ) -> Mapping[str, Any]:
+        key = hashlib.sha256(token.encode()).digest()
+        if (data := token_cache.get(key)) is not None:
+            if data['token_type'] != token_type:
+                debugger.debug(f'bad token type {data["token_type"]=} {token_type=}')
+                raise JWTError
+            return data
+
+        data = AuthService._verify_token(token, token_type)
+        if data['claims'] is not None:
+            data['claims'] = MappingProxyType(data['claims'])
+        data = MappingProxyType(data)
+        ttl = (datetime.datetime.fromisoformat(data['expires']) - datetime.datetime.utcnow()).total_seconds()
+        token_cache.set(key, data, ttl=ttl)
+        return data
+
+    @staticmethod
+    def _verify_token(  # noqa: FNE008
+            token: str, token_type: AuthTokenType,
     ) -> dict:
         payload = jwt.decode(
             token=token,
@@ -45,11 +78,14 @@ class AuthService:
             debugger.debug(f'{correct=} {expired=} {expires=}')
             raise JWTError
 
+        claims = {claim: payload[claim] for claim in CLAIMS if claim in payload}
+
         return {
             'user_id': user_id,
             'username': username,
             'expires': expires,
             'token_type': token_type,
+            'claims': claims if len(claims) == len(CLAIMS) else None,
         }
 
     async def get_user_from_token(
@@ -62,6 +98,65 @@ class AuthService:
             user = await self.user_service.get_user_by_id(user_id=data['user_id'], with_groups=True)
         return user
 
+    async def get_token_user(self, token: str) -> TokenUser | None:
+        data = self._parse_token(token=token, token_type=AuthTokenType.access)
+        claims = data['claims']
+        if STATELESS_AUTH and claims and not user_versions.is_stale(data['user_id'], claims['version']):
+            return TokenUser.from_payload(data)
+
+        user = await self.user_service.get_user_by_id(user_id=data['user_id'])
+        return TokenUser.from_user(user) if user else None
+
+    async def raise_banned(self, user: User) -> NoReturn:
+        msg = 'This user is banned'
+        banned_by = await self.user_service.get_user_by_id(user.banned_by)
+        if banned_by:
+            msg += f' by {banned_by.username}'
+        if user.ban_reason:
+            msg += f' with reason: {user.ban_reason}'
+        if user.ban_until:
+            msg += f' until {user.ban_until.isoformat()}'
+        raise Forbidden(msg)
+
+    @staticmethod
+    def check_requirements(user: User | TokenUser, checks: Optional[list[str]] = None) -> None:
+        if checks:
+            requirements = [getattr(user, check) for check in checks if hasattr(user, check)]
+            if not all(requirements):
+                raise Forbidden('This user does not have all the required permissions')
+
+    async def authenticate_token(self, token: str, checks: Optional[list[str]] = None) -> TokenUser:
+        """The user of an access token, banned users and users failing the `checks` are refused."""
+        try:
+            token_user = await self.get_token_user(token)
+        except JWTError as exc:
+            raise Unauthorized('Token expired') from exc
+
+        if token_user is None:
+            raise Unauthorized('Token expired')
+
+        if token_user.is_banned:
+            # claims could be issued before an unban, so the row decides
+            user = await self.user_service.get_user_by_id(token_user.id)
+            if user is None:
+                raise Unauthorized('Token expired')
+            if user.ban_active:
+                await self.raise_banned(user)
+            token_user = TokenUser.from_user(user)
+
+        self.check_requirements(token_user, checks)
+
+        return token_user
+
+    async def authenticate_websocket_token(self, token: Optional[str]) -> TokenUser:
+        """Same checks as authenticate_token, failures close the WebSocket with a policy violation."""
+        if not token:
+            raise WebSocketBadTokenException
+        try:
+            return await self.authenticate_token(token)
+        except HTTPException as exc:
+            raise WebSocketBadTokenException from exc
+
     async def authenticate_user(
         self, username: str, password: str,
     ) -> dict[str, Any]:
@@ -0,0 +1,54 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from src.base.models import BaseModel
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+@dataclass
+class QueryBudget:
+    """Fails if the wrapped block emits more statements or loads more ORM rows than allowed.
+
+    Meant for tests and checks guarding the loading strategy, e.g.
+
+        with QueryBudget(engine.sync_engine, max_statements=1, max_rows=1):
+            await repository.get_by_id(user_id)
+    """
+
+    engine: Engine
+    max_statements: Optional[int] = None
+    max_rows: Optional[int] = None
+    statements: list[str] = field(default_factory=list)
+    rows: int = 0
+
+    def _on_execute(self, conn, cursor, statement, parameters, context, executemany) -> None:  # noqa
+        self.statements.append(statement)
+
+    def _on_load(self, target, context) -> None:  # noqa
+        self.rows += 1
+
+    def __enter__(self) -> 'QueryBudget':
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        event.listen(BaseModel, 'load', self._on_load, propagate=True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+        event.remove(BaseModel, 'load', self._on_load)
+
+        if exc_type is not None:
+            return
+
+        if self.max_statements is not None and len(self.statements) > self.max_statements:
+            statements = '\n'.join(self.statements)
+            raise QueryBudgetExceeded(
+                f'{len(self.statements)} statements emitted, budget is {self.max_statements}:\n{statements}',
+            )
+        if self.max_rows is not None and self.rows > self.max_rows:
+            raise QueryBudgetExceeded(f'{self.rows} rows loaded, budget is {self.max_rows}')
@@ -0,0 +1,79 @@
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Generic, Hashable, Optional, TypeVar
+
+V = TypeVar('V')
+
+
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class LRUCache(Generic[V]):
+    """In-process LRU cache with a per-entry TTL and a fixed number of entries.
+
+    Not thread-safe, it is meant to be used from the event loop only.
+    """
+
+    def __init__(self, max_entries: int, ttl: Optional[float] = None):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data: OrderedDict[Hashable, tuple[V, float]] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            self.stats.expirations += 1
+            self.stats.misses += 1
+            return None
+
+        self._data.move_to_end(key)
+        self.stats.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: V, ttl: Optional[float] = None) -> None:  # noqa: A003
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else float('inf')
+
+        self._data[key] = (value, expires_at)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.stats.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            'entries': len(self._data),
+            'max_entries': self.max_entries,
+            'hits': self.stats.hits,
+            'misses': self.stats.misses,
+            'hit_rate': self.stats.hit_rate,
+            'evictions': self.stats.evictions,
+            'expirations': self.stats.expirations,
+        }
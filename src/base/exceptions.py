@@ -55,3 +55,16 @@ class NotFound(HTTPException):
             detail=detail or self.detail,
             headers=self.headers,
         )
+
+
+class ServiceUnavailable(HTTPException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    detail = 'Service temporarily unavailable'
+    headers = {'Retry-After': '1'}
+
+    def __init__(self, detail: Optional[str] = None):
+        super().__init__(
+            status_code=self.status_code,
+            detail=detail or self.detail,
+            headers=self.headers,
+        )
@@ -1,7 +1,8 @@
 from abc import ABC
 from dataclasses import dataclass
-from typing import Generic, TypeVar
+from typing import Any, ClassVar, Generic, Type, TypeVar
 
+from sqlalchemy import update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.base.models import BaseModel
@@ -11,25 +12,38 @@ T = TypeVar('T', bound=BaseModel)
 
 @dataclass
 class BaseRepository(ABC, Generic[T]):
+    """Stages changes in the session, committing is left to the UnitOfWork."""
+
     session: AsyncSession
+    model: ClassVar[Type[BaseModel]]
 
     async def create(self, obj: T) -> T:
         self.session.add(obj)
-        await self.session.commit()
+        await self.session.flush()
         return obj
 
     async def bulk_create(self, objs: list[T]) -> list[T]:
         self.session.add_all(objs)
-        await self.session.commit()
+        await self.session.flush()
         return objs
 
     async def delete(self, obj: T) -> None:
         await self.session.delete(obj)
-        await self.session.commit()
+        await self.session.flush()
 
     async def update(self, obj: T) -> None:
-        await self.session.merge(obj)
-        await self.session.commit()
+        await self.session.flush()
+
+    async def update_fields(self, obj_id: int, **values: Any) -> T | None:
+        """Single UPDATE ... WHERE id = ... RETURNING, refreshes the instance in the session if there is one."""
+        stmt = (
+            update(self.model)
+            .where(self.model.id == obj_id)
+            .values(**values)
+            .returning(self.model)
+            .execution_options(populate_existing=True)
+        )
+        return await self.session.scalar(stmt)
 
     async def flush(self) -> None:
         await self.session.flush()
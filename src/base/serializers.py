@@ -0,0 +1,63 @@
+from typing import Any, Generic, Mapping, Optional, TypeVar, get_args
+
+from fastapi import Response
+from pydantic import BaseModel
+
+M = TypeVar('M', bound=BaseModel)
+
+
+class SerializedResponse(Response):
+    """JSON response of a body that is already encoded."""
+
+    media_type = 'application/json'
+
+
+class ModelSerializer(Generic[M]):
+    """Encodes ORM objects and dicts straight to JSON bytes through the compiled serializer of a schema.
+
+    The field layout of the schema is resolved once. Values are read from the
+    source as they are, without validation, so it is meant for responses built
+    from data the app already validated or fully loaded rows of the database.
+    Only the presence of the fields is checked: a missing attribute or key
+    raises, and so does None in a field whose annotation does not allow it,
+    instead of being written out as null. Returning the response from a route
+    skips FastAPI's validation and encoding of the response_model, which stays
+    on the route for the docs.
+    """
+
+    def __init__(self, model: type[M]):
+        self.model = model
+        self._serializer = model.__pydantic_serializer__
+        self._fields: list[tuple[str, Optional[ModelSerializer]]] = [
+            (name, ModelSerializer(field.annotation) if _is_model(field.annotation) else None)
+            for name, field in model.model_fields.items()
+        ]
+        self._fields_set = set(model.model_fields)
+        self._not_nullable = {name for name, field in model.model_fields.items() if not _allows_none(field.annotation)}
+
+    def construct(self, source: Any) -> M:
+        if isinstance(source, self.model):
+            return source
+
+        get = source.__getitem__ if isinstance(source, Mapping) else source.__getattribute__
+        values = {}
+        for name, nested in self._fields:
+            value = get(name)
+            if value is None and name in self._not_nullable:
+                raise ValueError(f'{self.model.__name__}.{name} is None but the field does not allow it')
+            values[name] = value if nested is None or value is None else nested.construct(value)
+        return self.model.model_construct(self._fields_set, **values)
+
+    def dump_json(self, source: Any) -> bytes:
+        return self._serializer.to_json(self.construct(source))
+
+    def response(self, source: Any, status_code: int = 200) -> SerializedResponse:
+        return SerializedResponse(self.dump_json(source), status_code=status_code)
+
+
+def _allows_none(annotation: Any) -> bool:
+    return annotation is Any or annotation is None or type(None) in get_args(annotation)
+
+
+def _is_model(annotation: Any) -> bool:
+    return isinstance(annotation, type) and issubclass(annotation, BaseModel)
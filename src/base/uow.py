@@ -0,0 +1,31 @@
+from dataclasses import dataclass
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+
+@dataclass
+class UnitOfWork:
+    """Request scoped transaction shared by the repositories of one request.
+
+    Repositories only stage changes, the service commits once:
+
+        async with self.uow:
+            await self.user_repository.create(user)
+    """
+
+    session: AsyncSession
+
+    async def __aenter__(self) -> 'UnitOfWork':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        if exc_type is not None:
+            await self.rollback()
+        else:
+            await self.commit()
+
+    async def commit(self) -> None:
+        await self.session.commit()
+
+    async def rollback(self) -> None:
+        await self.session.rollback()
@@ -0,0 +1,26 @@
+# history page size, pages are cursor based so the maximum only bounds the response size
+MESSAGE_PAGE_SIZE = 50
+MESSAGE_MAX_PAGE_SIZE = 200
+INBOX_PAGE_SIZE = 50
+INBOX_MAX_PAGE_SIZE = 200
+
+# websocket fan-out, per connection
+WS_SEND_QUEUE_SIZE = 256
+WS_BATCH_SIZE = 64
+# 'disconnect' closes a connection whose queue is full, 'drop' skips the frames it can not take
+WS_SLOW_CONSUMER_POLICY = 'disconnect'
+
+# Chat.members_count and ChatUser.total_messages are buffered per worker and written this often
+COUNTER_FLUSH_INTERVAL_SECONDS = 2
+COUNTER_RECONCILE_BATCH_SIZE = 1000
+# rows per UPDATE ... FROM (VALUES ...) of a flush, asyncpg allows at most 32767 bind parameters per statement
+FLUSH_CHUNK_SIZE = 1000
+
+# ChatUser.last_active is tracked in memory and written this often, the window bounds the recently active lists
+PRESENCE_FLUSH_INTERVAL_SECONDS = 5
+PRESENCE_WINDOW_SECONDS = 300
+
+# the last message of a chat reaches its members' inbox summaries this often
+SUMMARY_FLUSH_INTERVAL_SECONDS = 2
+# unread counts are counted from the read marker when the inbox is read, up to this many per chat
+UNREAD_COUNT_LIMIT = 100
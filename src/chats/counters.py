@@ -0,0 +1,185 @@
+"""Buffered counters for Chat.members_count and ChatUser.total_messages.
+
+Increments are summed in memory per worker and written every
+COUNTER_FLUSH_INTERVAL_SECONDS as one UPDATE ... FROM (VALUES ...) per
+counter and FLUSH_CHUNK_SIZE rows, so a busy chat row is updated once per
+flush instead of once per event. The stored values are therefore
+approximate; the reconcile command recomputes them from chat_user and
+message rows:
+
+    python -m src.chats.counters reconcile
+"""
+import argparse
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import suppress
+from typing import Any, Callable, Optional, Sequence
+
+from sqlalchemy import ColumnClause, Executable, Integer, Values, column, update, values
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import InstrumentedAttribute, sessionmaker
+
+from src.chats.models import Chat, ChatUser
+from src.chats.repositories import ChatRepository
+from src.config import config
+from src.database import async_session_maker, engine
+
+info = logging.getLogger('all')
+
+FLUSH_CHUNK_SIZE = config('FLUSH_CHUNK_SIZE', 1000, module='src.chats.config')
+
+
+async def execute_from_values(
+        session: AsyncSession,
+        columns: Sequence[ColumnClause],
+        rows: Sequence[tuple],
+        statement: Callable[[Values], Executable],
+        chunk_size: int = FLUSH_CHUNK_SIZE,
+) -> None:
+    """Executes `statement(pending)` for every chunk of rows, `pending` is a VALUES table of the chunk.
+
+    A bind parameter per value, so the rows are split to stay under the
+    parameter limit of a statement. The caller commits, a failing chunk
+    rolls back the whole flush.
+    """
+    for start in range(0, len(rows), chunk_size):
+        pending = values(*columns, name='pending').data(rows[start:start + chunk_size])
+        await session.execute(statement(pending))
+
+
+class BufferedCounter:
+    """Pending increments of one integer column, keyed by the values of `key_columns`."""
+
+    def __init__(self, name: str, counter: InstrumentedAttribute, key_columns: tuple[InstrumentedAttribute, ...]):
+        self.name = name
+        self.counter = counter
+        self.key_columns = key_columns
+        self._deltas: defaultdict[tuple[int, ...], int] = defaultdict(int)
+        self.flushed = 0
+
+    def add(self, *key: int, delta: int = 1) -> None:
+        self._deltas[key] += delta
+
+    def pending(self, *key: int) -> int:
+        return self._deltas.get(key, 0)
+
+    def _columns(self) -> list[ColumnClause]:
+        return [*[column(key_column.key, Integer) for key_column in self.key_columns], column('delta', Integer)]
+
+    def _statement(self, pending: Values):
+        model = self.counter.class_
+        return (
+            update(model)
+            .where(*[key_column == pending.c[key_column.key] for key_column in self.key_columns])
+            .values({self.counter: self.counter + pending.c.delta})
+            .execution_options(synchronize_session=False)
+        )
+
+    async def flush(self, session: AsyncSession) -> int:
+        """Writes the pending increments in one transaction, they are kept for the next flush if it fails."""
+        if not self._deltas:
+            return 0
+
+        deltas, self._deltas = self._deltas, defaultdict(int)
+        # same order in every worker, so concurrent flushes lock the rows in the same order
+        rows = sorted((*key, delta) for key, delta in deltas.items() if delta)
+        try:
+            if rows:
+                await execute_from_values(session, self._columns(), rows, self._statement)
+                await session.commit()
+        except BaseException:
+            await session.rollback()
+            for key, delta in deltas.items():
+                self._deltas[key] += delta
+            raise
+
+        self.flushed += len(rows)
+        return len(rows)
+
+    def metrics(self) -> dict[str, Any]:
+        return {'pending': len(self._deltas), 'flushed': self.flushed}
+
+
+class CounterFlusher:
+    """Flushes the counters of this worker periodically and once more on shutdown."""
+
+    def __init__(self, counters: list[BufferedCounter], session_maker: sessionmaker, interval: float):
+        self.counters = counters
+        self.session_maker = session_maker
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def flush(self) -> None:
+        async with self.session_maker() as session:
+            for counter in self.counters:
+                try:
+                    await counter.flush(session)
+                except Exception:
+                    info.exception(f'flushing {counter.name} counter failed')
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.flush()
+            except Exception:
+                # a failed flush keeps its rows for the next one, the loop must outlive it
+                info.exception('counter flush failed')
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+        await self.flush()
+
+    def metrics(self) -> dict[str, Any]:
+        return {counter.name: counter.metrics() for counter in self.counters}
+
+
+members_counter = BufferedCounter('members_count', Chat.members_count, (Chat.id,))
+messages_counter = BufferedCounter('total_messages', ChatUser.total_messages, (ChatUser.chat_id, ChatUser.user_id))
+
+counter_flusher = CounterFlusher(
+    [members_counter, messages_counter],
+    async_session_maker,
+    interval=config('COUNTER_FLUSH_INTERVAL_SECONDS', 2, module='src.chats.config'),
+)
+
+
+async def reconcile(batch_size: int) -> dict[str, int]:
+    """Recomputes the counters of every chat from the source rows, in batches of chats."""
+    fixed = {'members_count': 0, 'total_messages': 0}
+    after = 0
+    async with async_session_maker() as session:
+        repository = ChatRepository(session)
+        while chat_ids := await repository.get_chat_ids_after(after, batch_size):
+            fixed['members_count'] += await repository.reconcile_members_count(chat_ids)
+            fixed['total_messages'] += await repository.reconcile_total_messages(chat_ids)
+            await session.commit()
+            after = chat_ids[-1]
+    await engine.dispose()
+    return fixed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('command', choices=['reconcile'])
+    parser.add_argument(
+        '--batch-size', type=int, default=config('COUNTER_RECONCILE_BATCH_SIZE', 1000, module='src.chats.config'),
+    )
+    args = parser.parse_args()
+
+    fixed = asyncio.run(reconcile(args.batch_size))
+    print(f'fixed {fixed["members_count"]} members_count and {fixed["total_messages"]} total_messages values')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+from typing import Annotated
+
+from fastapi import Depends
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.auth.dependencies import get_auth_service
+from src.auth.services import AuthService
+from src.base.uow import UnitOfWork
+from src.chats.repositories import (ChatRepository, InviteLinkRepository,
+                                    MessageRepository)
+from src.chats.services import (ChatService, ChatSubscriptionService,
+                                InviteService, MessageService)
+from src.database import get_async_session
+from src.users.dependencies import get_unit_of_work
+
+
+async def get_chat_repository(
+        session: Annotated[AsyncSession, Depends(get_async_session)],
+) -> ChatRepository:
+    return ChatRepository(session)
+
+
+async def get_message_repository(
+        session: Annotated[AsyncSession, Depends(get_async_session)],
+) -> MessageRepository:
+    return MessageRepository(session)
+
+
+async def get_invite_link_repository(
+        session: Annotated[AsyncSession, Depends(get_async_session)],
+) -> InviteLinkRepository:
+    return InviteLinkRepository(session)
+
+
+async def get_chat_service(
+        chat_repository: Annotated[ChatRepository, Depends(get_chat_repository)],
+) -> ChatService:
+    return ChatService(chat_repository)
+
+
+async def get_message_service(
+        chat_repository: Annotated[ChatRepository, Depends(get_chat_repository)],
+        message_repository: Annotated[MessageRepository, Depends(get_message_repository)],
+        uow: Annotated[UnitOfWork, Depends(get_unit_of_work)],
+) -> MessageService:
+    return MessageService(chat_repository, message_repository, uow)
+
+
+async def get_chat_subscription_service(
+        auth_service: Annotated[AuthService, Depends(get_auth_service)],
+        chat_repository: Annotated[ChatRepository, Depends(get_chat_repository)],
+        uow: Annotated[UnitOfWork, Depends(get_unit_of_work)],
+) -> ChatSubscriptionService:
+    return ChatSubscriptionService(auth_service, chat_repository, uow)
+
+
+async def get_invite_service(
+        invite_link_repository: Annotated[InviteLinkRepository, Depends(get_invite_link_repository)],
+        chat_repository: Annotated[ChatRepository, Depends(get_chat_repository)],
+        uow: Annotated[UnitOfWork, Depends(get_unit_of_work)],
+) -> InviteService:
+    return InviteService(invite_link_repository, chat_repository, uow)
@@ -0,0 +1,15 @@
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+
+class AlreadyChatMember(HTTPException):
+    status_code = status.HTTP_409_CONFLICT
+    detail = 'User is already a member of this chat'
+
+    def __init__(self, detail: Optional[str] = None):
+        super().__init__(
+            status_code=self.status_code,
+            detail=detail or self.detail,
+            headers=None,
+        )
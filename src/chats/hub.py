@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import uuid
+from collections import defaultdict
+from contextlib import suppress
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from fastapi import WebSocket, WebSocketDisconnect, status
+
+from src.config import config
+from src.pubsub import PubSub, pubsub
+
+info = logging.getLogger('all')
+debugger = logging.getLogger('debugger')
+
+CHAT_CHANNEL = 'chat_events'
+MEMBERSHIP_CHANNEL = 'chat_membership'
+# user ids per close message, keeps the payload well under the 8000 bytes NOTIFY limit
+CLOSE_BATCH = 500
+# NOTIFY payloads are limited to 8000 bytes, bigger frames are replaced by `fallback` for the other workers
+MAX_PUBLISH_BYTES = 7900
+
+
+@dataclass(eq=False)
+class ChatConnection:
+    """One WebSocket with a bounded send queue.
+
+    Frames are pre-serialized JSON objects; the sender drains up to
+    `batch_size` of them at a time and writes them as one JSON array frame.
+    """
+
+    websocket: WebSocket
+    user_id: int
+    chat_ids: set[int]
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    batch_size: int = 64
+    dropped: int = 0
+    overloaded: bool = False
+    closed: asyncio.Event = field(default_factory=asyncio.Event)
+    close_code: int = status.WS_1000_NORMAL_CLOSURE
+
+    def offer(self, frame: str, policy: str) -> bool:
+        """Queues a frame without waiting, returns False if the connection can not keep up."""
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if policy == 'disconnect':
+                self.overloaded = True
+            return False
+
+    async def _send(self) -> None:
+        while not self.overloaded:
+            frames = [await self.queue.get()]
+            while len(frames) < self.batch_size and not self.queue.empty():
+                frames.append(self.queue.get_nowait())
+            await self.websocket.send_text(f'[{",".join(frames)}]')
+
+        # the queue filled up while we were sending, the client has to reconnect and catch up from history
+        await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+
+    async def _receive(self) -> None:
+        # nothing is expected from the client, reading only notices the disconnect
+        while True:
+            message = await self.websocket.receive()
+            if message['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(message.get('code', status.WS_1000_NORMAL_CLOSURE))
+
+    def close(self, code: int) -> None:
+        """Makes run() close the socket, the frames still queued are not sent."""
+        self.close_code = code
+        self.closed.set()
+
+    async def run(self) -> None:
+        sender = asyncio.create_task(self._send())
+        receiver = asyncio.create_task(self._receive())
+        closer = asyncio.create_task(self.closed.wait())
+        try:
+            await asyncio.wait((sender, receiver, closer), return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (sender, receiver, closer):
+                task.cancel()
+            await asyncio.gather(sender, receiver, closer, return_exceptions=True)
+
+        if self.closed.is_set():
+            # the client may have gone away meanwhile
+            with suppress(RuntimeError):
+                await self.websocket.close(code=self.close_code)
+
+
+class ChatHub:
+    """In-process fan-out of chat events to the WebSocket connections of this worker.
+
+    Events are published through the pubsub, so with the postgres backend every
+    worker receives them and delivers to its own connections. The publishing
+    worker delivers locally right away and ignores its own echo.
+
+    Membership changes are broadcast the same way: joins and leaves update the
+    subscriptions of the user's live connections, banned users are closed. A
+    change made between the subscription query of a new connection and its
+    connect() is picked up when the client reconnects.
+    """
+
+    def __init__(self, pubsub: PubSub, queue_size: int, batch_size: int, policy: str):
+        if policy not in ('drop', 'disconnect'):
+            raise ValueError(f'Unknown slow consumer policy: {policy}')
+
+        self.pubsub = pubsub
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.policy = policy
+        self.origin = uuid.uuid4().hex
+        self._chats: defaultdict[int, set[ChatConnection]] = defaultdict(set)
+        self._users: defaultdict[int, set[ChatConnection]] = defaultdict(set)
+        self._connections: set[ChatConnection] = set()
+        self.delivered = 0
+        self.dropped = 0
+        self.disconnected = 0
+        pubsub.subscribe(CHAT_CHANNEL, self._on_event)
+        pubsub.subscribe(MEMBERSHIP_CHANNEL, self._on_membership)
+
+    def connect(self, websocket: WebSocket, user_id: int, chat_ids: list[int]) -> ChatConnection:
+        connection = ChatConnection(
+            websocket=websocket,
+            user_id=user_id,
+            chat_ids=set(chat_ids),
+            queue=asyncio.Queue(maxsize=self.queue_size),
+            batch_size=self.batch_size,
+        )
+        self._connections.add(connection)
+        self._users[user_id].add(connection)
+        for chat_id in connection.chat_ids:
+            self._chats[chat_id].add(connection)
+        return connection
+
+    def disconnect(self, connection: ChatConnection) -> None:
+        if connection not in self._connections:
+            return
+
+        self._connections.discard(connection)
+        self._discard(self._users, connection.user_id, connection)
+        for chat_id in connection.chat_ids:
+            self._discard(self._chats, chat_id, connection)
+
+    @staticmethod
+    def _discard(index: defaultdict[int, set[ChatConnection]], key: int, connection: ChatConnection) -> None:
+        connections = index.get(key)
+        if connections is None:
+            return
+        connections.discard(connection)
+        if not connections:
+            del index[key]
+
+    def deliver(self, chat_id: int, frame: str) -> None:
+        for connection in list(self._chats.get(chat_id, ())):
+            if connection.offer(frame, self.policy):
+                self.delivered += 1
+                continue
+
+            self.dropped += 1
+            if connection.overloaded:
+                debugger.debug(f'disconnecting slow websocket consumer of user {connection.user_id}')
+                self.disconnected += 1
+                # stop offering right away, the sender closes the socket once it gets to it
+                self.disconnect(connection)
+
+    async def publish(self, chat_id: int, frame: str, fallback: Optional[str] = None) -> None:
+        self.deliver(chat_id, frame)
+
+        if len(frame.encode()) > MAX_PUBLISH_BYTES:
+            if fallback is None:
+                info.warning(f'chat {chat_id} frame is too big to publish to other workers')
+                return
+            frame = fallback
+        await self.pubsub.publish(CHAT_CHANNEL, f'{self.origin}:{chat_id}:{frame}')
+
+    def _on_event(self, payload: str) -> None:
+        origin, chat_id, frame = payload.split(':', 2)
+        if origin != self.origin:
+            self.deliver(int(chat_id), frame)
+
+    def _apply_membership(self, action: str, chat_id: int, user_id: int) -> None:
+        for connection in list(self._users.get(user_id, ())):
+            if action == 'join':
+                connection.chat_ids.add(chat_id)
+                self._chats[chat_id].add(connection)
+            else:
+                connection.chat_ids.discard(chat_id)
+                self._discard(self._chats, chat_id, connection)
+
+    def _close_users(self, user_ids: list[int]) -> None:
+        for user_id in user_ids:
+            for connection in list(self._users.get(user_id, ())):
+                debugger.debug(f'closing websocket of banned user {user_id}')
+                connection.close(status.WS_1008_POLICY_VIOLATION)
+                self.disconnect(connection)
+
+    async def join(self, chat_id: int, user_id: int) -> None:
+        """Subscribes the live connections of the user to the chat, on every worker."""
+        self._apply_membership('join', chat_id, user_id)
+        await self.pubsub.publish(MEMBERSHIP_CHANNEL, f'{self.origin}:join:{chat_id}:{user_id}')
+
+    async def leave(self, chat_id: int, user_id: int) -> None:
+        """Unsubscribes the live connections of the user from the chat, on every worker."""
+        self._apply_membership('leave', chat_id, user_id)
+        await self.pubsub.publish(MEMBERSHIP_CHANNEL, f'{self.origin}:leave:{chat_id}:{user_id}')
+
+    async def close_users(self, user_ids: list[int]) -> None:
+        """Closes the live connections of banned users with a policy violation, on every worker."""
+        self._close_users(user_ids)
+        for start in range(0, len(user_ids), CLOSE_BATCH):
+            batch = user_ids[start:start + CLOSE_BATCH]
+            await self.pubsub.publish(MEMBERSHIP_CHANNEL, f'{self.origin}:close:{",".join(map(str, batch))}')
+
+    def _on_membership(self, payload: str) -> None:
+        origin, action, target = payload.split(':', 2)
+        if origin == self.origin:
+            return
+        if action == 'close':
+            self._close_users([int(user_id) for user_id in target.split(',')])
+        else:
+            chat_id, user_id = target.split(':')
+            self._apply_membership(action, int(chat_id), int(user_id))
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            'connections': len(self._connections),
+            'chats': len(self._chats),
+            'delivered': self.delivered,
+            'dropped': self.dropped,
+            'disconnected': self.disconnected,
+        }
+
+
+chat_hub = ChatHub(
+    pubsub=pubsub,
+    queue_size=config('WS_SEND_QUEUE_SIZE', 256, module='src.chats.config'),
+    batch_size=config('WS_BATCH_SIZE', 64, module='src.chats.config'),
+    policy=config('WS_SLOW_CONSUMER_POLICY', 'disconnect', module='src.chats.config'),
+)
@@ -1,9 +1,9 @@
 import datetime
 from enum import Enum
 
-from sqlalchemy import Boolean, DateTime
+from sqlalchemy import BigInteger, Boolean, DateTime
 from sqlalchemy import Enum as ORMEnum
-from sqlalchemy import ForeignKey, Integer, String, Uuid
+from sqlalchemy import ForeignKey, Index, Integer, String, Uuid, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.base.models import BaseModel
@@ -16,6 +16,10 @@ class Role(str, Enum):
     ADMIN = '2'
 
 
+# length of the last message text kept in the inbox summary of chat_user
+MESSAGE_PREVIEW_LENGTH = 100
+
+
 # chat = Table(
 #     'chat',
 #     base_metadata,
@@ -109,6 +113,21 @@ class ChatUser(BaseModel):
     is_banned: Mapped[bool] = mapped_column(
         Boolean, default=False,
     )
+    # inbox summary, written by the summary buffer in src/chats/summaries.py
+    last_message_id: Mapped[int] = mapped_column(
+        BigInteger, nullable=True, default=None,
+    )
+    last_message_preview: Mapped[str] = mapped_column(
+        String(length=MESSAGE_PREVIEW_LENGTH), nullable=True, default=None,
+    )
+    # id of the last message the member has read, unread counts are the newer messages of others
+    last_read_id: Mapped[int] = mapped_column(
+        BigInteger, nullable=True, default=None,
+    )
+    # time of the last message, or of joining while there is none; the inbox is ordered by it
+    activity_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, nullable=False, default=datetime.datetime.utcnow, server_default=func.timezone('utc', func.now()),
+    )
 
     # relation
     chat: Mapped['Chat'] = relationship(
@@ -118,6 +137,13 @@ class ChatUser(BaseModel):
         'User',
     )
 
+    # one membership row per user and chat, rejoining reuses it;
+    # inbox pages are read with WHERE user_id = ? AND (activity_at, chat_id) < (?, ?) newest first
+    __table_args__ = (
+        Index('ix_chat_user_chat_id_user_id', 'chat_id', 'user_id', unique=True),
+        Index('ix_chat_user_user_id_activity_at', 'user_id', 'activity_at', 'chat_id'),
+    )
+
 
 class InviteLink(BaseModel):
     __tablename__ = 'invite_link'
@@ -126,7 +152,7 @@ class InviteLink(BaseModel):
         Integer, primary_key=True, autoincrement=True, nullable=False,
     )
     link: Mapped[str] = mapped_column(
-        Uuid, nullable=False,
+        Uuid, unique=True, index=True, nullable=False,
     )
     chat_id: Mapped[int] = mapped_column(
         ForeignKey(Chat.id), nullable=False,
@@ -154,3 +180,29 @@ class InviteLink(BaseModel):
     owner: Mapped['User'] = relationship(
         'User',
     )
+
+
+class Message(BaseModel):
+    __tablename__ = 'message'
+
+    id: Mapped[int] = mapped_column(  # noqa
+        BigInteger, primary_key=True, autoincrement=True, nullable=False,
+    )
+    chat_id: Mapped[int] = mapped_column(
+        ForeignKey(Chat.id), nullable=False,
+    )
+    user_id: Mapped[int] = mapped_column(
+        ForeignKey(User.id), nullable=False,
+    )
+    text: Mapped[str] = mapped_column(
+        String(length=4096), nullable=False,
+    )
+    created_at: Mapped[datetime.datetime] = mapped_column(
+        DateTime, nullable=False, default=datetime.datetime.utcnow,
+    )
+
+    # history pages are read newest first with WHERE chat_id = ? AND id < ? ORDER BY id DESC,
+    # the index serves both the filter and the order, so a page costs the same at any depth
+    __table_args__ = (
+        Index('ix_message_chat_id_id', 'chat_id', 'id'),
+    )
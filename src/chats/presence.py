@@ -0,0 +1,150 @@
+"""Write-coalescing tracker of ChatUser.last_active.
+
+Activity is recorded in memory and written every PRESENCE_FLUSH_INTERVAL_SECONDS
+as UPDATE ... FROM (VALUES ...) statements of FLUSH_CHUNK_SIZE rows, only the latest time of a membership since
+the previous flush is kept. Flushed times are shared with the other workers
+through the pubsub, so every worker can answer who was recently active in a
+chat without a query.
+"""
+import datetime
+import logging
+import uuid
+from collections import defaultdict
+from typing import Any, Optional
+
+from sqlalchemy import DateTime, Integer, Values, column, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.chats.counters import CounterFlusher, execute_from_values
+from src.chats.models import ChatUser
+from src.config import config
+from src.database import async_session_maker
+from src.pubsub import PubSub, pubsub
+
+debugger = logging.getLogger('debugger')
+
+PRESENCE_CHANNEL = 'chat_presence'
+# entries per notification, keeps the payload under the 8000 bytes NOTIFY limit
+PUBLISH_BATCH_SIZE = 200
+
+PENDING_COLUMNS = (column('chat_id', Integer), column('user_id', Integer), column('last_active', DateTime))
+
+
+class PresenceTracker:
+    """Last activity per (chat id, user id), pending writes and a recent window per chat."""
+
+    name = 'last_active'
+
+    def __init__(self, pubsub: PubSub, window: float):
+        self.pubsub = pubsub
+        self.window = datetime.timedelta(seconds=window)
+        self.origin = uuid.uuid4().hex
+        self._pending: dict[tuple[int, int], datetime.datetime] = {}
+        self._recent: defaultdict[int, dict[int, datetime.datetime]] = defaultdict(dict)
+        self.coalesced = 0
+        self.flushed = 0
+        pubsub.subscribe(PRESENCE_CHANNEL, self._on_seen)
+
+    def _remember(self, chat_id: int, user_id: int, at: datetime.datetime) -> None:
+        recent = self._recent[chat_id]
+        if user_id not in recent or recent[user_id] < at:
+            recent[user_id] = at
+
+    def touch(self, chat_id: int, user_id: int, at: Optional[datetime.datetime] = None) -> None:
+        """Records activity of the user in the chat, `at` is naive UTC like ChatUser.last_active."""
+        at = at or datetime.datetime.utcnow()
+        key = (chat_id, user_id)
+        if key in self._pending:
+            self.coalesced += 1
+            at = max(at, self._pending[key])
+        self._pending[key] = at
+        self._remember(chat_id, user_id, at)
+
+    def recently_active(self, chat_id: int, within: Optional[float] = None) -> list[tuple[int, datetime.datetime]]:
+        """(user id, last seen) of the users active in the chat during the window, most recent first."""
+        since = datetime.datetime.utcnow() - (datetime.timedelta(seconds=within) if within else self.window)
+        active = [(user_id, at) for user_id, at in self._recent.get(chat_id, {}).items() if at >= since]
+        return sorted(active, key=lambda item: item[1], reverse=True)
+
+    def _prune(self) -> None:
+        since = datetime.datetime.utcnow() - self.window
+        for chat_id in list(self._recent):
+            recent = {user_id: at for user_id, at in self._recent[chat_id].items() if at >= since}
+            if recent:
+                self._recent[chat_id] = recent
+            else:
+                del self._recent[chat_id]
+
+    @staticmethod
+    def _statement(pending: Values):
+        return (
+            update(ChatUser)
+            .where(
+                ChatUser.chat_id == pending.c.chat_id,
+                ChatUser.user_id == pending.c.user_id,
+                # a slower worker must not move the time back
+                ChatUser.last_active < pending.c.last_active,
+            )
+            .values(last_active=pending.c.last_active)
+            .execution_options(synchronize_session=False)
+        )
+
+    async def flush(self, session: AsyncSession) -> int:
+        """Writes the pending times in one transaction, they are kept for the next flush if it fails."""
+        self._prune()
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        # same order in every worker, so concurrent flushes lock the rows in the same order
+        rows = sorted((*key, at) for key, at in pending.items())
+        try:
+            await execute_from_values(session, PENDING_COLUMNS, rows, self._statement)
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            for key, at in pending.items():
+                if key not in self._pending or self._pending[key] < at:
+                    self._pending[key] = at
+            raise
+
+        self.flushed += len(rows)
+        await self._publish(rows)
+        return len(rows)
+
+    async def _publish(self, rows: list[tuple[int, int, datetime.datetime]]) -> None:
+        for start in range(0, len(rows), PUBLISH_BATCH_SIZE):
+            batch = rows[start:start + PUBLISH_BATCH_SIZE]
+            entries = ';'.join(f'{chat_id},{user_id},{at.isoformat()}' for chat_id, user_id, at in batch)
+            await self.pubsub.publish(PRESENCE_CHANNEL, f'{self.origin}:{entries}')
+
+    def _on_seen(self, payload: str) -> None:
+        origin, entries = payload.split(':', 1)
+        if origin == self.origin:
+            return
+        for entry in entries.split(';'):
+            try:
+                chat_id, user_id, at = entry.split(',')
+                self._remember(int(chat_id), int(user_id), datetime.datetime.fromisoformat(at))
+            except ValueError:
+                debugger.debug(f'bad presence entry: {entry}')
+
+    def metrics(self) -> dict[str, Any]:
+        return {
+            'pending': len(self._pending),
+            'flushed': self.flushed,
+            'coalesced': self.coalesced,
+            'chats': len(self._recent),
+        }
+
+
+presence_tracker = PresenceTracker(
+    pubsub=pubsub,
+    window=config('PRESENCE_WINDOW_SECONDS', 300, module='src.chats.config'),
+)
+
+presence_flusher = CounterFlusher(
+    [presence_tracker],
+    async_session_maker,
+    interval=config('PRESENCE_FLUSH_INTERVAL_SECONDS', 5, module='src.chats.config'),
+)
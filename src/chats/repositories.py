@@ -0,0 +1,211 @@
+import datetime
+import uuid
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from sqlalchemy import (Row, and_, exists, func, or_, select, text, tuple_,
+                        update)
+
+from src.base.repositories import BaseRepository
+from src.chats.models import Chat, ChatUser, InviteLink, Message
+from src.config import config
+
+UNREAD_COUNT_LIMIT = config('UNREAD_COUNT_LIMIT', 100, module='src.chats.config')
+
+ACTIVE_MEMBER = (ChatUser.is_left.is_(False), ChatUser.is_banned.is_(False))
+
+# takes a use of the link and adds or restores the membership in one round trip. Plain text: the same CTE
+# built from update(InviteLink) and insert(ChatUser).on_conflict_do_update() has no cache key, so every
+# redeem compiled it again, which took about 3ms against 0.4-0.5ms for the whole text statement.
+REDEEM_INVITE_LINK = text("""
+WITH redeemed AS (
+    UPDATE invite_link SET count_uses = count_uses + 1
+    WHERE link = :link
+      AND (max_uses IS NULL OR count_uses < max_uses)
+      AND (expires_at IS NULL OR expires_at > timezone('utc', now()))
+      AND chat_id IN (SELECT id FROM chat WHERE is_closed IS NOT true)
+    RETURNING chat_id
+), joined AS (
+    INSERT INTO chat_user (chat_id, user_id, total_messages, last_active, is_left, is_banned)
+    SELECT chat_id, :user_id, 0, timezone('utc', now()), false, false FROM redeemed
+    ON CONFLICT (chat_id, user_id) DO UPDATE SET is_left = false, last_active = excluded.last_active
+    WHERE chat_user.is_left AND NOT chat_user.is_banned
+    RETURNING id
+)
+SELECT redeemed.chat_id, joined.id FROM redeemed LEFT JOIN joined ON true
+""")
+
+
+@dataclass
+class ChatRepository(BaseRepository[Chat]):
+    model = Chat
+
+    async def get_member_chat(self, chat_id: int, user_id: int) -> Chat | None:
+        """The chat, if the user is an active member of it."""
+        return await self.session.scalar(
+            select(Chat)
+            .join(ChatUser, ChatUser.chat_id == Chat.id)
+            .where(
+                Chat.id == chat_id,
+                ChatUser.user_id == user_id,
+                *ACTIVE_MEMBER,
+            ),
+        )
+
+    async def get_counters(self, chat_id: int, user_id: int) -> tuple[int, int] | None:
+        """Stored (members_count, total_messages of the user) as of the last counter flush, None for non-members."""
+        result = await self.session.execute(
+            select(Chat.members_count, ChatUser.total_messages)
+            .join(ChatUser, ChatUser.chat_id == Chat.id)
+            .where(Chat.id == chat_id, ChatUser.user_id == user_id, *ACTIVE_MEMBER),
+        )
+        return result.tuples().first()
+
+    async def count_members(self, chat_id: int) -> int:
+        return await self.session.scalar(
+            select(func.count()).select_from(ChatUser).where(ChatUser.chat_id == chat_id, *ACTIVE_MEMBER),
+        )
+
+    async def count_messages(self, chat_id: int, user_id: int) -> int:
+        return await self.session.scalar(
+            select(func.count()).select_from(Message).where(Message.chat_id == chat_id, Message.user_id == user_id),
+        )
+
+    async def get_chat_ids_after(self, after: int, limit: int) -> Sequence[int]:
+        result = await self.session.scalars(select(Chat.id).where(Chat.id > after).order_by(Chat.id).limit(limit))
+        return result.all()
+
+    async def reconcile_members_count(self, chat_ids: Sequence[int]) -> int:
+        """Sets members_count of the chats to the number of active members, returns the number of fixed rows."""
+        counts = (
+            select(Chat.id.label('chat_id'), func.count(ChatUser.id).label('count'))
+            .outerjoin(ChatUser, and_(ChatUser.chat_id == Chat.id, *ACTIVE_MEMBER))
+            .where(Chat.id.in_(chat_ids))
+            .group_by(Chat.id)
+            .subquery()
+        )
+        result = await self.session.execute(
+            update(Chat)
+            .where(Chat.id == counts.c.chat_id, Chat.members_count != counts.c.count)
+            .values(members_count=counts.c.count)
+            .execution_options(synchronize_session=False),
+        )
+        return result.rowcount
+
+    async def reconcile_total_messages(self, chat_ids: Sequence[int]) -> int:
+        """Sets total_messages of the members of the chats to their message count, returns the number of fixed rows."""
+        counts = (
+            select(ChatUser.id.label('chat_user_id'), func.count(Message.id).label('count'))
+            .outerjoin(Message, and_(Message.chat_id == ChatUser.chat_id, Message.user_id == ChatUser.user_id))
+            .where(ChatUser.chat_id.in_(chat_ids))
+            .group_by(ChatUser.id)
+            .subquery()
+        )
+        result = await self.session.execute(
+            update(ChatUser)
+            .where(ChatUser.id == counts.c.chat_user_id, ChatUser.total_messages.is_distinct_from(counts.c.count))
+            .values(total_messages=counts.c.count)
+            .execution_options(synchronize_session=False),
+        )
+        return result.rowcount
+
+    async def get_member(self, chat_id: int, user_id: int) -> ChatUser | None:
+        return await self.session.scalar(
+            select(ChatUser).where(ChatUser.chat_id == chat_id, ChatUser.user_id == user_id),
+        )
+
+    async def get_inbox(
+            self, user_id: int, after: Optional[tuple[datetime.datetime, int]], limit: int,
+    ) -> Sequence[Row]:
+        """Inbox summaries of the user's chats, most recent activity first, after the (activity_at, chat_id) cursor.
+
+        One query per page whatever the number of chats, served by the (user_id, activity_at, chat_id) index.
+        Unread messages are counted after the read marker of each chat, up to UNREAD_COUNT_LIMIT.
+        """
+        unread = (
+            select(Message.id)
+            .where(
+                Message.chat_id == ChatUser.chat_id,
+                Message.id > func.coalesce(ChatUser.last_read_id, 0),
+                Message.user_id != user_id,
+            )
+            .limit(UNREAD_COUNT_LIMIT)
+            .correlate(ChatUser)
+            .subquery()
+        )
+        unread_count = select(func.count()).select_from(unread).scalar_subquery().label('unread_count')
+        stmt = (
+            select(
+                ChatUser.chat_id, Chat.name, Chat.is_closed, ChatUser.last_message_id,
+                ChatUser.last_message_preview, unread_count, ChatUser.activity_at,
+            )
+            .join(Chat, Chat.id == ChatUser.chat_id)
+            .where(ChatUser.user_id == user_id, *ACTIVE_MEMBER)
+        )
+        if after is not None:
+            stmt = stmt.where(tuple_(ChatUser.activity_at, ChatUser.chat_id) < tuple_(*after))
+
+        result = await self.session.execute(
+            stmt.order_by(ChatUser.activity_at.desc(), ChatUser.chat_id.desc()).limit(limit),
+        )
+        return result.all()
+
+    async def mark_read(self, chat_id: int, user_id: int, message_id: int) -> None:
+        """Moves the read marker of the member forward to a message of the chat, never back."""
+        await self.session.execute(
+            update(ChatUser)
+            .where(
+                ChatUser.chat_id == chat_id,
+                ChatUser.user_id == user_id,
+                *ACTIVE_MEMBER,
+                or_(ChatUser.last_read_id.is_(None), ChatUser.last_read_id < message_id),
+                exists().where(Message.chat_id == chat_id, Message.id == message_id),
+            )
+            .values(last_read_id=message_id)
+            .execution_options(synchronize_session=False),
+        )
+
+    async def get_user_chat_ids(self, user_id: int) -> Sequence[int]:
+        result = await self.session.scalars(
+            select(ChatUser.chat_id).where(
+                ChatUser.user_id == user_id,
+                *ACTIVE_MEMBER,
+            ),
+        )
+        return result.all()
+
+
+@dataclass
+class MessageRepository(BaseRepository[Message]):
+    model = Message
+
+    async def get_page(self, chat_id: int, before: Optional[int], limit: int) -> Sequence[Message]:
+        """Newest first, keyset paginated on (chat_id, id): `before` is the id of the last message already seen."""
+        stmt = select(Message).where(Message.chat_id == chat_id)
+        if before is not None:
+            stmt = stmt.where(Message.id < before)
+
+        result = await self.session.scalars(stmt.order_by(Message.id.desc()).limit(limit))
+        return result.all()
+
+
+@dataclass
+class InviteLinkRepository(BaseRepository[InviteLink]):
+    model = InviteLink
+
+    async def redeem(self, link: uuid.UUID, user_id: int) -> tuple[int, int | None] | None:
+        """Takes one use of a valid link and adds the user to its chat, in one statement.
+
+        The conditional UPDATE ... WHERE count_uses < max_uses ... RETURNING makes concurrent
+        redemptions wait on the link row and re-check the conditions, so a link is never used
+        more than max_uses times; the row stays locked only until the caller commits.
+
+        Returns (chat id, membership id), the membership id is None if the user already is an
+        active or banned member, then the caller has to roll back the taken use. None if the
+        link does not exist, expired, is used up or its chat is closed.
+        """
+        result = await self.session.execute(REDEEM_INVITE_LINK, {'link': link, 'user_id': user_id})
+        return result.tuples().first()
+
+    async def get_by_link(self, link: uuid.UUID) -> InviteLink | None:
+        return await self.session.scalar(select(InviteLink).where(InviteLink.link == link))
@@ -0,0 +1,231 @@
+import uuid
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, Query, WebSocket, status
+
+from src.auth.claims import TokenUser
+from src.auth.dependencies import get_current_token_user
+from src.base.schemas import DetailModel
+from src.chats.dependencies import (get_chat_service,
+                                    get_chat_subscription_service,
+                                    get_invite_service, get_message_service)
+from src.chats.hub import chat_hub
+from src.chats.schemas import (ActiveMember, ChatCounters, ChatJoined, Inbox,
+                               MessageCreate, MessagePage, MessageRead,
+                               ReadMarker)
+from src.chats.services import (ChatService, ChatSubscriptionService,
+                                InviteService, MessageService)
+from src.config import config
+
+MESSAGE_PAGE_SIZE = config('MESSAGE_PAGE_SIZE', 50, module='src.chats.config')
+MESSAGE_MAX_PAGE_SIZE = config('MESSAGE_MAX_PAGE_SIZE', 200, module='src.chats.config')
+INBOX_PAGE_SIZE = config('INBOX_PAGE_SIZE', 50, module='src.chats.config')
+INBOX_MAX_PAGE_SIZE = config('INBOX_MAX_PAGE_SIZE', 200, module='src.chats.config')
+PRESENCE_WINDOW_SECONDS = config('PRESENCE_WINDOW_SECONDS', 300, module='src.chats.config')
+
+chat_router = APIRouter(
+    prefix='',
+)
+
+
+@chat_router.get(
+    path='',
+    response_model=Inbox,
+    responses={
+        status.HTTP_400_BAD_REQUEST: {
+            'model': DetailModel,
+            'description': 'Invalid cursor',
+        },
+        status.HTTP_401_UNAUTHORIZED: {
+            'model': DetailModel,
+            'description': 'Bad token provided',
+        },
+    },
+)
+async def chat_inbox_get(
+        user: Annotated[TokenUser, Depends(get_current_token_user)],
+        chat_service: Annotated[ChatService, Depends(get_chat_service)],
+        cursor: Optional[str] = None,
+        limit: Annotated[int, Query(ge=1, le=INBOX_MAX_PAGE_SIZE)] = INBOX_PAGE_SIZE,
+):
+    """Chats of the user with their last message and unread count, most recent activity first."""
+    return await chat_service.get_inbox(user, cursor, limit)
+
+
+@chat_router.get(
+    path='/{chat_id}/messages',
+    response_model=MessagePage,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            'model': DetailModel,
+            'description': 'Bad token provided',
+        },
+        status.HTTP_404_NOT_FOUND: {
+            'model': DetailModel,
+            'description': 'Chat not found or user is not a member',
+        },
+    },
+)
+async def chat_messages_get(
+        chat_id: int,
+        user: Annotated[TokenUser, Depends(get_current_token_user)],
+        message_service: Annotated[MessageService, Depends(get_message_service)],
+        before: Annotated[Optional[int], Query(gt=0)] = None,
+        limit: Annotated[int, Query(ge=1, le=MESSAGE_MAX_PAGE_SIZE)] = MESSAGE_PAGE_SIZE,
+):
+    return await message_service.get_history(chat_id, user, before, limit)
+
+
+@chat_router.post(
+    path='/{chat_id}/messages',
+    response_model=MessageRead,
+    status_code=status.HTTP_201_CREATED,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            'model': DetailModel,
+            'description': 'Bad token provided',
+        },
+        status.HTTP_403_FORBIDDEN: {
+            'model': DetailModel,
+            'description': 'Chat is closed',
+        },
+        status.HTTP_404_NOT_FOUND: {
+            'model': DetailModel,
+            'description': 'Chat not found or user is not a member',
+        },
+    },
+)
+async def chat_message_post(
+        chat_id: int,
+        message_data: MessageCreate,
+        user: Annotated[TokenUser, Depends(get_current_token_user)],
+        message_service: Annotated[MessageService, Depends(get_message_service)],
+):
+    return await message_service.send_message(chat_id, user, message_data)
+
+
+@chat_router.post(
+    path='/{chat_id}/read',
+    status_code=status.HTTP_204_NO_CONTENT,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            'model': DetailModel,
+            'description': 'Bad token provided',
+        },
+        status.HTTP_404_NOT_FOUND: {
+            'model': DetailModel,
+            'description': 'Chat not found or user is not a member',
+        },
+    },
+)
+async def chat_read_post(
+        chat_id: int,
+        read_marker: ReadMarker,
+        user: Annotated[TokenUser, Depends(get_current_token_user)],
+        message_service: Annotated[MessageService, Depends(get_message_service)],
+):
+    """Moves the read marker of the chat, the inbox counts unread messages after it."""
+    await message_service.mark_read(chat_id, user, read_marker.message_id)
+
+
+@chat_router.get(
+    path='/{chat_id}/counters',
+    response_model=ChatCounters,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            'model': DetailModel,
+            'description': 'Bad token provided',
+        },
+        status.HTTP_404_NOT_FOUND: {
+            'model': DetailModel,
+            'description': 'Chat not found or user is not a member',
+        },
+    },
+)
+async def chat_counters_get(
+        chat_id: int,
+        user: Annotated[TokenUser, Depends(get_current_token_user)],
+        chat_service: Annotated[ChatService, Depends(get_chat_service)],
+        exact: bool = False,
+):
+    return await chat_service.get_counters(chat_id, user, exact)
+
+
+@chat_router.get(
+    path='/{chat_id}/active',
+    response_model=list[ActiveMember],
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            'model': DetailModel,
+            'description': 'Bad token provided',
+        },
+        status.HTTP_404_NOT_FOUND: {
+            'model': DetailModel,
+            'description': 'Chat not found or user is not a member',
+        },
+    },
+)
+async def chat_active_members_get(
+        chat_id: int,
+        user: Annotated[TokenUser, Depends(get_current_token_user)],
+        chat_service: Annotated[ChatService, Depends(get_chat_service)],
+        within: Annotated[Optional[float], Query(gt=0, le=PRESENCE_WINDOW_SECONDS)] = None,
+):
+    """Members seen in the chat during the last `within` seconds, most recent first."""
+    return await chat_service.get_recently_active(chat_id, user, within)
+
+
+@chat_router.post(
+    path='/invite/{link}',
+    response_model=ChatJoined,
+    responses={
+        status.HTTP_400_BAD_REQUEST: {
+            'model': DetailModel,
+            'description': 'Invite link expired or used up',
+        },
+        status.HTTP_401_UNAUTHORIZED: {
+            'model': DetailModel,
+            'description': 'Bad token provided',
+        },
+        status.HTTP_403_FORBIDDEN: {
+            'model': DetailModel,
+            'description': 'Chat is closed or user is banned in it',
+        },
+        status.HTTP_404_NOT_FOUND: {
+            'model': DetailModel,
+            'description': 'Invite link not found',
+        },
+        status.HTTP_409_CONFLICT: {
+            'model': DetailModel,
+            'description': 'User is already a member',
+        },
+    },
+)
+async def chat_invite_redeem(
+        link: uuid.UUID,
+        user: Annotated[TokenUser, Depends(get_current_token_user)],
+        invite_service: Annotated[InviteService, Depends(get_invite_service)],
+):
+    return await invite_service.redeem(link, user)
+
+
+@chat_router.websocket(
+    path='/ws',
+)
+async def chat_websocket(
+        websocket: WebSocket,
+        subscription_service: Annotated[ChatSubscriptionService, Depends(get_chat_subscription_service)],
+        token: Annotated[Optional[str], Query()] = None,
+):
+    """Events of every chat the user is a member of, sent as JSON arrays of event objects.
+
+    Browsers can not set headers on a WebSocket, so the access token is passed as ?token=.
+    """
+    user, chat_ids = await subscription_service.authenticate(token)
+    await websocket.accept()
+
+    connection = chat_hub.connect(websocket, user.id, chat_ids)
+    try:
+        await connection.run()
+    finally:
+        chat_hub.disconnect(connection)
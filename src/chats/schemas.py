@@ -0,0 +1,70 @@
+import datetime
+from typing import Literal, Optional
+
+from pydantic import BaseModel, Field
+
+from src.base.schemas import BaseORMModel
+
+
+class MessageCreate(BaseModel):
+    text: str = Field(min_length=1, max_length=4096)
+
+
+class MessageRead(BaseORMModel):
+    id: int  # noqa: A003, VNE003
+    chat_id: int
+    user_id: int
+    text: str
+    created_at: datetime.datetime
+
+
+class MessagePage(BaseModel):
+    messages: list[MessageRead]
+    # pass as `before` to get the next (older) page, None on the last page
+    next_cursor: Optional[int]
+
+
+class MessageEvent(BaseModel):
+    type: Literal['message'] = 'message'  # noqa: A003, VNE003
+    message: MessageRead
+    # set when the text did not fit into the cross-worker notification, fetch the message from history
+    truncated: bool = False
+
+
+class ReadMarker(BaseModel):
+    # the newest message the user has seen
+    message_id: int = Field(gt=0)
+
+
+class ChatCounters(BaseModel):
+    members_count: int
+    # messages of the current user in the chat
+    total_messages: int
+    exact: bool
+
+
+class ChatJoined(BaseModel):
+    chat_id: int
+
+
+class InboxChat(BaseORMModel):
+    chat_id: int
+    name: str
+    is_closed: bool
+    last_message_id: Optional[int]
+    last_message_preview: Optional[str]
+    # messages of others after the read marker, counted up to UNREAD_COUNT_LIMIT
+    unread_count: int
+    # time of the last message, or of joining the chat while it has none
+    activity_at: datetime.datetime
+
+
+class Inbox(BaseModel):
+    chats: list[InboxChat]
+    # pass as `cursor` to get the next page, None on the last page
+    next_cursor: Optional[str]
+
+
+class ActiveMember(BaseModel):
+    user_id: int
+    last_active: datetime.datetime
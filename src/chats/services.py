@@ -0,0 +1,186 @@
+import datetime
+import uuid
+from dataclasses import dataclass
+from typing import Optional, Sequence
+
+from fastapi import HTTPException
+
+from src.auth.claims import TokenUser
+from src.auth.services import AuthService
+from src.base.exceptions import BadRequest, Forbidden, NotFound
+from src.base.uow import UnitOfWork
+from src.chats.counters import members_counter, messages_counter
+from src.chats.exceptions import AlreadyChatMember
+from src.chats.hub import chat_hub
+from src.chats.models import Chat, Message
+from src.chats.presence import presence_tracker
+from src.chats.repositories import (ChatRepository, InviteLinkRepository,
+                                    MessageRepository)
+from src.chats.schemas import (ActiveMember, ChatCounters, ChatJoined, Inbox,
+                               InboxChat, MessageCreate, MessageEvent,
+                               MessagePage, MessageRead)
+from src.chats.summaries import summary_buffer
+
+
+@dataclass
+class MessageService:
+    chat_repository: ChatRepository
+    message_repository: MessageRepository
+    uow: UnitOfWork
+
+    async def _get_member_chat(self, chat_id: int, user: TokenUser) -> Chat:
+        chat = await self.chat_repository.get_member_chat(chat_id, user.id)
+        if chat is None:
+            raise NotFound('Chat not found')
+        return chat
+
+    async def get_history(
+            self, chat_id: int, user: TokenUser, before: Optional[int], limit: int,
+    ) -> MessagePage:
+        await self._get_member_chat(chat_id, user)
+        presence_tracker.touch(chat_id, user.id)
+
+        # one extra row tells whether there is an older page
+        messages = await self.message_repository.get_page(chat_id, before, limit + 1)
+        has_more = len(messages) > limit
+        messages = messages[:limit]
+
+        return MessagePage(
+            messages=[MessageRead.model_validate(message) for message in messages],
+            next_cursor=messages[-1].id if has_more else None,
+        )
+
+    async def send_message(self, chat_id: int, user: TokenUser, message_data: MessageCreate) -> Message:
+        chat = await self._get_member_chat(chat_id, user)
+        if chat.is_closed:
+            raise Forbidden('Chat is closed')
+
+        async with self.uow:
+            message = await self.message_repository.create(
+                Message(chat_id=chat_id, user_id=user.id, text=message_data.text),
+            )
+        summary_buffer.add(message)
+        messages_counter.add(chat_id, user.id)
+        presence_tracker.touch(chat_id, user.id, message.created_at)
+
+        message_read = MessageRead.model_validate(message)
+        truncated = MessageEvent(message=message_read.model_copy(update={'text': ''}), truncated=True)
+        await chat_hub.publish(
+            chat_id, MessageEvent(message=message_read).model_dump_json(), fallback=truncated.model_dump_json(),
+        )
+        return message
+
+    async def mark_read(self, chat_id: int, user: TokenUser, message_id: int) -> None:
+        """Marks the messages of the chat up to `message_id` as read, a marker already past it stays."""
+        await self._get_member_chat(chat_id, user)
+        async with self.uow:
+            await self.chat_repository.mark_read(chat_id, user.id, message_id)
+
+
+@dataclass
+class ChatService:
+    chat_repository: ChatRepository
+
+    @staticmethod
+    def _encode_cursor(chat: InboxChat) -> str:
+        return f'{chat.activity_at.isoformat()}_{chat.chat_id}'
+
+    @staticmethod
+    def _decode_cursor(cursor: str) -> tuple[datetime.datetime, int]:
+        try:
+            activity_at, chat_id = cursor.rsplit('_', 1)
+            return datetime.datetime.fromisoformat(activity_at), int(chat_id)
+        except ValueError:
+            raise BadRequest('Invalid cursor')
+
+    async def get_inbox(self, user: TokenUser, cursor: Optional[str], limit: int) -> Inbox:
+        after = self._decode_cursor(cursor) if cursor is not None else None
+
+        # one extra row tells whether there is a next page
+        rows = await self.chat_repository.get_inbox(user.id, after, limit + 1)
+        chats = [InboxChat.model_validate(row) for row in rows[:limit]]
+        return Inbox(
+            chats=chats,
+            next_cursor=self._encode_cursor(chats[-1]) if len(rows) > limit else None,
+        )
+
+    async def get_counters(self, chat_id: int, user: TokenUser, exact: bool = False) -> ChatCounters:
+        """Stored counters plus the increments this worker has not flushed yet, or counts of the source rows."""
+        counters = await self.chat_repository.get_counters(chat_id, user.id)
+        if counters is None:
+            raise NotFound('Chat not found')
+
+        if exact:
+            return ChatCounters(
+                members_count=await self.chat_repository.count_members(chat_id),
+                total_messages=await self.chat_repository.count_messages(chat_id, user.id),
+                exact=True,
+            )
+
+        members_count, total_messages = counters
+        return ChatCounters(
+            members_count=members_count + members_counter.pending(chat_id),
+            total_messages=total_messages + messages_counter.pending(chat_id, user.id),
+            exact=False,
+        )
+
+    async def get_recently_active(self, chat_id: int, user: TokenUser, within: Optional[float]) -> list[ActiveMember]:
+        """Members active in the chat during the window, answered from the presence tracker."""
+        if await self.chat_repository.get_member_chat(chat_id, user.id) is None:
+            raise NotFound('Chat not found')
+
+        return [
+            ActiveMember(user_id=user_id, last_active=last_active)
+            for user_id, last_active in presence_tracker.recently_active(chat_id, within)
+        ]
+
+
+@dataclass
+class InviteService:
+    invite_link_repository: InviteLinkRepository
+    chat_repository: ChatRepository
+    uow: UnitOfWork
+
+    async def _invalid_link(self, link: uuid.UUID) -> HTTPException:
+        invite = await self.invite_link_repository.get_by_link(link)
+        if invite is None:
+            return NotFound('Invite link not found')
+        if invite.expires_at is not None and invite.expires_at <= datetime.datetime.utcnow():
+            return BadRequest('Invite link expired')
+        if invite.max_uses is not None and invite.count_uses >= invite.max_uses:
+            return BadRequest('Invite link has no uses left')
+        return Forbidden('Chat is closed')
+
+    async def redeem(self, link: uuid.UUID, user: TokenUser) -> ChatJoined:
+        """Takes a use of the link and adds the membership in one transaction, both or neither are kept."""
+        async with self.uow:
+            redeemed = await self.invite_link_repository.redeem(link, user.id)
+            if redeemed is None:
+                raise await self._invalid_link(link)
+
+            chat_id, member_id = redeemed
+            if member_id is None:
+                member = await self.chat_repository.get_member(chat_id, user.id)
+                if member is not None and member.is_banned:
+                    raise Forbidden('You are banned in this chat')
+                raise AlreadyChatMember
+
+        members_counter.add(chat_id)
+        await chat_hub.join(chat_id, user.id)
+        return ChatJoined(chat_id=chat_id)
+
+
+@dataclass
+class ChatSubscriptionService:
+    auth_service: AuthService
+    chat_repository: ChatRepository
+    uow: UnitOfWork
+
+    async def authenticate(self, token: Optional[str]) -> tuple[TokenUser, Sequence[int]]:
+        """The user of the token and the chats their connection is subscribed to."""
+        try:
+            user = await self.auth_service.authenticate_websocket_token(token)
+            return user, await self.chat_repository.get_user_chat_ids(user.id)
+        finally:
+            # the socket outlives the request, the session must not keep its connection meanwhile
+            await self.uow.rollback()
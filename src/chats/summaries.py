@@ -0,0 +1,96 @@
+"""Buffered inbox summaries of ChatUser.
+
+The last message of every chat is kept in memory per worker and written to
+the summary columns of its members every SUMMARY_FLUSH_INTERVAL_SECONDS as
+UPDATE ... FROM (VALUES ...) statements of FLUSH_CHUNK_SIZE chats, so sending
+a message writes no membership rows and a busy chat fans out once per flush.
+Unread counts are not stored, the inbox counts them from ChatUser.last_read_id.
+"""
+import datetime
+from typing import Any
+
+from sqlalchemy import BigInteger, DateTime, Integer, String, Values, column, or_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.chats.counters import CounterFlusher, execute_from_values
+from src.chats.models import MESSAGE_PREVIEW_LENGTH, ChatUser, Message
+from src.chats.repositories import ACTIVE_MEMBER
+from src.config import config
+from src.database import async_session_maker
+
+PENDING_COLUMNS = (
+    column('chat_id', Integer), column('last_message_id', BigInteger),
+    column('last_message_preview', String), column('activity_at', DateTime),
+)
+
+
+class SummaryBuffer:
+    """Latest message per chat id that its members' summaries do not have yet."""
+
+    name = 'inbox_summary'
+
+    def __init__(self):
+        self._latest: dict[int, tuple[int, int, str, datetime.datetime]] = {}
+        self.coalesced = 0
+        self.flushed = 0
+
+    def add(self, message: Message) -> None:
+        latest = self._latest.get(message.chat_id)
+        if latest is not None:
+            self.coalesced += 1
+            if latest[1] > message.id:
+                return
+        self._latest[message.chat_id] = (
+            message.chat_id, message.id, message.text[:MESSAGE_PREVIEW_LENGTH], message.created_at,
+        )
+
+    @staticmethod
+    def _statement(pending: Values):
+        return (
+            update(ChatUser)
+            .where(
+                ChatUser.chat_id == pending.c.chat_id,
+                *ACTIVE_MEMBER,
+                # another worker may have written a newer message already
+                or_(ChatUser.last_message_id.is_(None), ChatUser.last_message_id < pending.c.last_message_id),
+            )
+            .values(
+                last_message_id=pending.c.last_message_id,
+                last_message_preview=pending.c.last_message_preview,
+                activity_at=pending.c.activity_at,
+            )
+            .execution_options(synchronize_session=False)
+        )
+
+    async def flush(self, session: AsyncSession) -> int:
+        """Writes the pending summaries in one transaction, they are kept for the next flush if it fails."""
+        if not self._latest:
+            return 0
+
+        latest, self._latest = self._latest, {}
+        # same order in every worker, so concurrent flushes lock the rows in the same order
+        rows = sorted(latest.values())
+        try:
+            await execute_from_values(session, PENDING_COLUMNS, rows, self._statement)
+            await session.commit()
+        except BaseException:
+            await session.rollback()
+            for chat_id, row in latest.items():
+                if chat_id not in self._latest or self._latest[chat_id][1] < row[1]:
+                    self._latest[chat_id] = row
+            raise
+
+        self.flushed += len(rows)
+        return len(rows)
+
+    def metrics(self) -> dict[str, Any]:
+        return {'pending': len(self._latest), 'flushed': self.flushed, 'coalesced': self.coalesced}
+
+
+summary_buffer = SummaryBuffer()
+
+summary_flusher = CounterFlusher(
+    [summary_buffer],
+    async_session_maker,
+    interval=config('SUMMARY_FLUSH_INTERVAL_SECONDS', 2, module='src.chats.config'),
+)
@@ -23,6 +23,35 @@ DB_PORT = os.getenv('POSTGRES_PORT')
 DB_NAME = os.getenv('POSTGRES_DB')
 
 DB_URL = f'postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+DB_DSN = f'postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}'
+
+# connection pool, per worker process
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 30 * 60))
+DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'false').lower() in ('1', 'true')
+# prepared statements cached per connection, set to 0 behind pgbouncer in transaction mode
+DB_STATEMENT_CACHE_SIZE = int(os.getenv('DB_STATEMENT_CACHE_SIZE', 100))
+
+# 'postgres' (LISTEN/NOTIFY between workers) or 'local' (single process, tests)
+PUBSUB_BACKEND = os.getenv('PUBSUB_BACKEND', 'postgres')
+
+# SQL instrumentation, no listeners are attached unless enabled
+SQL_LOG_QUERIES = os.getenv('SQL_LOG_QUERIES', 'false').lower() in ('1', 'true')
+SQL_INSTRUMENTATION = os.getenv('SQL_INSTRUMENTATION', 'false').lower() in ('1', 'true')
+SQL_INSTRUMENTATION_SAMPLE_RATE = float(os.getenv('SQL_INSTRUMENTATION_SAMPLE_RATE', 1.0))
+SQL_SLOW_QUERY_SECONDS = 0.1
+SQL_SLOWEST_STATEMENTS = 5
+SQL_N_PLUS_ONE_THRESHOLD = 5
+
+# handlers of these loggers run in a background thread, the caller only puts records on a queue
+LOGGING_QUEUE = os.getenv('LOGGING_QUEUE', 'true').lower() in ('1', 'true')
+LOGGING_QUEUED_LOGGERS = ['all', 'debugger']
+LOGGING_QUEUE_SIZE = 10_000
+LOGGING_QUEUE_POLICY = os.getenv('LOGGING_QUEUE_POLICY', 'drop')  # 'drop' or 'block'
+LOGGING_QUEUE_BLOCK_TIMEOUT = 0.05
+LOGGING_BATCH_SIZE = 256
 
 LOGGING = {
     'version': 1,
@@ -1,19 +1,37 @@
 import logging
 from typing import AsyncGenerator
 
-from sqlalchemy.event import listens_for
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from src.config import config
+from src.instrumentation import InstrumentedQueuePool, instrument_engine
 
 DATABASE_URL = config('DB_URL')
 
 
-engine = create_async_engine(DATABASE_URL)
+engine = create_async_engine(
+    DATABASE_URL,
+    poolclass=InstrumentedQueuePool,
+    pool_size=config('DB_POOL_SIZE', 10),
+    max_overflow=config('DB_MAX_OVERFLOW', 10),
+    pool_timeout=config('DB_POOL_TIMEOUT', 10),
+    pool_recycle=config('DB_POOL_RECYCLE', -1),
+    pool_pre_ping=config('DB_POOL_PRE_PING', False),
+    connect_args={
+        'prepared_statement_cache_size': config('DB_STATEMENT_CACHE_SIZE', 100),
+        'statement_cache_size': config('DB_STATEMENT_CACHE_SIZE', 100),
+    },
+)
 async_session_maker = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 debugger = logging.getLogger('debugger')
 
+instrument_engine(engine.sync_engine)
+
+
+def pool_metrics() -> dict:
+    return engine.pool.metrics()
+
 
 async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session_maker() as session:
@@ -29,13 +47,3 @@ async def create_tables() -> None:
         debugger.debug('Tables created')
 
     await engine.dispose()
-
-
-@listens_for(engine.sync_engine, 'before_cursor_execute', named=True)
-def log_query(
-        conn, cursor, statement, parameters, context, executemany,
-):
-    # if not hasattr(conn, 'queries'):
-    #     setattr(conn, 'queries', [])
-    # conn.queries.append([statement, parameters])
-    debugger.debug(f'Executing query:\n{statement} with parameters: {parameters}')
@@ -0,0 +1,166 @@
+import heapq
+import logging
+import random
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, PoolProxiedConnection
+
+from src.config import config
+
+info = logging.getLogger('all')
+debugger = logging.getLogger('debugger')
+
+SAMPLE_RATE = config('SQL_INSTRUMENTATION_SAMPLE_RATE', 1.0)
+SLOW_QUERY_SECONDS = config('SQL_SLOW_QUERY_SECONDS', 0.1)
+SLOWEST_STATEMENTS = config('SQL_SLOWEST_STATEMENTS', 5)
+N_PLUS_ONE_THRESHOLD = config('SQL_N_PLUS_ONE_THRESHOLD', 5)
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_time: float = 0.0
+    slowest: list[tuple[float, str]] = field(default_factory=list)
+    statements: Counter = field(default_factory=Counter)
+
+    def record(self, statement: str, duration: float) -> None:
+        self.count += 1
+        self.total_time += duration
+        self.statements[statement] += 1
+
+        if len(self.slowest) < SLOWEST_STATEMENTS:
+            heapq.heappush(self.slowest, (duration, statement))
+        elif duration > self.slowest[0][0]:
+            heapq.heapreplace(self.slowest, (duration, statement))
+
+    def repeated(self) -> list[tuple[str, int]]:
+        """Statements executed often enough in one request to be a likely N+1."""
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= N_PLUS_ONE_THRESHOLD]
+
+    def summary(self) -> dict[str, Any]:
+        return {
+            'count': self.count,
+            'total_time': self.total_time,
+            'slowest': [{'duration': duration, 'statement': statement}
+                        for duration, statement in sorted(self.slowest, reverse=True)],
+            'repeated': [{'statement': statement, 'count': count} for statement, count in self.repeated()],
+        }
+
+
+_current_stats: ContextVar[Optional[QueryStats]] = ContextVar('query_stats', default=None)
+
+
+def start_collecting() -> Optional[QueryStats]:
+    """Starts collecting for the current context, unless the request is not sampled."""
+    if SAMPLE_RATE < 1 and random.random() >= SAMPLE_RATE:  # noqa: S311
+        return None
+    stats = QueryStats()
+    _current_stats.set(stats)
+    return stats
+
+
+def stop_collecting() -> None:
+    _current_stats.set(None)
+
+
+def current_stats() -> Optional[QueryStats]:
+    return _current_stats.get()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa
+    if context is not None and _current_stats.get() is not None:
+        context._query_started_at = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa
+    if (stats := _current_stats.get()) is None or (started := getattr(context, '_query_started_at', None)) is None:
+        return
+
+    duration = time.perf_counter() - started
+    stats.record(statement, duration)
+    if duration >= SLOW_QUERY_SECONDS:
+        info.warning('Slow query (%.1fms): %s', duration * 1000, statement)
+
+
+def _log_query(conn, cursor, statement, parameters, context, executemany) -> None:  # noqa
+    debugger.debug('Executing query:\n%s with parameters: %s', statement, parameters)
+
+
+@dataclass
+class PoolStats:
+    checkouts: int = 0
+    timeouts: int = 0
+    connects: int = 0
+    invalidations: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that counts checkouts, timeouts and the time spent waiting for a connection."""
+
+    def __init__(self, *args: Any, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.stats = PoolStats()
+        event.listen(self, 'connect', self._on_connect)
+        event.listen(self, 'invalidate', self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record) -> None:  # noqa
+        self.stats.connects += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception) -> None:  # noqa
+        self.stats.invalidations += 1
+
+    def connect(self) -> PoolProxiedConnection:
+        started_at = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.timeouts += 1
+            info.warning('Connection pool exhausted: %s', self.status())
+            raise
+        finally:
+            wait = time.perf_counter() - started_at
+            self.stats.total_wait += wait
+            self.stats.max_wait = max(self.stats.max_wait, wait)
+
+        self.stats.checkouts += 1
+        return connection
+
+    def recreate(self) -> 'InstrumentedQueuePool':
+        pool = super().recreate()
+        pool.stats = self.stats
+        return pool
+
+    def metrics(self) -> dict[str, Any]:
+        checkouts = self.stats.checkouts or 1
+        return {
+            'size': self.size(),
+            'max_overflow': self._max_overflow,
+            'checked_in': self.checkedin(),
+            'checked_out': self.checkedout(),
+            'overflow': max(0, self.overflow()),
+            'checkouts': self.stats.checkouts,
+            'timeouts': self.stats.timeouts,
+            'connects': self.stats.connects,
+            'invalidations': self.stats.invalidations,
+            'avg_wait_seconds': self.stats.total_wait / checkouts,
+            'max_wait_seconds': self.stats.max_wait,
+        }
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Attaches the listeners that are enabled in config, nothing is attached otherwise."""
+    if config('SQL_LOG_QUERIES', False):
+        event.listen(engine, 'before_cursor_execute', _log_query)
+
+    if config('SQL_INSTRUMENTATION', False):
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
@@ -1,19 +1,173 @@
+import atexit
 import logging
+import logging.config
+import logging.handlers
+import queue
+import threading
+from typing import Any, Optional
 
 from src.config import config
 
 
 class RequireDebugTrue(logging.Filter):
+    def __init__(self, name: str = ''):
+        super().__init__(name)
+        self.debug = config('DEBUG', False)
+
     def filter(self, record: logging.LogRecord) -> bool:  # noqa
-        return config('DEBUG', False)
+        return self.debug
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """Puts records on a bounded queue, the formatting is left to the listener thread.
+
+    With the 'drop' policy a full queue drops the record right away, with 'block'
+    the caller waits up to `block_timeout` before dropping it.
+    """
+
+    def __init__(self, log_queue: queue.Queue, policy: str = 'drop', block_timeout: float = 0.05):
+        if policy not in ('drop', 'block'):
+            raise ValueError(f'Unknown logging queue policy: {policy}')
+
+        super().__init__(log_queue)
+        self.policy = policy
+        self.block_timeout = block_timeout
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            if self.policy == 'block':
+                self.queue.put(record, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class BatchingQueueListener(logging.handlers.QueueListener):
+    """Drains the queue in batches and writes each batch to a stream handler with one flush."""
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler, batch_size: int = 256):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.batch_size = batch_size
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+    def _monitor(self) -> None:
+        while True:
+            record = self.queue.get()
+            batch = [record]
+            while record is not self._sentinel and len(batch) < self.batch_size:
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                batch.append(record)
+
+            stop = batch[-1] is self._sentinel
+            if stop:
+                batch.pop()
+            if batch:
+                self.handle_batch(batch)
+            for _ in range(len(batch) + stop):
+                self.queue.task_done()
+            if stop:
+                return
+
+    def handle_batch(self, records: list[logging.LogRecord]) -> None:
+        for handler in self.handlers:
+            records_to_emit = [record for record in records if record.levelno >= handler.level]
+            if not records_to_emit:
+                continue
+
+            if type(handler) not in (logging.StreamHandler, logging.FileHandler):
+                for record in records_to_emit:
+                    handler.handle(record)
+                continue
 
+            handler.acquire()
+            try:
+                if handler.stream is None:
+                    handler.stream = handler._open()
+                for record in records_to_emit:
+                    if not handler.filter(record):
+                        continue
+                    try:
+                        handler.stream.write(handler.format(record) + handler.terminator)
+                    except Exception:
+                        handler.handleError(record)
+                handler.flush()
+            finally:
+                handler.release()
+
+
+# logger, the handler put in place of its handlers and the listener writing to them
+_queued: list[tuple[logging.Logger, BoundedQueueHandler, BatchingQueueListener]] = []
+_lock = threading.Lock()
+
+
+def _enable_queue(logger_name: str) -> None:
+    logger = logging.getLogger(logger_name)
+    handlers = list(logger.handlers)
+    if not handlers:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=config('LOGGING_QUEUE_SIZE', 10_000))
+    queue_handler = BoundedQueueHandler(
+        log_queue,
+        policy=config('LOGGING_QUEUE_POLICY', 'drop'),
+        block_timeout=config('LOGGING_QUEUE_BLOCK_TIMEOUT', 0.05),
+    )
+    listener = BatchingQueueListener(log_queue, *handlers, batch_size=config('LOGGING_BATCH_SIZE', 256))
+
+    for handler in handlers:
+        logger.removeHandler(handler)
+    logger.addHandler(queue_handler)
+    listener.start()
+
+    _queued.append((logger, queue_handler, listener))
+
+
+def stop_loggers() -> None:
+    """Puts the original handlers back, then writes out the queued records and stops the listener threads.
+
+    Records logged after this are written by the caller, so nothing logged during shutdown is lost.
+    """
+    with _lock:
+        while _queued:
+            logger, queue_handler, listener = _queued.pop()
+            logger.removeHandler(queue_handler)
+            for handler in listener.handlers:
+                logger.addHandler(handler)
+            listener.stop()
+
+
+def logging_metrics() -> dict[str, Any]:
+    return {
+        'queued': sum(queue_handler.queue.qsize() for _, queue_handler, _ in _queued),
+        'dropped': sum(queue_handler.dropped for _, queue_handler, _ in _queued),
+    }
+
+
+def init_loggers(queued_loggers: Optional[list[str]] = None):
+    stop_loggers()
 
-def init_loggers():
     try:
         logging.config.dictConfig(config('LOGGING', dict))
     except ValueError as e:
         logging.error(e)
 
+    if config('LOGGING_QUEUE', False):
+        with _lock:
+            for logger_name in queued_loggers or config('LOGGING_QUEUED_LOGGERS', list):
+                _enable_queue(logger_name)
+        atexit.unregister(stop_loggers)
+        atexit.register(stop_loggers)
+
     if config('DEBUG', False):
         debugger = logging.getLogger('debugger')
         debugger.debug('Loggers initialized')
@@ -1,26 +1,44 @@
 import logging
 
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from src.instrumentation import start_collecting, stop_collecting
+
+info = logging.getLogger('all')
 debugger = logging.getLogger('debugger')
 
 
-# class QueryLoggingMiddleware(BaseHTTPMiddleware):
-#     async def dispatch(
-#         self, request: Request, call_next,
-#     ) -> Response:
-#         if not config('DEBUG', False):
-#             return await call_next(request)
-#
-#         async with async_session_maker() as session:
-#
-#             request.state.db = session
-#             response = await call_next(request)
-#
-#             queries = getattr(request.state.db, 'queries', [])
-#             for query in queries:
-#                 debugger.debug(f'Executed query: {query[0]} with parameters: {query[1]}')
-#
-#             debugger.debug('Total queries executed: %d', len(queries))
-#
-#             await session.close()
-#
-#             return response
+class QueryStatsMiddleware:
+    """Collects per-request SQL stats and reports them in headers and logs.
+
+    Plain ASGI middleware, so it adds no extra task or body buffering per request.
+    The headers are written when the response starts, so they only count the
+    statements executed before that; statements of a streaming body or of
+    background tasks are only in the summary logged when the request completes.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope['type'] != 'http' or (stats := start_collecting()) is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_stats(message: Message) -> None:
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                headers.append((b'x-db-query-count', str(stats.count).encode()))
+                headers.append((b'x-db-time-ms', f'{stats.total_time * 1000:.2f}'.encode()))
+                message['headers'] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_stats)
+        finally:
+            stop_collecting()
+
+            path = scope.get('path')
+            debugger.debug('%s query stats: %s', path, stats.summary())
+            for statement, count in stats.repeated():
+                info.warning('Possible N+1 in %s, statement executed %d times: %s', path, count, statement)
@@ -0,0 +1,51 @@
+from typing import Annotated
+
+from fastapi import APIRouter, Depends, status
+
+from src.auth.claims import TokenUser
+from src.auth.dependencies import get_current_staff_token_user
+from src.auth.hashing import password_hasher
+from src.auth.services import token_cache
+from src.base.schemas import DetailModel
+from src.chats.counters import counter_flusher
+from src.chats.hub import chat_hub
+from src.chats.presence import presence_flusher
+from src.chats.summaries import summary_flusher
+from src.database import pool_metrics
+from src.logging import logging_metrics
+from src.monitoring.schemas import MetricsModel
+from src.users.cache import user_cache
+
+metrics_router = APIRouter(
+    prefix='',
+)
+
+
+@metrics_router.get(
+    path='',
+    response_model=MetricsModel,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            'model': DetailModel,
+            'description': 'Bad token provided',
+        },
+        status.HTTP_403_FORBIDDEN: {
+            'model': DetailModel,
+            'description': 'User is not staff',
+        },
+    },
+)
+async def metrics(
+    user: Annotated[TokenUser, Depends(get_current_staff_token_user)],
+):
+    return MetricsModel(
+        db_pool=pool_metrics(),
+        password_hasher=password_hasher.metrics(),
+        user_cache=user_cache.metrics(),
+        token_cache=token_cache.metrics(),
+        logging=logging_metrics(),
+        websockets=chat_hub.metrics(),
+        counters=counter_flusher.metrics(),
+        presence=presence_flusher.metrics(),
+        summaries=summary_flusher.metrics(),
+    )
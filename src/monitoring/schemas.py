@@ -0,0 +1,15 @@
+from typing import Any
+
+from pydantic import BaseModel
+
+
+class MetricsModel(BaseModel):
+    db_pool: dict[str, Any]
+    password_hasher: dict[str, Any]
+    user_cache: dict[str, Any]
+    token_cache: dict[str, Any]
+    logging: dict[str, Any]
+    websockets: dict[str, Any]
+    counters: dict[str, Any]
+    presence: dict[str, Any]
+    summaries: dict[str, Any]
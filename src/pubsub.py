@@ -0,0 +1,146 @@
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Callable, Optional
+
+import asyncpg
+
+from src.config import config
+
+info = logging.getLogger('all')
+debugger = logging.getLogger('debugger')
+
+Subscriber = Callable[[str], None]
+
+
+class PubSub(ABC):
+    """Fan-out of short text messages between the app workers.
+
+    Subscribers are plain callables, they are called on the event loop
+    and must not block.
+    """
+
+    def __init__(self):
+        self._subscribers: defaultdict[str, list[Subscriber]] = defaultdict(list)
+
+    def subscribe(self, channel: str, subscriber: Subscriber) -> None:
+        self._subscribers[channel].append(subscriber)
+
+    def unsubscribe(self, channel: str, subscriber: Subscriber) -> None:
+        if subscriber in self._subscribers.get(channel, []):
+            self._subscribers[channel].remove(subscriber)
+
+    def _deliver(self, channel: str, payload: str) -> None:
+        for subscriber in list(self._subscribers.get(channel, [])):
+            try:
+                subscriber(payload)
+            except Exception as e:
+                info.error(f'pubsub subscriber for {channel} failed: {e}')
+
+    @abstractmethod
+    async def publish(self, channel: str, payload: str) -> None:
+        ...
+
+    async def start(self) -> None:
+        return
+
+    async def stop(self) -> None:
+        return
+
+
+class LocalPubSub(PubSub):
+    """In-memory stand-in, delivers messages to the subscribers of this process only."""
+
+    async def publish(self, channel: str, payload: str) -> None:
+        self._deliver(channel, payload)
+
+
+class PostgresPubSub(PubSub):
+    """Postgres LISTEN/NOTIFY on a dedicated connection, so every worker receives every message."""
+
+    reconnect_delay = 1.0
+    max_reconnect_delay = 30.0
+
+    def __init__(self, dsn: str):
+        super().__init__()
+        self.dsn = dsn
+        self._connection: Optional[asyncpg.Connection] = None
+        self._listening: set[str] = set()
+        self._lock = asyncio.Lock()
+        self._stopped = True
+
+    def subscribe(self, channel: str, subscriber: Subscriber) -> None:
+        super().subscribe(channel, subscriber)
+        if self._connection is not None and channel not in self._listening:
+            asyncio.get_running_loop().create_task(self._listen(channel))
+
+    def _on_notification(self, connection, pid, channel, payload) -> None:  # noqa
+        self._deliver(channel, payload)
+
+    async def _listen(self, channel: str) -> None:
+        async with self._lock:
+            if channel in self._listening or self._connection is None:
+                return
+            await self._connection.add_listener(channel, self._on_notification)
+            self._listening.add(channel)
+
+    def _on_termination(self, connection) -> None:  # noqa
+        if self._stopped:
+            return
+        info.error('pubsub connection lost, reconnecting')
+        self._connection = None
+        self._listening.clear()
+        asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _connect(self) -> None:
+        connection = await asyncpg.connect(self.dsn)
+        connection.add_termination_listener(self._on_termination)
+        self._connection = connection
+        for channel in list(self._subscribers):
+            await self._listen(channel)
+        debugger.debug(f'Listening for notifications on {", ".join(self._listening) or "no channels"}')
+
+    async def _reconnect(self) -> None:
+        delay = self.reconnect_delay
+        while not self._stopped and self._connection is None:
+            await asyncio.sleep(delay)
+            try:
+                await self._connect()
+            except (asyncpg.PostgresError, OSError) as e:
+                info.error(f'pubsub reconnect failed: {e}')
+                delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def start(self) -> None:
+        self._stopped = False
+        await self._connect()
+
+    async def stop(self) -> None:
+        self._stopped = True
+        if self._connection is None:
+            return
+        connection, self._connection = self._connection, None
+        self._listening.clear()
+        await connection.close()
+
+    async def publish(self, channel: str, payload: str) -> None:
+        if self._connection is None:
+            self._deliver(channel, payload)
+            return
+        try:
+            async with self._lock:
+                await self._connection.execute('SELECT pg_notify($1, $2)', channel, payload)
+        except (asyncpg.PostgresError, OSError) as e:
+            info.error(f'failed to publish to {channel}: {e}')
+            self._deliver(channel, payload)
+
+
+def create_pubsub(backend: str) -> PubSub:
+    if backend == 'local':
+        return LocalPubSub()
+    if backend == 'postgres':
+        return PostgresPubSub(config('DB_DSN'))
+    raise ValueError(f'Unknown pubsub backend: {backend}')
+
+
+pubsub = create_pubsub(config('PUBSUB_BACKEND', 'local'))
@@ -1,5 +1,7 @@
 from src.app import app
 from src.auth.routers import auth_router
+from src.chats.routers import chat_router
+from src.monitoring.routers import metrics_router
 from src.users.routers import admin_user_router, user_router
 
 app.include_router(
@@ -19,3 +21,15 @@ app.include_router(
     prefix='/api/users',
     tags=['admin'],
 )
+
+app.include_router(
+    chat_router,
+    prefix='/api/chats',
+    tags=['chats'],
+)
+
+app.include_router(
+    metrics_router,
+    prefix='/api/metrics',
+    tags=['metrics'],
+)
@@ -0,0 +1,139 @@
+import asyncio
+import datetime
+import logging
+from contextlib import suppress
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from src.auth.claims import user_versions
+from src.config import config
+from src.database import engine
+from src.pubsub import PubSub, pubsub
+from src.users.cache import user_cache
+from src.users.repositories import UserRepository
+
+info = logging.getLogger('all')
+debugger = logging.getLogger('debugger')
+
+BAN_EXPIRY_CHANNEL = 'ban_expiry'
+# pg advisory lock key, 'bans'
+BAN_EXPIRY_LOCK_KEY = 0x62616E73
+
+
+class BanExpiryScheduler:
+    """Lifts timed bans when their ban_until passes.
+
+    Every worker starts it, but only the one holding the advisory lock does
+    the work. It sleeps until the earliest ban_until and is woken up through
+    the pubsub channel when a ban ending earlier is issued.
+    """
+
+    def __init__(
+            self, engine: AsyncEngine, pubsub: PubSub, batch_size: int, max_sleep: float, lock_retry: float,
+            enabled: bool = True,
+    ):
+        self.engine = engine
+        self.pubsub = pubsub
+        self.batch_size = batch_size
+        self.max_sleep = max_sleep
+        self.lock_retry = lock_retry
+        self.enabled = enabled
+        self._next_expiry: Optional[datetime.datetime] = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        pubsub.subscribe(BAN_EXPIRY_CHANNEL, self._on_ban_scheduled)
+
+    def _on_ban_scheduled(self, payload: str) -> None:
+        try:
+            ban_until = datetime.datetime.fromisoformat(payload)
+        except ValueError:
+            debugger.debug(f'bad ban expiry payload: {payload}')
+            return
+        if self._next_expiry is None or ban_until < self._next_expiry:
+            self._wakeup.set()
+
+    async def lift_expired(self, connection: AsyncConnection) -> int:
+        lifted = 0
+        while True:
+            async with AsyncSession(bind=connection, expire_on_commit=False) as session, session.begin():
+                rows = await UserRepository(session).lift_expired_bans(self.batch_size)
+
+            for user_id, version in rows:
+                user_versions.bump(user_id, version)
+            await user_cache.invalidate_many([user_id for user_id, _ in rows])
+
+            lifted += len(rows)
+            if len(rows) < self.batch_size:
+                return lifted
+
+    async def _next_delay(self, connection: AsyncConnection) -> float:
+        async with AsyncSession(bind=connection, expire_on_commit=False) as session, session.begin():
+            self._next_expiry = await UserRepository(session).next_ban_expiry()
+
+        if self._next_expiry is None:
+            return self.max_sleep
+        delay = (self._next_expiry - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+        return min(max(delay, 0.0), self.max_sleep)
+
+    async def _lead(self, connection: AsyncConnection) -> None:
+        while True:
+            # cleared before reading the next expiry, so a ban issued meanwhile still wakes us up
+            self._wakeup.clear()
+            if lifted := await self.lift_expired(connection):
+                info.info(f'Lifted {lifted} expired bans')
+
+            delay = await self._next_delay(connection)
+            with suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+
+    async def _run(self) -> None:
+        while True:
+            locked = False
+            try:
+                async with self.engine.connect() as connection:
+                    try:
+                        locked = await connection.scalar(
+                            text('SELECT pg_try_advisory_lock(:key)'), {'key': BAN_EXPIRY_LOCK_KEY},
+                        )
+                        await connection.commit()
+                        if locked:
+                            debugger.debug('Ban expiry scheduler is running in this worker')
+                            await self._lead(connection)
+                    finally:
+                        if locked:
+                            # the lock belongs to the connection, it must not go back to the pool
+                            await connection.invalidate()
+            except (SQLAlchemyError, OSError) as e:
+                info.error(f'ban expiry scheduler failed: {e}')
+
+            self._next_expiry = None
+            await asyncio.sleep(self.lock_retry)
+
+    async def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        task, self._task = self._task, None
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
+async def ban_scheduled(ban_until: datetime.datetime) -> None:
+    await pubsub.publish(BAN_EXPIRY_CHANNEL, ban_until.isoformat())
+
+
+ban_expiry_scheduler = BanExpiryScheduler(
+    engine=engine,
+    pubsub=pubsub,
+    batch_size=config('BAN_EXPIRY_BATCH_SIZE', 1000, module='src.users.config'),
+    max_sleep=config('BAN_EXPIRY_MAX_SLEEP_SECONDS', 300, module='src.users.config'),
+    lock_retry=config('BAN_EXPIRY_LOCK_RETRY_SECONDS', 30, module='src.users.config'),
+    enabled=config('BAN_EXPIRY_SCHEDULER', False, module='src.users.config'),
+)
@@ -0,0 +1,207 @@
+"""Bulk user import.
+
+Streams users from a CSV (username,email,password header) or NDJSON file,
+validates them with the registration rules, hashes passwords with a
+PasswordHasher on a process pool and loads them in chunks with COPY. Rows taken by existing users are
+reported as duplicates and do not abort the import.
+
+    python -m src.users.bulk_import users.csv --chunk-size 5000 --workers 8
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from itertools import islice
+from typing import Any, Iterator, Optional
+
+import asyncpg
+from fastapi import HTTPException
+from pydantic import ValidationError
+
+from src.auth.hashing import PasswordHasher
+from src.config import config
+from src.users.schemas import UserCreate
+from src.users.services import RegisterService
+
+STAGING_TABLE = """
+CREATE TEMPORARY TABLE IF NOT EXISTS user_import (
+    line integer NOT NULL,
+    username varchar(128) NOT NULL,
+    email varchar(320) NOT NULL,
+    password varchar(1024) NOT NULL
+) ON COMMIT DELETE ROWS
+"""
+
+# ON CONFLICT DO NOTHING covers the username, lower(username) and email unique indexes,
+# including duplicates inside the same chunk
+INSERT_FROM_STAGING = """
+WITH inserted AS (
+    INSERT INTO "user" (username, email, password, is_active, is_staff, is_superuser, is_banned, version)
+    SELECT username, email, password, true, false, false, false, 1
+    FROM user_import
+    ORDER BY line
+    ON CONFLICT DO NOTHING
+    RETURNING email
+)
+SELECT count(*) FROM inserted
+"""
+
+NOT_INSERTED = """
+SELECT s.line,
+       EXISTS (SELECT 1 FROM "user" u WHERE lower(u.username) = lower(s.username)
+                                          AND u.email <> s.email) AS username_taken,
+       EXISTS (SELECT 1 FROM "user" u WHERE u.email = s.email
+                                          AND u.password <> s.password) AS email_taken
+FROM user_import s
+WHERE NOT EXISTS (SELECT 1 FROM "user" u WHERE u.email = s.email AND u.password = s.password)
+ORDER BY s.line
+"""
+
+
+@dataclass
+class ImportReport:
+    processed: int = 0
+    inserted: int = 0
+    duplicates: list[dict[str, Any]] = field(default_factory=list)
+    invalid: list[dict[str, Any]] = field(default_factory=list)
+    started_at: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def progress(self) -> str:
+        rate = self.processed / self.elapsed if self.elapsed else 0
+        return (f'processed {self.processed}, inserted {self.inserted}, duplicates {len(self.duplicates)}, '
+                f'invalid {len(self.invalid)} ({rate:.0f} rows/s)')
+
+    def as_dict(self) -> dict[str, Any]:
+        return {**asdict(self), 'elapsed': self.elapsed}
+
+
+def read_rows(path: str, file_format: Optional[str] = None) -> Iterator[tuple[int, dict[str, Any]]]:
+    file_format = file_format or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as file:
+        if file_format == 'csv':
+            # line 1 is the header
+            yield from enumerate(csv.DictReader(file), start=2)
+            return
+
+        for line, raw in enumerate(file, start=1):
+            if not raw.strip():
+                continue
+            try:
+                yield line, json.loads(raw)
+            except json.JSONDecodeError as e:
+                yield line, {'__error__': f'invalid json: {e}'}
+
+
+async def validate_row(row: dict[str, Any]) -> UserCreate:
+    if '__error__' in row:
+        raise ValueError(row['__error__'])
+
+    user = UserCreate.model_validate(row)
+    await RegisterService.password_validator(username=user.username, email=user.email, password=user.password)
+    await RegisterService.username_validator(username=user.username)
+    return user
+
+
+@dataclass
+class UserImporter:
+    connection: asyncpg.Connection
+    hasher: PasswordHasher
+    chunk_size: int = 5000
+    report: ImportReport = field(default_factory=ImportReport)
+
+    async def _validate_chunk(self, rows: list[tuple[int, dict[str, Any]]]) -> list[tuple[int, UserCreate]]:
+        valid = []
+        for line, row in rows:
+            try:
+                valid.append((line, await validate_row(row)))
+            except ValidationError as e:
+                self.report.invalid.append({'line': line, 'error': e.errors()[0]['msg']})
+            except HTTPException as e:
+                self.report.invalid.append({'line': line, 'error': e.detail})
+            except ValueError as e:
+                self.report.invalid.append({'line': line, 'error': str(e)})
+        return valid
+
+    async def _hash_chunk(self, users: list[tuple[int, UserCreate]]) -> list[str]:
+        return await self.hasher.hash_many([user.password for _, user in users])
+
+    async def _load_chunk(self, users: list[tuple[int, UserCreate]], hashes: list[str]) -> None:
+        records = [(line, user.username, user.email, hashed) for (line, user), hashed in zip(users, hashes)]
+
+        async with self.connection.transaction():
+            await self.connection.execute(STAGING_TABLE)
+            await self.connection.copy_records_to_table(
+                'user_import', records=records, columns=['line', 'username', 'email', 'password'],
+            )
+            inserted = await self.connection.fetchval(INSERT_FROM_STAGING)
+
+            if inserted < len(records):
+                for row in await self.connection.fetch(NOT_INSERTED):
+                    taken = [name for name, flag in (('username', row['username_taken']),
+                                                     ('email', row['email_taken'])) if flag]
+                    self.report.duplicates.append({'line': row['line'], 'taken': taken or ['username']})
+
+        self.report.inserted += inserted
+
+    async def run(self, rows: Iterator[tuple[int, dict[str, Any]]]) -> ImportReport:
+        pending: Optional[asyncio.Task] = None
+
+        while chunk := list(islice(rows, self.chunk_size)):
+            users = await self._validate_chunk(chunk)
+            hashes = await self._hash_chunk(users)
+
+            # COPY of the previous chunk overlaps with hashing of this one
+            if pending is not None:
+                await pending
+            pending = asyncio.create_task(self._load_chunk(users, hashes)) if users else None
+
+            self.report.processed += len(chunk)
+            print(self.report.progress(), flush=True)
+
+        if pending is not None:
+            await pending
+        return self.report
+
+
+async def import_users(
+        path: str, file_format: Optional[str], chunk_size: int, workers: int, dsn: Optional[str] = None,
+) -> ImportReport:
+    connection = await asyncpg.connect(dsn or config('DB_DSN'))
+    # a whole chunk is queued at once
+    hasher = PasswordHasher(workers=workers, queue_size=chunk_size, executor_type='process')
+    try:
+        importer = UserImporter(connection, hasher, chunk_size=chunk_size)
+        return await importer.run(read_rows(path, file_format))
+    finally:
+        hasher.shutdown()
+        await connection.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--format', choices=['csv', 'ndjson'], default=None, dest='file_format')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--report', default=None, help='write the full report as JSON to this path')
+    args = parser.parse_args()
+
+    report = asyncio.run(import_users(args.path, args.file_format, args.chunk_size, args.workers))
+    print(f'done in {report.elapsed:.1f}s: {report.progress()}')
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as file:
+            json.dump(report.as_dict(), file, indent=2)
+    sys.exit(0 if not report.invalid else 2)
+
+
+if __name__ == '__main__':
+    main()
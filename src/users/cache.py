@@ -0,0 +1,86 @@
+import logging
+from typing import Any, Optional
+
+from sqlalchemy import inspect
+
+from src.base.cache import LRUCache
+from src.config import config
+from src.pubsub import PubSub, pubsub
+from src.users.models import User
+
+debugger = logging.getLogger('debugger')
+
+INVALIDATION_CHANNEL = 'user_cache_invalidate'
+# ids per message, keeps the payload well under the 8000 bytes NOTIFY limit
+INVALIDATION_BATCH = 500
+
+
+class UserCache:
+    """Read-through cache of user rows for UserRepository.get_by_id.
+
+    Only column values are stored, never ORM instances, so a cached row can
+    be attached to any session. Invalidations are broadcast to the other
+    workers through the pubsub channel.
+
+    A read that loaded the row before a change commits can set its snapshot
+    after the invalidation, so a stale row can be served until the entry
+    expires, for up to USER_CACHE_TTL_SECONDS.
+    """
+
+    def __init__(self, cache: LRUCache[dict[str, Any]], pubsub: PubSub, enabled: bool = True):
+        self.cache = cache
+        self.pubsub = pubsub
+        self.enabled = enabled
+        self._columns = [column.key for column in inspect(User).column_attrs]
+        pubsub.subscribe(INVALIDATION_CHANNEL, self._on_invalidate)
+
+    def get(self, user_id: int) -> Optional[dict[str, Any]]:
+        if not self.enabled:
+            return None
+        return self.cache.get(user_id)
+
+    def set(self, user: User) -> None:  # noqa: A003
+        if not self.enabled:
+            return
+        self.cache.set(user.id, {column: getattr(user, column) for column in self._columns})
+
+    async def invalidate(self, user_id: int) -> None:
+        self.cache.delete(user_id)
+        await self.pubsub.publish(INVALIDATION_CHANNEL, str(user_id))
+
+    async def invalidate_many(self, user_ids: list[int]) -> None:
+        for user_id in user_ids:
+            self.cache.delete(user_id)
+        for start in range(0, len(user_ids), INVALIDATION_BATCH):
+            batch = user_ids[start:start + INVALIDATION_BATCH]
+            await self.pubsub.publish(INVALIDATION_CHANNEL, ','.join(map(str, batch)))
+
+    def _on_invalidate(self, payload: str) -> None:
+        try:
+            for user_id in payload.split(','):
+                self.cache.delete(int(user_id))
+        except ValueError:
+            debugger.debug(f'bad user cache invalidation payload: {payload}')
+
+    def metrics(self) -> dict[str, Any]:
+        return {'enabled': self.enabled, **self.cache.metrics()}
+
+
+def create_user_cache(pubsub: PubSub) -> UserCache:
+    return UserCache(
+        cache=LRUCache(
+            max_entries=config('USER_CACHE_MAX_ENTRIES', 10_000, module='src.users.config'),
+            ttl=config('USER_CACHE_TTL_SECONDS', 30, module='src.users.config'),
+        ),
+        pubsub=pubsub,
+        enabled=config('USER_CACHE_ENABLED', False, module='src.users.config'),
+    )
+
+
+user_cache = create_user_cache(pubsub)
+
+# group ids and versions per user id, the permissions of the groups are compiled in the permission index
+user_groups_cache: LRUCache[tuple[tuple[int, int], ...]] = LRUCache(
+    max_entries=config('USER_GROUPS_CACHE_MAX_ENTRIES', 10_000, module='src.users.config'),
+    ttl=config('USER_GROUPS_CACHE_TTL_SECONDS', 30, module='src.users.config'),
+)
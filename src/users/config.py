@@ -0,0 +1,18 @@
+import os
+
+# opt-in, same default as the fallback of src/users/cache.py
+USER_CACHE_ENABLED = os.environ.get('USER_CACHE_ENABLED', 'false').lower() in ('1', 'true')
+# one entry is a snapshot of the user columns, well under 1KB
+USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 10_000))
+USER_CACHE_TTL_SECONDS = 30
+# (group id, version) pairs of a user for permission checks, a change of groups applies within the TTL
+USER_GROUPS_CACHE_MAX_ENTRIES = int(os.environ.get('USER_GROUPS_CACHE_MAX_ENTRIES', 10_000))
+USER_GROUPS_CACHE_TTL_SECONDS = 30
+
+# lifts timed bans, runs in one worker at a time
+BAN_EXPIRY_SCHEDULER = os.environ.get('BAN_EXPIRY_SCHEDULER', 'true').lower() in ('1', 'true')
+BAN_EXPIRY_BATCH_SIZE = 1000
+# upper bound for a sleep, covers wake ups missed while the pubsub was down
+BAN_EXPIRY_MAX_SLEEP_SECONDS = 300
+# how often a standby worker tries to take over the scheduler
+BAN_EXPIRY_LOCK_RETRY_SECONDS = 30
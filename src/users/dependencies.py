@@ -3,6 +3,7 @@ from typing import Annotated
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from src.base.uow import UnitOfWork
 from src.database import get_async_session
 from src.users.models import User
 from src.users.repositories import UserRepository
@@ -15,16 +16,24 @@ async def get_user_repository(
     return UserRepository(session)
 
 
+async def get_unit_of_work(
+        session: Annotated[AsyncSession, Depends(get_async_session)],
+) -> UnitOfWork:
+    return UnitOfWork(session)
+
+
 async def get_user_service(
         repository: Annotated[UserRepository, Depends(get_user_repository)],
+        uow: Annotated[UnitOfWork, Depends(get_unit_of_work)],
 ) -> UserService:
-    return UserService(repository)
+    return UserService(repository, uow)
 
 
 async def get_admin_user_service(
         repository: Annotated[UserRepository, Depends(get_user_repository)],
+        uow: Annotated[UnitOfWork, Depends(get_unit_of_work)],
 ) -> AdminUserService:
-    return AdminUserService(repository)
+    return AdminUserService(repository, uow)
 
 
 async def get_user_or_404(
@@ -0,0 +1,12 @@
+from sqlalchemy.orm import selectinload
+
+from src.users.models import PermissionGroup, User
+
+# Loader options for the user and permission models. Relationships are lazy='raise_on_sql',
+# so every repository method states what it needs with one of these.
+
+USER_ONLY = ()
+
+USER_WITH_GROUPS = (
+    selectinload(User.permission_groups).raiseload(PermissionGroup.users),
+)
@@ -1,13 +1,12 @@
-import logging
-from typing import List
+import datetime
+from typing import List, Optional
 
-from sqlalchemy import (JSON, Boolean, Column, ForeignKey, Integer, String,
-                        Table)
+from sqlalchemy import (JSON, Boolean, Column, DateTime, ForeignKey, Index,
+                        Integer, String, Table, func)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.base.models import BaseModel
-
-info = logging.getLogger('all')
+from src.users.permissions import permission_index
 
 
 class User(BaseModel):
@@ -44,19 +43,42 @@ class User(BaseModel):
     banned_by: Mapped[int] = mapped_column(
         ForeignKey(id), nullable=True, default=None,
     )
+    ban_until: Mapped[Optional[datetime.datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True, default=None,
+    )
+    version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=1, server_default='1',
+    )
 
-    # related
+    # related, nothing is loaded implicitly, see src/users/loaders.py
     permission_groups: List['PermissionGroup'] = relationship(
-        'PermissionGroup', secondary='user_permission_group', back_populates='users',
-        lazy='selectin',
+        'PermissionGroup', secondary='user_permission_group',
+        lazy='raise_on_sql',
     )
 
-    def has_permission(self, permission: str) -> bool:
-        try:
-            return permission in set([perm for group in self.permission_groups for perm in group.permissions])
-        except Exception as e:
-            info.error(f'error get user permission: {e}')
+    @property
+    def ban_active(self) -> bool:
+        # a timed ban is over once ban_until passes, even before the expiry scheduler lifts it
+        if not self.is_banned:
             return False
+        return self.ban_until is None or self.ban_until > datetime.datetime.now(datetime.timezone.utc)
+
+    @property
+    def permission_mask(self) -> int:
+        # compiled once per instance, instances live as long as the request session
+        if (mask := getattr(self, '_permission_mask', None)) is None:
+            mask = self._permission_mask = permission_index.user_mask(self.permission_groups)
+        return mask
+
+    def has_permission(self, permission: str) -> bool:
+        # the groups must be loaded with USER_WITH_GROUPS, otherwise the raise_on_sql relationship raises
+        return permission_index.has(self.permission_mask, permission)
+
+
+# case-insensitive username lookups go through lower(username)
+Index('ix_user_username_lower', func.lower(User.username), unique=True)
+# only timed bans have ban_until set, lifting a ban clears it
+Index('ix_user_ban_until', User.ban_until, postgresql_where=User.ban_until.isnot(None))
 
 
 class PermissionGroup(BaseModel):
@@ -72,13 +94,19 @@ class PermissionGroup(BaseModel):
     permissions: Mapped[dict] = mapped_column(
         JSON, nullable=False, default=dict,
     )
+    version: Mapped[int] = mapped_column(
+        Integer, nullable=False, default=1, server_default='1',
+    )
 
-    # # related
+    # # related, read only: memberships are changed through User.permission_groups
     users: List['User'] = relationship(
-        'User', secondary='user_permission_group', back_populates='permission_groups',
-        lazy='selectin',
+        'User', secondary='user_permission_group',
+        lazy='raise_on_sql', viewonly=True,
     )
 
+    # bumped on every update, compiled permission masks are cached by it
+    __mapper_args__ = {'version_id_col': version}
+
 
 user_permission_group = Table(
     'user_permission_group',
@@ -86,4 +114,7 @@ user_permission_group = Table(
     Column('id', Integer, primary_key=True, autoincrement=True, nullable=False),
     Column('user_id', Integer, ForeignKey(User.id), nullable=False),
     Column('permission_group_id', Integer, ForeignKey(PermissionGroup.id), nullable=False),
+    # groups of a user are loaded with every permission check, users of a group when it is deleted
+    Index('ix_user_permission_group_user_id', 'user_id', 'permission_group_id'),
+    Index('ix_user_permission_group_permission_group_id', 'permission_group_id'),
 )
@@ -0,0 +1,62 @@
+from typing import TYPE_CHECKING, Iterable, Optional
+
+if TYPE_CHECKING:
+    from src.users.models import PermissionGroup
+
+# permission names of PermissionGroup.permissions checked by the routes
+BAN_USERS = 'users.ban'
+
+
+class PermissionIndex:
+    """Permission names interned to bits, with a compiled bitmask per permission group.
+
+    Group masks are cached by group id and recompiled when the group version changes.
+    Bits are assigned per process and are never stored anywhere.
+    """
+
+    def __init__(self):
+        self._bits: dict[str, int] = {}
+        self._groups: dict[int, tuple[int, int]] = {}
+
+    def _bit(self, permission: str) -> int:
+        if (bit := self._bits.get(permission)) is None:
+            bit = self._bits[permission] = 1 << len(self._bits)
+        return bit
+
+    def compile_group(self, group_id: int, version: int, permissions: Iterable[str]) -> int:
+        mask = 0
+        for permission in permissions:
+            mask |= self._bit(permission)
+        self._groups[group_id] = (version, mask)
+        return mask
+
+    def cached_group_mask(self, group_id: int, version: int) -> Optional[int]:
+        cached = self._groups.get(group_id)
+        if cached is None or cached[0] != version:
+            return None
+        return cached[1]
+
+    def group_mask(self, group: 'PermissionGroup') -> int:
+        mask = self.cached_group_mask(group.id, group.version)
+        if mask is None:
+            mask = self.compile_group(group.id, group.version, group.permissions)
+        return mask
+
+    def user_mask(self, groups: Iterable['PermissionGroup']) -> int:
+        mask = 0
+        for group in groups:
+            mask |= self.group_mask(group)
+        return mask
+
+    def combine(self, group_ids: Iterable[int]) -> int:
+        mask = 0
+        for group_id in group_ids:
+            mask |= self._groups.get(group_id, (0, 0))[1]
+        return mask
+
+    def has(self, mask: int, permission: str) -> bool:
+        bit = self._bits.get(permission)
+        return bit is not None and mask & bit == bit
+
+
+permission_index = PermissionIndex()
@@ -1,45 +1,76 @@
+import datetime
 import logging
 from dataclasses import dataclass
-from typing import Optional
+from typing import Any, Optional, Sequence
 
-from sqlalchemy import or_, select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import ARRAY, ColumnElement, Integer, any_, bindparam, func, or_, select, text, update
+from sqlalchemy.orm import make_transient_to_detached
 
 from src.base.exceptions import NotFound
 from src.base.repositories import BaseRepository
+from src.users.cache import user_cache
 from src.users.exceptions import UsernameOrEmailAlreadyExists
-from src.users.models import User
+from src.users.loaders import USER_ONLY, USER_WITH_GROUPS
+from src.users.models import PermissionGroup, User, user_permission_group
 
 debugger = logging.getLogger('debugger')
 
+# ON CONFLICT DO NOTHING covers the username, lower(username) and email unique indexes, a taken
+# credential returns no row. Plain text because insert(User).on_conflict_do_nothing() has no cache key
+# in SQLAlchemy 2.0 and is compiled again on every registration. RETURNING follows the model columns.
+CREATE_USER = text(f"""
+INSERT INTO "user" (username, email, password, is_active, is_staff, is_superuser, is_banned, version)
+VALUES (:username, :email, :password, true, false, false, false, 1)
+ON CONFLICT DO NOTHING
+RETURNING {', '.join(column.name for column in User.__table__.c)}
+""").columns(*User.__table__.c)
+
 
 @dataclass
 class UserRepository(BaseRepository[User]):
+    model = User
+
     async def find_for_login(self, search: str) -> User | None:
         result = await self.session.scalar(
             select(User).where(or_(
-                User.username.ilike(search.lower()),
+                func.lower(User.username) == search.lower(),
                 User.email == search,
-            )),
+            )).options(*USER_ONLY),
         )
 
         return result or None
 
+    async def _get_cached(self, user_id: int) -> User | None:
+        if not (values := user_cache.get(user_id)):
+            return None
+
+        user = User(**values)
+        make_transient_to_detached(user)
+        return await self.session.merge(user, load=False)
+
     async def get_by_id(self, user_id: int, with_groups: bool = False) -> User | None:
-        stmt = select(User).where(User.id == user_id)
-        if with_groups:
-            stmt = stmt.options(
-                selectinload(User.permission_groups),
-            )
+        if not with_groups and (user := await self._get_cached(user_id)):
+            return user
+
+        stmt = select(User).where(User.id == user_id).options(*(USER_WITH_GROUPS if with_groups else USER_ONLY))
         result = await self.session.scalar(stmt)
+        if result:
+            user_cache.set(result)
         return result or None
 
+    async def create_if_available(self, username: str, email: str, password: str) -> User | None:
+        """Inserts the user with one statement, None when the username or email is taken."""
+        return await self.session.scalar(
+            select(User).from_statement(CREATE_USER),
+            {'username': username, 'email': email, 'password': password},
+        )
+
     async def credentials_available(
             self, email: str, username: str, not_by: Optional[int] = None,
     ) -> None:
         stmt = select(User.username, User.email).where(or_(
             User.email == email,
-            User.username.ilike(username.lower()),
+            func.lower(User.username) == username.lower(),
         ))
 
         if not_by is not None:
@@ -62,3 +93,65 @@ class UserRepository(BaseRepository[User]):
         if not user:
             raise NotFound('user not found')
         return user
+
+    async def get_permission_group_versions(self, user_id: int) -> Sequence[tuple[int, int]]:
+        result = await self.session.execute(
+            select(PermissionGroup.id, PermissionGroup.version)
+            .join(user_permission_group, user_permission_group.c.permission_group_id == PermissionGroup.id)
+            .where(user_permission_group.c.user_id == user_id),
+        )
+        return result.tuples().all()
+
+    async def get_group_permissions(self, group_ids: list[int]) -> Sequence[tuple[int, int, Any]]:
+        result = await self.session.execute(
+            select(PermissionGroup.id, PermissionGroup.version, PermissionGroup.permissions)
+            .where(PermissionGroup.id.in_(group_ids)),
+        )
+        return result.tuples().all()
+
+    async def update_many(
+            self, user_ids: list[int], conditions: Sequence[ColumnElement[bool]], **values: Any,
+    ) -> Sequence[tuple[int, bool, bool, Optional[int]]]:
+        """Single UPDATE ... WHERE id = ANY(...) AND <conditions> RETURNING.
+
+        Returns (id, is_superuser, is_banned, new version) for every existing user of `user_ids`,
+        with the state before the update and None as the version if the conditions skipped it.
+        """
+        ids = bindparam('user_ids', user_ids, type_=ARRAY(Integer))
+        targets = (
+            select(User.id, User.is_superuser, User.is_banned)
+            .where(User.id == any_(ids))
+            .cte('targets')
+        )
+        updated = (
+            update(User)
+            .where(User.id == any_(ids), *conditions)
+            .values(**values)
+            .returning(User.id, User.version)
+            .cte('updated')
+        )
+        result = await self.session.execute(
+            select(targets.c.id, targets.c.is_superuser, targets.c.is_banned, updated.c.version)
+            .outerjoin(updated, updated.c.id == targets.c.id),
+        )
+        return result.tuples().all()
+
+    async def next_ban_expiry(self) -> Optional[datetime.datetime]:
+        return await self.session.scalar(select(func.min(User.ban_until)).where(User.ban_until.isnot(None)))
+
+    async def lift_expired_bans(self, limit: int) -> Sequence[tuple[int, int]]:
+        """Lifts up to `limit` bans whose ban_until has passed, returns (id, new version) of the lifted users."""
+        expired = (
+            select(User.id)
+            .where(User.ban_until <= func.now())
+            .order_by(User.ban_until)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        result = await self.session.execute(
+            update(User)
+            .where(User.id.in_(expired))
+            .values(is_banned=False, banned_by=None, ban_reason=None, ban_until=None, version=User.version + 1)
+            .returning(User.id, User.version),
+        )
+        return result.tuples().all()
@@ -3,14 +3,17 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, status
 
-from src.auth.dependencies import (get_current_superuser,
-                                   get_current_superuser_with_groups,
-                                   get_current_user)
+from src.auth.claims import TokenUser
+from src.auth.dependencies import (get_current_superuser_with_groups,
+                                   get_current_user, require_permission)
 from src.base.schemas import DetailModel, SuccessModel
 from src.users.dependencies import (get_admin_user_service, get_user_or_404,
                                     get_user_service)
 from src.users.models import User
-from src.users.schemas import BanData, UserRead, UserUpdate
+from src.users.permissions import BAN_USERS
+from src.users.schemas import (BanData, BatchBanData, BatchBanResult, UserRead,
+                               UserUpdate, batch_ban_result_serializer,
+                               user_read_serializer)
 from src.users.services import AdminUserService, UserService
 
 debugger = logging.getLogger('debugger')
@@ -24,6 +27,9 @@ admin_user_router = APIRouter(
     prefix='/admin',
 )
 
+# staff members whose groups grant the permission, and superusers
+can_ban_users = require_permission(BAN_USERS, checks=['is_staff'])
+
 
 @user_router.get(
     path='/current',
@@ -38,7 +44,7 @@ admin_user_router = APIRouter(
 async def current_user_get(
     user: Annotated[User, Depends(get_current_user)],
 ):
-    return user
+    return user_read_serializer.response(user)
 
 
 @user_router.patch(
@@ -64,7 +70,7 @@ async def current_user_post(
     user: Annotated[User, Depends(get_current_user)],
     user_service: Annotated[UserService, Depends(get_user_service)],
 ):
-    return await user_service.update_user(user, update_data)
+    return user_read_serializer.response(await user_service.update_user(user, update_data))
 
 
 @admin_user_router.post(
@@ -87,7 +93,7 @@ async def current_user_post(
 )
 async def admin_ban_user(
         ban_data: BanData,
-        user: Annotated[User, Depends(get_current_superuser)],
+        user: Annotated[TokenUser, Depends(can_ban_users)],
         user_to_action: Annotated[User, Depends(get_user_or_404)],
         user_service: Annotated[AdminUserService, Depends(get_admin_user_service)],
 ):
@@ -100,6 +106,30 @@ async def admin_ban_user(
     return SuccessModel(success=True)
 
 
+@admin_user_router.post(
+    path='/ban',
+    response_model=BatchBanResult,
+    responses={
+        status.HTTP_401_UNAUTHORIZED: {
+            'model': DetailModel,
+            'description': 'Bad token provided',
+        },
+        status.HTTP_403_FORBIDDEN: {
+            'model': DetailModel,
+            'description': 'User has no permission to ban',
+        },
+    },
+)
+async def admin_ban_users(
+        ban_data: BatchBanData,
+        user: Annotated[TokenUser, Depends(can_ban_users)],
+        user_service: Annotated[AdminUserService, Depends(get_admin_user_service)],
+):
+    debugger.debug(f'{ban_data.action} {len(ban_data.user_ids)} users by {user.username}')
+
+    return batch_ban_result_serializer.response(await user_service.set_ban_many(ban_data.user_ids, user, ban_data))
+
+
 async def test_groups(
         user: Annotated[User, Depends(get_current_superuser_with_groups)],
 ):
@@ -4,6 +4,7 @@ from typing import Literal, Optional
 from pydantic import BaseModel, EmailStr, Field
 
 from src.base.schemas import BaseORMModel
+from src.base.serializers import ModelSerializer
 
 
 class UserBaseModel(BaseORMModel):
@@ -33,3 +34,21 @@ class BanData(BaseModel):
     action: Literal['ban', 'unban']
     ban_reason: Optional[str] = Field(default=None)
     ban_until: Optional[datetime.datetime] = Field(default=None)
+
+
+class BatchBanData(BanData):
+    user_ids: list[int] = Field(min_length=1, max_length=10_000)
+
+
+class BatchBanOutcome(BaseModel):
+    user_id: int
+    status: Literal['banned', 'unbanned', 'unchanged', 'not_found', 'self', 'superuser']
+
+
+class BatchBanResult(BaseModel):
+    changed: int
+    results: list[BatchBanOutcome]
+
+
+user_read_serializer = ModelSerializer(UserRead)
+batch_ban_result_serializer = ModelSerializer(BatchBanResult)
@@ -1,3 +1,4 @@
+import datetime
 import re
 import warnings
 from dataclasses import dataclass
@@ -6,21 +7,29 @@ from typing import Optional, Type
 from pydantic import EmailStr
 from sqlalchemy.exc import IntegrityError
 
-from src.auth.config import pwd_context
+from src.auth.claims import TokenUser, user_versions
+from src.auth.hashing import password_hasher
 from src.base.exceptions import HTTP_EXC, BadRequest, NotFound, Unauthorized
+from src.base.uow import UnitOfWork
+from src.chats.hub import chat_hub
 from src.config import config
+from src.users.ban_expiry import ban_scheduled
+from src.users.cache import user_cache, user_groups_cache
 from src.users.exceptions import (EmailValidationError,
                                   PasswordValidationError,
                                   UsernameOrEmailAlreadyExists,
                                   UsernameValidationError)
 from src.users.models import User
+from src.users.permissions import permission_index
 from src.users.repositories import UserRepository
-from src.users.schemas import BanData, UserUpdate
+from src.users.schemas import (BanData, BatchBanOutcome, BatchBanResult,
+                               UserUpdate)
 
 
 @dataclass
 class UserService:
     user_repository: UserRepository
+    uow: UnitOfWork
 
     async def create_user(
             self,
@@ -28,21 +37,23 @@ class UserService:
             email: EmailStr,
             password: str,
     ) -> User:
-        await self.user_repository.credentials_available(email=email, username=username)
-
         await RegisterService.password_validator(username=username, email=email, password=password)
         # await RegisterService.email_validator(email=email)
         await RegisterService.username_validator(username=username)
 
         hashed_password = await RegisterService.make_password_hash(password=password)
 
-        user = User(
-            username=username,
-            email=email,
-            password=hashed_password,
-        )
-        await self.user_repository.create(user)
-        await self.user_repository.commit()
+        async with self.uow:
+            user = await self.user_repository.create_if_available(
+                username=username,
+                email=email,
+                password=hashed_password,
+            )
+
+        if user is None:
+            # the insert does not tell which unique index it hit, a taken username or email is only looked up now
+            await self.user_repository.credentials_available(email=email, username=username)
+            raise UsernameOrEmailAlreadyExists('username or email already exists')
 
         return user
 
@@ -51,27 +62,38 @@ class UserService:
             user: User,
             update_data: UserUpdate,
     ):
+        values = {}
+
         if update_data.username:
             await RegisterService.username_validator(username=update_data.username)
-            user.username = update_data.username
+            values['username'] = update_data.username
 
         if update_data.email:
             await RegisterService.email_validator(email=update_data.email)
-            user.email = update_data.email
+            values['email'] = update_data.email
 
         if update_data.password and update_data.old_password:
             if not await RegisterService.check_password_hash(update_data.old_password, user.password):
                 raise PasswordValidationError('Old password does not match')
 
             await RegisterService.password_validator(
-                username=user.username, email=user.email, password=update_data.password,
+                username=values.get('username', user.username),
+                email=values.get('email', user.email),
+                password=update_data.password,
             )
-            user.password = await RegisterService.make_password_hash(password=update_data.password)
+            values['password'] = await RegisterService.make_password_hash(password=update_data.password)
 
+        if not values:
+            return user
+
+        user_id = user.id
         try:
-            await self.user_repository.update(user)
+            async with self.uow:
+                user = await self.user_repository.update_fields(user_id, **values)
         except IntegrityError as e:
             raise UsernameOrEmailAlreadyExists('username or email already exists') from e
+        finally:
+            await user_cache.invalidate(user_id)
 
         return user
 
@@ -81,6 +103,20 @@ class UserService:
     async def get_user_by_id(self, user_id: int, with_groups: bool = False) -> User | None:
         return await self.user_repository.get_by_id(user_id=user_id, with_groups=with_groups)
 
+    async def get_permission_mask(self, user_id: int) -> int:
+        """Combined mask of the user's groups, the groups are queried at most once per cache TTL."""
+        if (groups := user_groups_cache.get(user_id)) is None:
+            groups = tuple(await self.user_repository.get_permission_group_versions(user_id))
+            user_groups_cache.set(user_id, groups)
+
+        outdated = [group_id for group_id, version in groups
+                    if permission_index.cached_group_mask(group_id, version) is None]
+        if outdated:
+            for group_id, version, permissions in await self.user_repository.get_group_permissions(outdated):
+                permission_index.compile_group(group_id, version, permissions)
+
+        return permission_index.combine(group_id for group_id, _ in groups)
+
     async def _get_user_or_exception(
             self, user_id: int, exception: Type[HTTP_EXC], detail: Optional[str] = None,
     ) -> User | None:
@@ -108,29 +144,91 @@ class UserService:
 @dataclass
 class AdminUserService:
     user_repository: UserRepository
+    uow: UnitOfWork
+
+    async def _set_ban(self, user: User, **values) -> None:
+        async with self.uow:
+            await self.user_repository.update_fields(user.id, version=User.version + 1, **values)
+
+        user_versions.bump(user.id, user.version)
+        await user_cache.invalidate(user.id)
+
+    @staticmethod
+    def _ban_until(ban_data: BanData) -> Optional[datetime.datetime]:
+        ban_until = ban_data.ban_until
+        if ban_until is None:
+            return None
+        if ban_until.tzinfo is None:
+            ban_until = ban_until.replace(tzinfo=datetime.timezone.utc)
+        if ban_until <= datetime.datetime.now(datetime.timezone.utc):
+            raise BadRequest('Ban end must be in the future')
+        return ban_until
 
     async def ban_user(
-            self, user, banned_by: User, ban_data: BanData,
+            self, user, banned_by: User | TokenUser, ban_data: BanData,
     ) -> None:
         if user.id == banned_by.id:
             raise BadRequest('You cannot ban yourself')
         if user.is_superuser:
             raise BadRequest('You cannot ban a superuser')
 
-        user.is_banned = True
-        user.banned_by = banned_by.id
-        user.ban_reason = ban_data.ban_reason
-
-        await self.user_repository.update(user)
+        ban_until = self._ban_until(ban_data)
+        await self._set_ban(
+            user, is_banned=True, banned_by=banned_by.id, ban_reason=ban_data.ban_reason, ban_until=ban_until,
+        )
+        await chat_hub.close_users([user.id])
+        if ban_until is not None:
+            await ban_scheduled(ban_until)
 
     async def unban_user(self, user: User) -> None:
         if not user.is_banned:
             return
 
-        user.is_banned = False
-        user.banned_by = None
-        user.ban_reason = None
-        await self.user_repository.update(user)
+        await self._set_ban(user, is_banned=False, banned_by=None, ban_reason=None, ban_until=None)
+
+    async def set_ban_many(self, user_ids: list[int], banned_by: User | TokenUser, ban_data: BanData) -> BatchBanResult:
+        """Bans or unbans users with one UPDATE, the ban_user/unban_user rules are applied in SQL."""
+        user_ids = list(dict.fromkeys(user_ids))
+
+        ban_until = None
+        if ban_data.action == 'ban':
+            ban_until = self._ban_until(ban_data)
+            conditions = [User.id != banned_by.id, User.is_superuser.is_(False)]
+            values = {
+                'is_banned': True, 'banned_by': banned_by.id, 'ban_reason': ban_data.ban_reason, 'ban_until': ban_until,
+            }
+        else:
+            conditions = [User.is_banned.is_(True)]
+            values = {'is_banned': False, 'banned_by': None, 'ban_reason': None, 'ban_until': None}
+
+        async with self.uow:
+            rows = await self.user_repository.update_many(
+                user_ids, conditions, version=User.version + 1, **values,
+            )
+
+        found = {}
+        changed = []
+        for user_id, is_superuser, _is_banned, version in rows:
+            if version is not None:
+                found[user_id] = 'banned' if ban_data.action == 'ban' else 'unbanned'
+                changed.append(user_id)
+                user_versions.bump(user_id, version)
+            elif ban_data.action == 'ban' and user_id == banned_by.id:
+                found[user_id] = 'self'
+            elif ban_data.action == 'ban' and is_superuser:
+                found[user_id] = 'superuser'
+            else:
+                found[user_id] = 'unchanged'
+
+        await user_cache.invalidate_many(changed)
+        if ban_data.action == 'ban':
+            await chat_hub.close_users(changed)
+        if changed and ban_until is not None:
+            await ban_scheduled(ban_until)
+        return BatchBanResult(
+            changed=len(changed),
+            results=[BatchBanOutcome(user_id=user_id, status=found.get(user_id, 'not_found')) for user_id in user_ids],
+        )
 
 
 @dataclass
@@ -175,10 +273,10 @@ class RegisterService:
 
     @staticmethod
     async def make_password_hash(password: str) -> str:
-        return pwd_context.hash(password)
+        return await password_hasher.hash(password)
 
     @staticmethod
     async def check_password_hash(
             plain_password: str, hashed_password: str,
     ) -> bool:
-        return pwd_context.verify(plain_password, hashed_password)
+        return await password_hasher.verify(plain_password, hashed_password)